@@ -2,10 +2,25 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import os
+
+from motor_auditoria import FECHA_YARDEN, IMPASSE_PESO, IMPASSE_VALOR, balance_diario, etapa, iniciar_registro
+from motor_auditoria import PUNTOS_MAXIMOS, css_filas, css_negativos, reducir_serie
+from motor_auditoria.cubo import desglosar, vista_cubo
+from motor_auditoria.ui import (
+    FORMATO_PERIODO, FORMATO_RESUMEN, GRANOS_RESUMEN, boton_descarga, conservar_estado, diagnostico, elegir_dataset,
+    filtrar_rango, memo_vistas, rango_global, rango_visible, tabla_paginada, tabla_resumen, vista_memorizada,
+)
+from motor_auditoria.simulador import Simulador
 
 # --- CONFIGURACIÓN INICIAL Y TEMA ---
 st.set_page_config(page_title="Tablero de Control - Negocio Oro", layout="wide", page_icon="💎")
+# Copy-on-write: los frames preparados se comparten entre sesiones y nunca se modifican en sitio
+pd.set_option('mode.copy_on_write', True)
+
+# --- DIAGNÓSTICO ---
+# Cada corrida registra tiempo y filas por etapa; la pestaña oculta (?diagnostico=1) además mide memoria
+DIAGNOSTICO = st.query_params.get('diagnostico') == '1'
+registro = iniciar_registro({'app': 'tablero'}, memoria=DIAGNOSTICO)
 
 # --- PALETA DE COLORES "FINANCIAL PRO" ---
 COLOR_PRIMARY = "#2C3E50"    # Azul Oscuro
@@ -101,385 +116,413 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # --- FUNCIÓN DE CARGA ---
-def cargar_csv_super_flexible(filepath):
-    encodings = ['utf-8', 'latin-1', 'cp1252', 'ISO-8859-1']
-    separators = [',', ';']
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(filepath, sep=sep, encoding=encoding)
-                if df.shape[1] > 1: return df
-            except Exception: continue
-    return pd.DataFrame()
-
-@st.cache_data
-def load_data():
-    files = {
-        "leyes": "Auditoría Negocio ALA.xlsx - Leyes pesos y diferencias.csv",
-        "orotec": "Auditoría Negocio ALA.xlsx - base orotec.csv",
-        "gold": "Auditoría Negocio ALA.xlsx -  base gold price.csv",
-        "bases": "Auditoría Negocio ALA.xlsx - comparacion de bases.csv"
-    }
-    loaded = {}
-    for key, name in files.items():
-        if os.path.exists(name):
-            loaded[key] = cargar_csv_super_flexible(name)
-        else:
-            loaded[key] = None
-    return loaded["leyes"], loaded["orotec"], loaded["gold"], loaded["bases"]
+# El caché de datasets, el selector de socio/periodo y el vigilante de archivos están en motor_auditoria.ui
+
+# Simulador de escenarios: etiquetas de la interfaz -> parámetros del motor
+BASES_SIMULADOR = {"Acuerdo (% del Gold Price)": 'acuerdo', "Referencia Orotec": 'orotec', "Compra registrada en la hoja": 'archivo'}
+RESPALDOS_SIMULADOR = {"Usar el acuerdo": 'acuerdo', "Omitir el día": 'omitir'}
+ORO_SIMULADOR = {"Oro puro real": 'real', "Oro puro factura": 'factura'}
+PORCENTAJES_GRILLA = [p / 200 for p in range(170, 201)]  # 85% a 100%, de medio punto
+REPARTOS_GRILLA = [r / 100 for r in range(30, 85, 5)]
+
+# --- PESTAÑAS PEREZOSAS ---
+# Solo corre la pestaña abierta; lo que calcula cada una se memoriza por versión de datos y parámetros
+conservar_estado()
+
+def vista(nombre, calcular, *parametros):
+    return vista_memorizada(registro.contexto['app'], resultado, nombre, calcular, *parametros)
 
 # --- PROCESAMIENTO ---
-df_leyes, df_orotec, df_gold, df_bases = load_data()
+resultado = elegir_dataset(registro)
+resultado = rango_global(registro.contexto['app'], resultado)
+df_leyes, df_orotec, df_gold, df_bases = (resultado['datos'][k] for k in ['leyes', 'orotec', 'gold', 'bases'])
 
 if df_leyes is not None and not df_leyes.empty:
     
-    # 1. Normalización
-    for df in [df_leyes, df_orotec, df_gold, df_bases]:
-        if df is not None:
-            df.columns = df.columns.str.lower().str.strip()
-
-    # 2. Limpieza
-    def limpiar_nums(df, cols):
-        if df is None: return df
-        for col in cols:
-            if col in df.columns:
-                if df[col].dtype == object:
-                    df[col] = df[col].astype(str).str.replace('$', '', regex=False).str.replace(',', '.').str.replace(' ', '')
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        return df
-
-    if 'no' in df_leyes.columns:
-        df_leyes['no'] = pd.to_numeric(df_leyes['no'], errors='coerce').fillna(0).astype(int)
-
-    # LIMPIEZA DE LEYES
-    df_leyes = limpiar_nums(df_leyes, ['peso taller', 'peso factura', 'diferencia en valor', 'ley taller', 'ley jerusalen', 'diferencia peso oro puro', 'peso oro puro real', 'peso oro puro factura'])
-    
-    # LIMPIEZA DE BASES
-    if df_bases is not None:
-        cols_to_clean = [c for c in df_bases.columns if c != 'fecha']
-        df_bases = limpiar_nums(df_bases, cols_to_clean)
-
-    # LIMPIEZA DE REPARTO
-    df_orotec = limpiar_nums(df_orotec, ['utilidad sociedad total', 'utilidad taller', 'utilidad ala', 'base orotec'])
-    df_gold = limpiar_nums(df_gold, ['utilidad sociedad total', 'utilidad taller', 'utilidad ala', 'total peso taller', 'total peso factura', 'total pagado en factura', 'compra medellin', 'base oro gold', 'base medellin', 'base venta'])
-
-    # 3. Fechas
-    for df in [df_leyes, df_orotec, df_gold, df_bases]:
-        if df is not None and 'fecha' in df.columns:
-            df['fecha_dt'] = pd.to_datetime(df['fecha'], errors='coerce')
-            df['fecha_norm'] = df['fecha_dt'].dt.strftime('%Y-%m-%d')
-            df.sort_values('fecha_dt', inplace=True)
-
     # --- INTERFAZ GRÁFICA ---
     st.markdown("### 💎 Dashboard de Auditoría Financiera")
     st.markdown("---")
     
-    tab1, tab_bases, tab2, tab3, tab4, tab5 = st.tabs([
+    tab1, tab_bases, tab2, tab3, tab4, tab5, tab6, *tab_diag = st.tabs([
         "🚨 Fugas de Capital", 
         "📉 Análisis de Bases", 
         "📊 Escenarios (Utilidad)", 
         "⚖️ Auditoría de Pesos",
         "🧪 Calidad (Leyes)",
-        "📅 Consulta Diaria"
-    ])
+        "📅 Consulta Diaria",
+        "📆 Resumen por Periodo"
+    ] + (["🩺 Diagnóstico"] if DIAGNOSTICO else []), key='pestana', on_change='rerun')
 
     # --- PESTAÑA 1: FUGAS DE CAPITAL ---
-    with tab1:
-        st.subheader("Resumen Ejecutivo de Diferencias")
-        
-        IMPASSE_VALOR = 1531798.20
-        IMPASSE_PESO = 3.69
-        
-        col_val = 'diferencia en valor'
-        df_perdidas = df_leyes[df_leyes[col_val] < 0].copy()
-        
-        fuga_operativa = df_perdidas[col_val].sum()
-        gramos_faltantes_op = df_leyes[df_leyes['diferencia peso oro puro'] > 0]['diferencia peso oro puro'].sum()
+    if tab1.open:
+        with tab1, etapa('pestaña.fugas'):
+            st.subheader("Resumen Ejecutivo de Diferencias")
         
-        total_dinero_perdido = fuga_operativa + (-IMPASSE_VALOR)
-        total_gramos_perdidos = gramos_faltantes_op + IMPASSE_PESO
-        dias_con_fugas = len(df_perdidas) + 1 
-
-        c1, c2, c3 = st.columns(3)
-        with c1: st.metric("Dinero Faltante Total", f"${abs(total_dinero_perdido):,.0f}", delta="Pérdida Total", delta_color="inverse")
-        with c2: st.metric("Oro Puro Faltante", f"{total_gramos_perdidos:.2f} g", delta="Merma + Impasse", delta_color="inverse")
-        with c3: st.metric("Días de Inconsistencia", f"{dias_con_fugas}", help="Días con diferencias + Impasse")
-
-        # BOTÓN DE DESCARGA (SOLICITADO)
-        @st.cache_data
-        def convert_df(df):
-            return df.to_csv(index=False).encode('utf-8')
-        
-        csv_fugas = convert_df(df_perdidas)
-        st.download_button(
-            label="💾 Descargar Reporte de Fugas (Excel/CSV)",
-            data=csv_fugas,
-            file_name='reporte_fugas_capital.csv',
-            mime='text/csv',
-        )
-
-        st.markdown(f"""
-        <div class='method-box'>
-        <b>ℹ️ Aclaración sobre el Cálculo:</b><br>
-        1. <b>Fuga Operativa:</b> Diferencia matemática estricta en la factura (Oro Puro Reportado vs. Oro Puro Real calculado como <i>Peso Factura × Ley Factura</i>).<br>
-        2. <b>IMPASSE 19/05/2025:</b> Se incluye la pérdida por espectrometría de <b>{IMPASSE_PESO} g</b> (${IMPASSE_VALOR:,.0f}), según información compartida por ALA.
-        </div>
-        """, unsafe_allow_html=True)
-
-        st.divider()
-        
-        st.markdown("#### 📢 Hallazgos Administrativos (Facturas y Pagos)")
+            fugas = resultado['fugas']
+            df_perdidas = fugas['df_perdidas']
+            total_dinero_perdido = fugas['total_dinero_perdido']
+            total_gramos_perdidos = fugas['total_gramos_perdidos']
+            dias_con_fugas = fugas['dias_con_fugas']
+
+            c1, c2, c3 = st.columns(3)
+            with c1: st.metric("Dinero Faltante Total", f"${abs(total_dinero_perdido):,.0f}", delta="Pérdida Total", delta_color="inverse")
+            with c2: st.metric("Oro Puro Faltante", f"{total_gramos_perdidos:.2f} g", delta="Merma + Impasse", delta_color="inverse")
+            with c3: st.metric("Días de Inconsistencia", f"{dias_con_fugas}", help="Días con diferencias + Impasse")
+
+            # BOTÓN DE DESCARGA (SOLICITADO)
+            boton_descarga(df_perdidas, 'reporte_fugas_capital', 'fugas', etiqueta="💾 Descargar Reporte de Fugas (Excel/CSV)")
+
+            st.markdown(f"""
+            <div class='method-box'>
+            <b>ℹ️ Aclaración sobre el Cálculo:</b><br>
+            1. <b>Fuga Operativa:</b> Diferencia matemática estricta en la factura (Oro Puro Reportado vs. Oro Puro Real calculado como <i>Peso Factura × Ley Factura</i>).<br>
+            2. <b>IMPASSE 19/05/2025:</b> Se incluye la pérdida por espectrometría de <b>{IMPASSE_PESO} g</b> (${IMPASSE_VALOR:,.0f}), según información compartida por ALA.{'' if resultado.get('impasse', True) else ' <i>Fuera del rango elegido: no se incluye.</i>'}
+            </div>
+            """, unsafe_allow_html=True)
+
+            st.divider()
         
-        hallazgos = []
+            st.markdown("#### 📢 Hallazgos Administrativos (Facturas y Pagos)")
         
-        # Revisión archivos
-        for df_source, name in [(df_gold, 'Gold Price'), (df_orotec, 'Orotec')]:
-            if 'observaciones' in df_source.columns:
-                for idx, row in df_source.iterrows():
-                    obs = str(row['observaciones']).lower()
-                    fecha = row['fecha_norm']
-                    obs_real = row['observaciones']
-                    
-                    if fecha == '2025-11-27': obs_real = "⚠️ Yarden pone en la factura más de lo que debería pagar. " + str(obs_real)
-                    if fecha == '2025-05-19': continue
-                    
-                    if len(obs) > 4 and "nan" not in obs and "ok" not in obs:
-                        # Filtro extra para orotec
-                        if name == 'Orotec' and "referencia" in obs: continue
-                        hallazgos.append({"Fecha": fecha, "Observación": obs_real})
-
-        if hallazgos:
-            df_hallazgos = pd.DataFrame(hallazgos).drop_duplicates()
-            def resaltar_fila_especifica(row):
-                return ['background-color: #F9E79F; color: #7D6608; font-weight: bold'] * len(row) if row['Fecha'] == '2025-11-27' else [''] * len(row)
-            st.dataframe(df_hallazgos.style.apply(resaltar_fila_especifica, axis=1), use_container_width=True, hide_index=True)
-        else:
-            st.info("No se encontraron observaciones administrativas adicionales.")
-
-        st.divider()
+            df_hallazgos = resultado['hallazgos']
+
+            if not df_hallazgos.empty:
+                def resaltar_fila_especifica(df): return css_filas(df, df['Fecha'] == FECHA_YARDEN, 'background-color: #F9E79F; color: #7D6608; font-weight: bold')
+                with etapa('fugas.tabla_hallazgos', len(df_hallazgos)):
+                    tabla_paginada(df_hallazgos, 'hallazgos', estilos=resaltar_fila_especifica, use_container_width=True, hide_index=True)
+                boton_descarga(df_hallazgos, 'hallazgos_administrativos', 'hallazgos')
+            else:
+                st.info("No se encontraron observaciones administrativas adicionales.")
+
+            st.divider()
         
-        st.markdown("#### 📉 Desglose Diario (Operativo)")
-        df_neg = df_perdidas.sort_values(col_val).head(10).copy()
-        if not df_neg.empty:
-            df_neg['Pérdida ($)'] = df_neg[col_val].abs()
-            fig = px.bar(df_neg, x='fecha', y='Pérdida ($)', color_discrete_sequence=[COLOR_DANGER])
-            fig.update_layout(template="plotly_white", font=dict(size=18))
-            st.plotly_chart(fig, use_container_width=True)
+            st.markdown("#### 📉 Desglose Diario (Operativo)")
+            df_neg = fugas['df_top_perdidas']
+            if not df_neg.empty:
+                def figura_fugas():
+                    fig = px.bar(df_neg, x='fecha', y='Pérdida ($)', color_discrete_sequence=[COLOR_DANGER])
+                    fig.update_layout(template="plotly_white", font=dict(size=18))
+                    return fig
+                with etapa('fugas.grafico', len(df_neg)): st.plotly_chart(vista('fugas.grafico', figura_fugas), use_container_width=True)
 
     # --- PESTAÑA 2: ANÁLISIS DE BASES ---
-    with tab_bases:
-        st.subheader("📉 Auditoría de Bases de Liquidación")
+    if tab_bases.open:
+        with tab_bases, etapa('pestaña.bases'):
+            st.subheader("📉 Auditoría de Bases de Liquidación")
         
-        if df_bases is not None and not df_bases.empty:
-            c_ala = next((c for c in df_bases.columns if 'ala' in c), None)
-            c_cap = next((c for c in df_bases.columns if '4%' in c or 'compra' in c), None)
-            c_acu = next((c for c in df_bases.columns if '93%' in c or 'acuerdo' in c), None)
+            if df_bases is not None and not df_bases.empty:
+                bases = resultado['bases']
 
-            if c_ala and c_cap and c_acu:
-                
-                df_view = df_bases.copy()
-                for col in [c_ala, c_cap, c_acu]:
-                    if df_view[col].mean() < 10000: df_view[col] = df_view[col] * 1000
-                
-                df_view['Dif Capital'] = df_view[c_ala] - df_view[c_cap]
-                df_view['Alerta'] = df_view['Dif Capital'] < 0
-                dias_alerta = df_view['Alerta'].sum()
+                if bases['columnas']:
+                    c_ala, c_cap, c_acu = bases['columnas']['ala'], bases['columnas']['capital'], bases['columnas']['acuerdo']
+                    df_view = bases['df_view']
+                    dias_alerta = bases['dias_alerta']
                 
-                st.markdown("#### 📋 Resumen de Promedios (Precio por Gramo)")
-                k1, k2, k3 = st.columns(3)
-                with k1: st.metric("Promedio Base Capital (Suelo)", f"${df_view[c_cap].mean():,.0f} /g")
-                with k2: st.metric("Promedio Base Acuerdo (Meta)", f"${df_view[c_acu].mean():,.0f} /g")
-                with k3: st.metric("Promedio Referencia ALA (Real)", f"${df_view[c_ala].mean():,.0f} /g", delta=f"${df_view[c_ala].mean() - df_view[c_cap].mean():,.0f} vs Capital")
-
-                st.divider()
-
-                if dias_alerta > 0:
-                    st.markdown(f"""
-                    <div class='capital-alert'>
-                    🚨 ALERTA DE EROSIÓN DE CAPITAL: En <b>{dias_alerta} días</b>, la referencia tomada por ALA fue INFERIOR al costo de compra del taller.<br>
-                    Esto indica que se repartieron utilidades inexistentes, afectando el capital de trabajo.
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                st.markdown("#### 📈 Evolución Comparativa de Bases ($/gramo)")
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_cap], name="Capital (Compra Taller)", line=dict(color='black', width=3, dash='dot')))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_acu], name="Acuerdo (93%)", line=dict(color=COLOR_SUCCESS, width=3)))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_ala], name="Referencia ALA", line=dict(color=COLOR_PRIMARY, width=4)))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_cap], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_ala], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(192, 57, 43, 0.15)', showlegend=False, hoverinfo='skip'))
-                fig.update_layout(template="plotly_white", height=500, font=dict(size=16), legend=dict(orientation="h", y=1.1), yaxis_title="Precio por Gramo ($)")
-                st.plotly_chart(fig, use_container_width=True)
-
-                st.markdown("#### 🗓️ Detalle Diario y Afectación")
-                df_table = df_view[['fecha', c_cap, c_acu, c_ala, 'Dif Capital']].copy()
-                df_table.columns = ['Fecha', 'Base Capital ($/g)', 'Base Acuerdo 93% ($/g)', 'Referencia ALA ($/g)', 'Diferencia ($/g)']
-                def color_red(val): return f'color: {"red" if val < 0 else "black"}; font-weight: bold;'
-                st.dataframe(df_table.style.format({"Base Capital ($/g)": "${:,.0f}", "Base Acuerdo 93% ($/g)": "${:,.0f}", "Referencia ALA ($/g)": "${:,.0f}", "Diferencia ($/g)": "${:,.0f}"}).applymap(color_red, subset=['Diferencia ($/g)']), use_container_width=True, height=400)
+                    st.markdown("#### 📋 Resumen de Promedios (Precio por Gramo)")
+                    k1, k2, k3 = st.columns(3)
+                    with k1: st.metric("Promedio Base Capital (Suelo)", f"${bases['promedio_capital']:,.0f} /g")
+                    with k2: st.metric("Promedio Base Acuerdo (Meta)", f"${bases['promedio_acuerdo']:,.0f} /g")
+                    with k3: st.metric("Promedio Referencia ALA (Real)", f"${bases['promedio_ala']:,.0f} /g", delta=f"${bases['promedio_ala'] - bases['promedio_capital']:,.0f} vs Capital")
+
+                    st.divider()
+
+                    if dias_alerta > 0:
+                        st.markdown(f"""
+                        <div class='capital-alert'>
+                        🚨 ALERTA DE EROSIÓN DE CAPITAL: En <b>{dias_alerta} días</b>, la referencia tomada por ALA fue INFERIOR al costo de compra del taller.<br>
+                        Esto indica que se repartieron utilidades inexistentes, afectando el capital de trabajo.
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                    st.markdown("#### 📈 Evolución Comparativa de Bases ($/gramo)")
+                    rango = rango_visible(df_view, "Rango visible:", key='rango_bases') if len(df_view) > PUNTOS_MAXIMOS else None
+                    def grafico_bases():
+                        df_graf = filtrar_rango(df_view, rango)
+                        # LTTB por serie; los días en que ALA quedó bajo capital se dibujan siempre
+                        if len(df_view) > PUNTOS_MAXIMOS: df_graf = reducir_serie(df_graf, [c_cap, c_acu, c_ala, 'Dif Capital'], obligatorios=df_graf['Alerta'])
+                        fig = go.Figure()
+                        # La franja ALA-capital sale del propio trazo ALA (tonexty contra capital), sin trazas auxiliares
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_acu], name="Acuerdo (93%)", line=dict(color=COLOR_SUCCESS, width=3), legendrank=2))
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_cap], name="Capital (Compra Taller)", line=dict(color='black', width=3, dash='dot'), legendrank=1))
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_ala], name="Referencia ALA", line=dict(color=COLOR_PRIMARY, width=4), fill='tonexty', fillcolor='rgba(192, 57, 43, 0.15)', legendrank=3))
+                        fig.update_layout(template="plotly_white", height=500, font=dict(size=16), legend=dict(orientation="h", y=1.1), yaxis_title="Precio por Gramo ($)")
+                        return len(df_graf), fig
+                    puntos, fig = vista('bases.grafico', grafico_bases, rango)
+                    if len(df_view) > PUNTOS_MAXIMOS: st.caption(f"Mostrando {puntos:,} de {len(df_view):,} días; los días con alerta se conservan todos.")
+                    with etapa('bases.grafico', puntos): st.plotly_chart(fig, use_container_width=True)
+
+                    st.markdown("#### 🗓️ Detalle Diario y Afectación")
+                    def tabla_bases():
+                        df_table = df_view[['fecha', c_cap, c_acu, c_ala, 'Dif Capital']].copy()
+                        df_table.columns = ['Fecha', 'Base Capital ($/g)', 'Base Acuerdo 93% ($/g)', 'Referencia ALA ($/g)', 'Diferencia ($/g)']
+                        return df_table
+                    df_table = vista('bases.tabla', tabla_bases)
+                    def color_red(df): return css_negativos(df, ['Diferencia ($/g)'], 'color: red; font-weight: bold;', 'color: black; font-weight: bold;')
+                    with etapa('bases.tabla', len(df_table)): tabla_paginada(df_table, 'bases', estilos=color_red, formato={"Base Capital ($/g)": "${:,.0f}", "Base Acuerdo 93% ($/g)": "${:,.0f}", "Referencia ALA ($/g)": "${:,.0f}", "Diferencia ($/g)": "${:,.0f}"}, use_container_width=True, height=400)
+                    boton_descarga(df_table, 'detalle_bases', 'bases')
+                else:
+                    st.error("No se encontraron las columnas necesarias en el archivo 'comparacion de bases.csv'.")
             else:
-                st.error("No se encontraron las columnas necesarias en el archivo 'comparacion de bases.csv'.")
-        else:
-            st.info("Cargando datos de bases...")
+                st.info("Cargando datos de bases...")
 
     # --- PESTAÑA 3: ESCENARIOS ---
-    with tab2:
-        st.subheader("Comparativa de Modelos")
-        # NOTA AJUSTADA (BASE OFICIAL vs REFERENCIA)
-        st.markdown(f"""
-        <div class='method-box'>
-        <b>ℹ️ Regla de Negocio (Escenarios):</b><br>
-        • <b>Escenario Medellín (93%):</b> Esta es la <b>BASE OFICIAL</b> según el Acuerdo Inicial (93% del Gold Price).<br>
-        • <b>Escenario Orotec:</b> Esta base se usa solo como <b>REFERENCIA</b> para calcular la utilidad si se vendiera en Orotec. <span style='color:#C0392B'><b>¡Importante!</b></span> Si NO hay referencia Orotec, se usa automáticamente Medellín.
-        </div>
-        """, unsafe_allow_html=True)
+    if tab2.open:
+        with tab2, etapa('pestaña.escenarios'):
+            st.subheader("Comparativa de Modelos")
+            # NOTA AJUSTADA (BASE OFICIAL vs REFERENCIA)
+            st.markdown(f"""
+            <div class='method-box'>
+            <b>ℹ️ Regla de Negocio (Escenarios):</b><br>
+            • <b>Escenario Medellín (93%):</b> Esta es la <b>BASE OFICIAL</b> según el Acuerdo Inicial (93% del Gold Price).<br>
+            • <b>Escenario Orotec:</b> Esta base se usa solo como <b>REFERENCIA</b> para calcular la utilidad si se vendiera en Orotec. <span style='color:#C0392B'><b>¡Importante!</b></span> Si NO hay referencia Orotec, se usa automáticamente Medellín.
+            </div>
+            """, unsafe_allow_html=True)
         
-        u_g_taller = df_gold['utilidad taller'].sum()
-        u_g_ala = df_gold['utilidad ala'].sum()
-        u_o_taller = df_orotec['utilidad taller'].sum()
-        u_o_ala = df_orotec['utilidad ala'].sum()
-        data_comp = [{'Escenario': 'Esc. Medellín (93%)', 'Entidad': 'Taller (60%)', 'Monto': u_g_taller}, {'Escenario': 'Esc. Medellín (93%)', 'Entidad': 'ALA (40%)', 'Monto': u_g_ala}, {'Escenario': 'Esc. Orotec', 'Entidad': 'Taller (60%)', 'Monto': u_o_taller}, {'Escenario': 'Esc. Orotec', 'Entidad': 'ALA (40%)', 'Monto': u_o_ala}]
-        fig_comp = px.bar(pd.DataFrame(data_comp), x="Escenario", y="Monto", color="Entidad", barmode="group", color_discrete_map={'Taller (60%)': COLOR_PRIMARY, 'ALA (40%)': COLOR_ACCENT})
-        fig_comp.update_traces(texttemplate='<b>%{y:$,.0f}</b>', textposition='outside', textfont_size=18, cliponaxis=False)
-        fig_comp.update_layout(template="plotly_white", font=dict(size=16), legend=dict(orientation="h", y=1.1), margin=dict(t=50))
-        st.plotly_chart(fig_comp, use_container_width=True)
-
-        st.subheader("📅 Días sin Referencia Orotec")
-        if 'observaciones' in df_orotec.columns:
-            mask = df_orotec['observaciones'].astype(str).str.contains("no se tiene referencia", case=False, na=False)
-            if mask.any(): st.dataframe(df_orotec[mask][['fecha']].assign(Mensaje="No se tiene referencia Orotec"), use_container_width=True, hide_index=True)
+            escenarios = resultado['escenarios']
+            u_g_taller, u_g_ala = escenarios['gold_taller'], escenarios['gold_ala']
+            u_o_taller, u_o_ala = escenarios['orotec_taller'], escenarios['orotec_ala']
+            data_comp = [{'Escenario': 'Esc. Medellín (93%)', 'Entidad': 'Taller (60%)', 'Monto': u_g_taller}, {'Escenario': 'Esc. Medellín (93%)', 'Entidad': 'ALA (40%)', 'Monto': u_g_ala}, {'Escenario': 'Esc. Orotec', 'Entidad': 'Taller (60%)', 'Monto': u_o_taller}, {'Escenario': 'Esc. Orotec', 'Entidad': 'ALA (40%)', 'Monto': u_o_ala}]
+            def figura_escenarios():
+                fig_comp = px.bar(pd.DataFrame(data_comp), x="Escenario", y="Monto", color="Entidad", barmode="group", color_discrete_map={'Taller (60%)': COLOR_PRIMARY, 'ALA (40%)': COLOR_ACCENT})
+                fig_comp.update_traces(texttemplate='<b>%{y:$,.0f}</b>', textposition='outside', textfont_size=18, cliponaxis=False)
+                fig_comp.update_layout(template="plotly_white", font=dict(size=16), legend=dict(orientation="h", y=1.1), margin=dict(t=50))
+                return fig_comp
+            with etapa('escenarios.grafico'): st.plotly_chart(vista('escenarios.grafico', figura_escenarios), use_container_width=True)
+
+            st.subheader("📅 Días sin Referencia Orotec")
+            sin_referencia = escenarios['sin_referencia']
+            if not sin_referencia.empty:
+                df_sin_ref = vista('escenarios.sin_referencia', lambda: sin_referencia.assign(Mensaje="No se tiene referencia Orotec"))
+                tabla_paginada(df_sin_ref, 'sin_referencia', use_container_width=True, hide_index=True)
+                boton_descarga(df_sin_ref, 'dias_sin_referencia_orotec', 'sin_referencia')
+
+            # SIMULADOR: utilidad recalculada con otro acuerdo, base y reparto sobre todo el histórico
+            if df_gold is not None and not df_gold.empty:
+                st.subheader("🧮 Simulador de Escenarios")
+                simulador = vista('escenarios.simulador', lambda: Simulador(df_gold, df_orotec, resultado['diario']))
+                st.session_state.setdefault('filtro_sim_porcentaje', 93.0)
+                st.session_state.setdefault('filtro_sim_reparto', 60)
+                st.session_state.setdefault('filtro_sim_base', next(iter(BASES_SIMULADOR)))
+                st.session_state.setdefault('filtro_sim_respaldo', next(iter(RESPALDOS_SIMULADOR)))
+                st.session_state.setdefault('filtro_sim_oro', next(iter(ORO_SIMULADOR)))
+                # La compra de la hoja ya trae su base y sus gramos: con ella no aplican los demás controles
+                registrada = BASES_SIMULADOR[st.session_state['filtro_sim_base']] == 'archivo'
+                c_p, c_r = st.columns(2)
+                with c_p: porcentaje = st.slider("Acuerdo (% del Gold Price):", 80.0, 100.0, step=0.5, key='filtro_sim_porcentaje', disabled=registrada)
+                with c_r: reparto = st.slider("Reparto para el Taller (%):", 0, 100, step=5, key='filtro_sim_reparto')
+                c_b, c_f, c_o = st.columns(3)
+                with c_b: base = BASES_SIMULADOR[st.radio("Base de compra:", list(BASES_SIMULADOR), key='filtro_sim_base')]
+                with c_f: respaldo = RESPALDOS_SIMULADOR[st.radio("Días sin referencia Orotec:", list(RESPALDOS_SIMULADOR), key='filtro_sim_respaldo', disabled=base != 'orotec')]
+                with c_o: oro = ORO_SIMULADOR[st.radio("Gramos:", list(ORO_SIMULADOR), key='filtro_sim_oro', disabled=registrada)]
+                parametros = (porcentaje / 100, reparto / 100, base, respaldo, oro)
+                with etapa('escenarios.simulacion', simulador.filas): sim = vista('escenarios.simulacion', lambda: simulador.evaluar(*parametros), *parametros)
+
+                c1, c2, c3, c4 = st.columns(4)
+                with c1: st.metric("Utilidad Sociedad", f"${sim['utilidad_total']:,.0f}")
+                with c2: st.metric(f"Taller ({reparto}%)", f"${sim['taller']:,.0f}")
+                with c3: st.metric(f"ALA ({100 - reparto}%)", f"${sim['ala']:,.0f}")
+                with c4: st.metric("Días con Pérdida", f"{sim['dias_perdida']:,}")
+                if sim['omitidas']: st.caption(f"{sim['omitidas']:,} días sin referencia Orotec quedan fuera del cálculo.")
+                if base != 'archivo' and 'compra medellin' in df_gold.columns:
+                    brecha = sim['utilidad_total'] - simulador.registrada
+                    st.caption(f"La hoja registra una utilidad de ${simulador.registrada:,.0f} (total venta − compra Medellín); este escenario queda "
+                               f"{'+' if brecha >= 0 else '−'}${abs(brecha):,.0f} frente a ella. El simulador recalcula la compra como gramos × base y la hoja no "
+                               "siempre la registra así (otra base u otros gramos en algunas filas): con la base «Compra registrada en la hoja» "
+                               "se reproduce su cifra.")
+                def figura_simulacion():
+                    df_mes = sim['por_mes'].reset_index()
+                    fig_s = go.Figure([
+                        go.Bar(x=df_mes['mes'], y=df_mes['taller'], name=f'Taller ({reparto}%)', marker_color=COLOR_PRIMARY),
+                        go.Bar(x=df_mes['mes'], y=df_mes['ala'], name=f'ALA ({100 - reparto}%)', marker_color=COLOR_ACCENT),
+                    ])
+                    fig_s.update_layout(barmode='stack', template="plotly_white", font=dict(size=16), legend=dict(orientation="h", y=1.1), yaxis_title="Utilidad mensual ($)")
+                    return fig_s
+                with etapa('escenarios.simulacion.grafico', len(sim['por_mes'])): st.plotly_chart(vista('escenarios.simulacion.grafico', figura_simulacion, *parametros), use_container_width=True)
+
+                # Todos los porcentajes y repartos en una sola llamada al motor
+                def figura_grilla():
+                    grilla = simulador.grilla(PORCENTAJES_GRILLA, REPARTOS_GRILLA, base, respaldo, oro)
+                    tabla = grilla.pivot(index='reparto', columns='porcentaje', values='taller')
+                    fig_g = px.imshow(tabla.to_numpy(), x=[f"{p:.1%}" for p in tabla.columns], y=[f"{r:.0%}" for r in tabla.index], aspect='auto', origin='lower',
+                                      color_continuous_scale='RdYlGn', labels=dict(x="Acuerdo (% del Gold Price)", y="Reparto Taller", color="Utilidad Taller ($)"))
+                    fig_g.update_layout(template="plotly_white", font=dict(size=14))
+                    return fig_g
+                with st.expander("🗺️ Utilidad del Taller para cada acuerdo y reparto"):
+                    with etapa('escenarios.grilla'): st.plotly_chart(vista('escenarios.grilla', figura_grilla, base, respaldo, oro), use_container_width=True)
 
     # --- PESTAÑA 4: PESOS ---
-    with tab3:
-        st.subheader("Auditoría de Gramajes")
-        st.markdown("""<div class='method-box'><b>⚖️ Nota sobre los Pesos:</b> Esta auditoría compara el <b>Peso Bruto</b> que sale del taller vs. el <b>Peso Bruto</b> registrado en la factura (antes de purificación).</div>""", unsafe_allow_html=True)
-        df_view = df_leyes.copy()
-        df_view['diff_peso'] = df_view['peso taller'] - df_view['peso factura']
-        c1, c2, c3 = st.columns(3)
-        with c1: st.metric("Peso Taller", f"{df_view['peso taller'].sum():,.2f} g")
-        with c2: st.metric("Peso Factura", f"{df_view['peso factura'].sum():,.2f} g")
-        with c3: st.metric("Merma Total", f"{df_view['diff_peso'].sum():,.2f} g", delta_color="inverse")
-        st.divider()
-        diff_g = st.slider("Filtrar > (g):", 0.0, 20.0, 1.0)
-        fig_p = go.Figure()
-        df_s = df_view[df_view['diff_peso'].abs() > diff_g]
-        fig_p.add_trace(go.Bar(x=df_s['fecha'], y=df_s['peso taller'], name='Taller', marker_color=COLOR_SUCCESS))
-        fig_p.add_trace(go.Bar(x=df_s['fecha'], y=df_s['peso factura'], name='Factura', marker_color=COLOR_DANGER))
-        fig_p.update_layout(template="plotly_white", legend=dict(orientation="h", y=1.1), font=dict(size=16))
-        st.plotly_chart(fig_p, use_container_width=True)
-        st.dataframe(df_s[['fecha', 'peso taller', 'peso factura', 'diff_peso']], use_container_width=True)
+    if tab3.open:
+        with tab3, etapa('pestaña.pesos'):
+            st.subheader("Auditoría de Gramajes")
+            st.markdown("""<div class='method-box'><b>⚖️ Nota sobre los Pesos:</b> Esta auditoría compara el <b>Peso Bruto</b> que sale del taller vs. el <b>Peso Bruto</b> registrado en la factura (antes de purificación).</div>""", unsafe_allow_html=True)
+            pesos = resultado['pesos']
+            df_view = pesos['df_view']
+            c1, c2, c3 = st.columns(3)
+            with c1: st.metric("Peso Taller", f"{pesos['peso_taller']:,.2f} g")
+            with c2: st.metric("Peso Factura", f"{pesos['peso_factura']:,.2f} g")
+            with c3: st.metric("Merma Total", f"{pesos['merma']:,.2f} g", delta_color="inverse")
+            st.divider()
+            st.session_state.setdefault('filtro_pesos', 1.0)
+            diff_g = st.slider("Filtrar > (g):", 0.0, 20.0, key='filtro_pesos')
+            df_s = vista('pesos.filtro', lambda: df_view[df_view['diff_peso'].abs() > diff_g], diff_g)
+            rango = rango_visible(df_s, "Rango visible:", key='rango_pesos') if len(df_s) > PUNTOS_MAXIMOS else None
+            def grafico_pesos():
+                df_graf = filtrar_rango(df_s, rango)
+                # Mín/máx de la diferencia por tramo: las mayores mermas y excesos siempre aparecen
+                if len(df_s) > PUNTOS_MAXIMOS: df_graf = reducir_serie(df_graf, ['diff_peso'], modo='minmax')
+                fig_p = go.Figure()
+                fig_p.add_trace(go.Bar(x=df_graf['fecha'], y=df_graf['peso taller'], name='Taller', marker_color=COLOR_SUCCESS))
+                fig_p.add_trace(go.Bar(x=df_graf['fecha'], y=df_graf['peso factura'], name='Factura', marker_color=COLOR_DANGER))
+                fig_p.update_layout(template="plotly_white", legend=dict(orientation="h", y=1.1), font=dict(size=16))
+                return len(df_graf), fig_p
+            puntos, fig_p = vista('pesos.grafico', grafico_pesos, diff_g, rango)
+            if len(df_s) > PUNTOS_MAXIMOS: st.caption(f"Mostrando {puntos:,} de {len(df_s):,} días con diferencia; la tabla tiene el detalle completo.")
+            with etapa('pesos.grafico', puntos): st.plotly_chart(fig_p, use_container_width=True)
+            df_tabla = vista('pesos.tabla', lambda: df_s[['fecha', 'peso taller', 'peso factura', 'diff_peso']], diff_g)
+            with etapa('pesos.tabla', len(df_s)): tabla_paginada(df_tabla, 'pesos', use_container_width=True)
+            boton_descarga(df_tabla, 'diferencias_peso', 'pesos')
 
     # --- PESTAÑA 5: CALIDAD (TERMINOLOGÍA AJUSTADA) ---
-    with tab4:
-        st.subheader("🧪 Análisis de Calidad (Leyes)")
+    if tab4.open:
+        with tab4, etapa('pestaña.leyes'):
+            st.subheader("🧪 Análisis de Calidad (Leyes)")
         
-        df_q = df_leyes.copy()
-        df_q['diff'] = df_q['ley taller'] - df_q['ley jerusalen']
+            leyes = resultado['leyes']
         
-        # 1. MERMA DE LEY (Taller > Jerusalén)
-        st.markdown("#### 🔻 Merma de Ley (Taller > Jerusalén)")
-        st.caption("Casos donde la ley del Taller fue SUPERIOR a la de Jerusalén.")
+            # 1. MERMA DE LEY (Taller > Jerusalén)
+            st.markdown("#### 🔻 Merma de Ley (Taller > Jerusalén)")
+            st.caption("Casos donde la ley del Taller fue SUPERIOR a la de Jerusalén.")
         
-        df_mermas = df_q[df_q['diff'] > 0.001].sort_values('fecha_dt', ascending=False)
+            df_mermas = leyes['df_mermas']
         
-        if not df_mermas.empty:
-            fig1 = px.bar(df_mermas, x='diff', y='fecha', orientation='h', text='diff', title="Merma de Ley")
-            fig1.update_traces(marker_color=COLOR_DANGER, texttemplate='%{text:.4f}')
-            fig1.update_layout(template="plotly_white", font=dict(size=14))
-            st.plotly_chart(fig1, use_container_width=True)
-            st.dataframe(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']].style.format("{:.4f}", subset=['ley taller', 'ley jerusalen', 'diff']), use_container_width=True)
-        else:
-            st.success("No hay mermas de ley significativas.")
-
-        st.divider()
-
-        # 2. ALZA DE LEY (Jerusalén > Taller)
-        st.markdown("#### 🟢 Alza de Ley (Jerusalén > Taller)")
-        st.caption("Casos donde la ley del Taller fue INFERIOR a la de Jerusalén.")
+            if not df_mermas.empty:
+                def figura_merma():
+                    fig1 = px.bar(df_mermas, x='diff', y='fecha', orientation='h', text='diff', title="Merma de Ley")
+                    fig1.update_traces(marker_color=COLOR_DANGER, texttemplate='%{text:.4f}')
+                    fig1.update_layout(template="plotly_white", font=dict(size=14))
+                    return fig1
+                with etapa('leyes.grafico_merma', len(df_mermas)): st.plotly_chart(vista('leyes.grafico_merma', figura_merma), use_container_width=True)
+                with etapa('leyes.tabla_merma', len(df_mermas)): tabla_paginada(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']], 'mermas', formato={c: "{:.4f}" for c in ['ley taller', 'ley jerusalen', 'diff']}, use_container_width=True)
+                boton_descarga(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']], 'merma_ley', 'merma_ley')
+            else:
+                st.success("No hay mermas de ley significativas.")
+
+            st.divider()
+
+            # 2. ALZA DE LEY (Jerusalén > Taller)
+            st.markdown("#### 🟢 Alza de Ley (Jerusalén > Taller)")
+            st.caption("Casos donde la ley del Taller fue INFERIOR a la de Jerusalén.")
         
-        df_ganancia = df_q[(df_q['diff'] < -0.001) & (df_q['ley taller'] > 0.01)].sort_values('fecha_dt', ascending=False)
-        df_ganancia['diff_abs'] = df_ganancia['diff'].abs()
-
-        if not df_ganancia.empty:
-            fig2 = px.bar(df_ganancia, x='diff_abs', y='fecha', orientation='h', text='diff_abs', title="Alza de Ley")
-            fig2.update_traces(marker_color=COLOR_SUCCESS, texttemplate='%{text:.4f}')
-            fig2.update_layout(template="plotly_white", font=dict(size=14))
-            st.plotly_chart(fig2, use_container_width=True)
-            st.dataframe(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']].style.format("{:.4f}", subset=['ley taller', 'ley jerusalen', 'diff_abs']), use_container_width=True)
-        else:
-            st.info("No hay casos de Alza de Ley (con datos válidos).")
+            df_ganancia = leyes['df_ganancia']
+
+            if not df_ganancia.empty:
+                def figura_alza():
+                    fig2 = px.bar(df_ganancia, x='diff_abs', y='fecha', orientation='h', text='diff_abs', title="Alza de Ley")
+                    fig2.update_traces(marker_color=COLOR_SUCCESS, texttemplate='%{text:.4f}')
+                    fig2.update_layout(template="plotly_white", font=dict(size=14))
+                    return fig2
+                with etapa('leyes.grafico_alza', len(df_ganancia)): st.plotly_chart(vista('leyes.grafico_alza', figura_alza), use_container_width=True)
+                with etapa('leyes.tabla_alza', len(df_ganancia)): tabla_paginada(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']], 'ganancia', formato={c: "{:.4f}" for c in ['ley taller', 'ley jerusalen', 'diff_abs']}, use_container_width=True)
+                boton_descarga(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']], 'alza_ley', 'alza_ley')
+            else:
+                st.info("No hay casos de Alza de Ley (con datos válidos).")
 
     # --- PESTAÑA 6: CONSULTA DIARIA ---
-    with tab5:
-        st.header("📅 Consulta Detallada por Día")
-        fechas = df_gold['fecha_norm'].dropna().unique()
-        c_s1, c_s2 = st.columns(2)
-        with c_s1: f_sel = st.selectbox("Fecha:", fechas)
-        with c_s2: esc = st.radio("Escenario:", ["Escenario Medellín (93%)", "Escenario Orotec"], horizontal=True)
-
-        if f_sel:
-            row_g = df_gold[df_gold['fecha_norm'] == f_sel].iloc[0]
-            row_o = df_orotec[df_orotec['fecha_norm'] == f_sel]
-            row_o = row_o.iloc[0] if not row_o.empty else None
+    if tab5.open:
+        with tab5, etapa('pestaña.diaria'):
+            st.header("📅 Consulta Detallada por Día")
+            fechas = vista('diaria.fechas', lambda: df_gold['fecha_norm'].dropna().unique())
+            # Otra versión de datos puede no tener la fecha que quedó elegida
+            if len(fechas) and st.session_state.get('consulta_fecha') not in set(fechas): st.session_state['consulta_fecha'] = fechas[0]
+            st.session_state.setdefault('consulta_escenario', "Escenario Medellín (93%)")
+            c_s1, c_s2 = st.columns(2)
+            with c_s1: f_sel = st.selectbox("Fecha:", fechas, key='consulta_fecha')
+            with c_s2: esc = st.radio("Escenario:", ["Escenario Medellín (93%)", "Escenario Orotec"], horizontal=True, key='consulta_escenario')
+
+            if f_sel:
+                with etapa('diaria.consulta'): dia = vista('diaria.consulta', lambda: balance_diario(resultado['diario'], f_sel), f_sel)
+                row_g = dia['gold']
+                row_o = dia['orotec']
+                p_taller, p_factura, op_taller, op_factura = dia['p_taller'], dia['p_factura'], dia['op_taller'], dia['op_factura']
+
+                obs = str(row_o.get('observaciones', '')) if row_o is not None else ""
+                es_sup = "no se tiene referencia" in obs.lower()
             
-            row_l = df_leyes[df_leyes['fecha_norm'] == f_sel]
-            
-            p_taller, p_factura, op_taller, op_factura = 0,0,0,0
-            if not row_l.empty:
-                p_taller = row_l['peso taller'].sum()
-                p_factura = row_l['peso factura'].sum()
-                # Prioridad columna archivo
-                if 'peso oro puro real' in row_l.columns:
-                    op_taller = row_l['peso oro puro real'].sum()
-                else:
-                    op_taller = (row_l['peso taller'] * row_l['ley taller']).sum()
-                
-                if 'peso oro puro factura' in row_l.columns:
-                    op_factura = row_l['peso oro puro factura'].sum()
+                if esc == "Escenario Orotec":
+                    if row_o is not None:
+                         ut_t, ut_a, b_c, n_b = row_o.get('utilidad taller',0), row_o.get('utilidad ala',0), row_o.get('base orotec',0), "Base Orotec"
+                         if es_sup: n_b = "Base Medellín (SUPLENTE)"
+                    else: ut_t, ut_a, b_c, n_b = 0,0,0,"Sin Datos"
                 else:
-                    op_factura = (row_l['peso factura'] * row_l['ley jerusalen']).sum()
+                    ut_t, ut_a, b_c, n_b = row_g.get('utilidad taller',0), row_g.get('utilidad ala',0), row_g.get('base medellin',0), "Base Medellín (93%)"
 
-            obs = str(row_o.get('observaciones', '')) if row_o is not None else ""
-            es_sup = "no se tiene referencia" in obs.lower()
-            
-            if esc == "Escenario Orotec":
-                if row_o is not None:
-                     ut_t, ut_a, b_c, n_b = row_o.get('utilidad taller',0), row_o.get('utilidad ala',0), row_o.get('base orotec',0), "Base Orotec"
-                     if es_sup: n_b = "Base Medellín (SUPLENTE)"
-                else: ut_t, ut_a, b_c, n_b = 0,0,0,"Sin Datos"
-            else:
-                ut_t, ut_a, b_c, n_b = row_g.get('utilidad taller',0), row_g.get('utilidad ala',0), row_g.get('base medellin',0), "Base Medellín (93%)"
-
-            st.divider()
-            if es_sup and esc == "Escenario Orotec": st.warning("⚠️ Usando base suplente.")
+                st.divider()
+                if es_sup and esc == "Escenario Orotec": st.warning("⚠️ Usando base suplente.")
             
-            st.markdown("### ⚖️ Balance de Masa y Pureza")
-            c1, c2, c3, c4 = st.columns(4)
-            with c1: st.metric("Peso Bruto Taller", f"{p_taller:,.2f} g")
-            with c2: st.metric("Peso Bruto Factura", f"{p_factura:,.2f} g")
-            with c3: st.metric("Oro Puro Real", f"{op_taller:,.2f} g")
-            with c4: st.metric("Oro Puro Factura", f"{op_factura:,.2f} g")
+                st.markdown("### ⚖️ Balance de Masa y Pureza")
+                c1, c2, c3, c4 = st.columns(4)
+                with c1: st.metric("Peso Bruto Taller", f"{p_taller:,.2f} g")
+                with c2: st.metric("Peso Bruto Factura", f"{p_factura:,.2f} g")
+                with c3: st.metric("Oro Puro Real", f"{op_taller:,.2f} g")
+                with c4: st.metric("Oro Puro Factura", f"{op_factura:,.2f} g")
             
-            st.markdown("---")
-            c_f1, c_f2 = st.columns(2)
-            with c_f1:
-                st.markdown("### 💵 Bases Financieras")
-                st.metric("Gold Price", f"${row_g.get('base oro gold', 0):,.0f}")
-                st.metric(f"{n_b}", f"${b_c:,.0f}", delta_color="inverse")
-            with c_f2:
-                st.markdown("### 💰 Reparto")
-                st.metric("Taller (60%)", f"${ut_t:,.0f}")
-                st.metric("ALA (40%)", f"${ut_a:,.0f}")
-
-            # MARGEN BRUTO
-            st.markdown("---")
-            st.markdown("### 📊 Resultados Consolidados")
-            utilidad_total_sociedad = ut_t + ut_a
-            valor_venta_estimado = op_taller * b_c if (op_taller > 0 and b_c > 0) else 1
-            margen_bruto_pct = (utilidad_total_sociedad / valor_venta_estimado) * 100 if valor_venta_estimado > 1 else 0
-
-            cm1, cm2 = st.columns(2)
-            with cm1: st.metric("Utilidad Total Sociedad", f"${utilidad_total_sociedad:,.0f}")
-            with cm2: st.metric("Margen Bruto Operación", f"{margen_bruto_pct:.2f}%")
+                st.markdown("---")
+                c_f1, c_f2 = st.columns(2)
+                with c_f1:
+                    st.markdown("### 💵 Bases Financieras")
+                    st.metric("Gold Price", f"${row_g.get('base oro gold', 0):,.0f}")
+                    st.metric(f"{n_b}", f"${b_c:,.0f}", delta_color="inverse")
+                with c_f2:
+                    st.markdown("### 💰 Reparto")
+                    st.metric("Taller (60%)", f"${ut_t:,.0f}")
+                    st.metric("ALA (40%)", f"${ut_a:,.0f}")
+
+                # MARGEN BRUTO
+                st.markdown("---")
+                st.markdown("### 📊 Resultados Consolidados")
+                utilidad_total_sociedad = ut_t + ut_a
+                valor_venta_estimado = op_taller * b_c if (op_taller > 0 and b_c > 0) else 1
+                margen_bruto_pct = (utilidad_total_sociedad / valor_venta_estimado) * 100 if valor_venta_estimado > 1 else 0
+
+                cm1, cm2 = st.columns(2)
+                with cm1: st.metric("Utilidad Total Sociedad", f"${utilidad_total_sociedad:,.0f}")
+                with cm2: st.metric("Margen Bruto Operación", f"{margen_bruto_pct:.2f}%")
+
+    # --- PESTAÑA 7: RESUMEN SEMANAL / MENSUAL ---
+    if tab6.open:
+        with tab6, etapa('pestaña.resumen'):
+            st.header("📆 Resumen Semanal y Mensual")
+            st.markdown("""<div class='method-box'><b>ℹ️ Nota:</b> Agregados de la hoja de leyes precalculados por día, semana (de lunes a domingo) y mes. La fuga es la operativa, sin el impasse.</div>""", unsafe_allow_html=True)
+            cubo = resultado['cubo']
+            st.session_state.setdefault('filtro_grano', 'Mes')
+            grano = GRANOS_RESUMEN[st.segmented_control("Agrupar por:", list(GRANOS_RESUMEN), key='filtro_grano') or 'Mes']
+            df_res = vista('resumen.tabla', lambda: tabla_resumen(vista_cubo(cubo, grano), grano), grano)
+            def grafico_resumen():
+                # Mín/máx por tramo en el grano diario: los días de mayor fuga siempre aparecen
+                df_graf = reducir_serie(df_res, ['Fuga ($)'], modo='minmax')
+                fig_r = go.Figure(go.Bar(x=df_graf['Periodo'], y=df_graf['Fuga ($)'], name='Fuga ($)', marker_color=COLOR_DANGER))
+                fig_r.update_layout(template="plotly_white", font=dict(size=16), yaxis_title="Fuga operativa ($)")
+                return len(df_graf), fig_r
+            puntos, fig_r = vista('resumen.grafico', grafico_resumen, grano)
+            if puntos < len(df_res): st.caption(f"Mostrando {puntos:,} de {len(df_res):,} periodos; la tabla tiene el detalle completo.")
+            with etapa('resumen.grafico', puntos): st.plotly_chart(fig_r, use_container_width=True)
+            with etapa('resumen.tabla', len(df_res)): tabla_paginada(df_res, f'resumen_{grano}', formato=FORMATO_RESUMEN, use_container_width=True, hide_index=True)
+            boton_descarga(df_res, f'resumen_{grano}', 'resumen')
+
+            # Drill-down: los días del mes o de la semana elegida, sin volver a las filas de leyes
+            periodos = cubo[grano].index
+            if grano != 'dia' and len(periodos):
+                st.subheader("🔎 Detalle por Día")
+                clave = f"consulta_resumen_{grano}"
+                if st.session_state.get(clave) not in set(periodos): st.session_state[clave] = periodos[-1]
+                inicio = st.selectbox("Periodo:", periodos, format_func=lambda p: p.strftime(FORMATO_PERIODO[grano]), key=clave)
+                df_dias = vista('resumen.desglose', lambda: tabla_resumen(desglosar(cubo, grano, inicio), 'dia'), grano, inicio)
+                tabla_paginada(df_dias, 'resumen_desglose', formato=FORMATO_RESUMEN, use_container_width=True, hide_index=True)
+                boton_descarga(df_dias, f'resumen_{inicio:%Y-%m-%d}', 'resumen_desglose')
 
 else:
+    tab_diag = []
     st.warning("Esperando datos... Sube los 4 archivos CSV al repositorio.")
+
+# --- PESTAÑA OCULTA: DIAGNÓSTICO ---
+diagnostico(registro, resultado, tab_diag, memo_vistas(registro.contexto['app']))
@@ -2,10 +2,24 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import os
+
+from motor_auditoria import FECHA_YARDEN, IMPASSE_PESO, IMPASSE_VALOR, balance_diario, etapa, iniciar_registro
+from motor_auditoria import PUNTOS_MAXIMOS, css_filas, css_negativos, reducir_serie
+from motor_auditoria.cubo import desglosar, vista_cubo
+from motor_auditoria.ui import (
+    FORMATO_PERIODO, FORMATO_RESUMEN, GRANOS_RESUMEN, boton_descarga, conservar_estado, diagnostico, elegir_dataset,
+    filtrar_rango, memo_vistas, rango_global, rango_visible, tabla_paginada, tabla_resumen, vista_memorizada,
+)
 
 # --- CONFIGURACIÓN INICIAL ---
 st.set_page_config(page_title="Monitor de Control - Negocio Oro", layout="wide", page_icon="⚖️")
+# Copy-on-write: los frames preparados se comparten entre sesiones y nunca se modifican en sitio
+pd.set_option('mode.copy_on_write', True)
+
+# --- DIAGNÓSTICO ---
+# Cada corrida registra tiempo y filas por etapa; la pestaña oculta (?diagnostico=1) además mide memoria
+DIAGNOSTICO = st.query_params.get('diagnostico') == '1'
+registro = iniciar_registro({'app': 'monitor'}, memoria=DIAGNOSTICO)
 
 # --- PALETA DE COLORES "CONTROL" ---
 COLOR_PRIMARY = "#2C3E50"    # Azul Oscuro
@@ -95,324 +109,301 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # --- CARGA DE DATOS ---
-def cargar_csv_super_flexible(filepath):
-    encodings = ['utf-8', 'latin-1', 'cp1252', 'ISO-8859-1']
-    separators = [',', ';']
-    for encoding in encodings:
-        for sep in separators:
-            try:
-                df = pd.read_csv(filepath, sep=sep, encoding=encoding)
-                if df.shape[1] > 1: return df
-            except Exception: continue
-    return pd.DataFrame()
-
-@st.cache_data
-def load_data():
-    files = {
-        "leyes": "Auditoría Negocio ALA.xlsx - Leyes pesos y diferencias.csv",
-        "orotec": "Auditoría Negocio ALA.xlsx - base orotec.csv",
-        "gold": "Auditoría Negocio ALA.xlsx -  base gold price.csv",
-        "bases": "Auditoría Negocio ALA.xlsx - comparacion de bases.csv"
-    }
-    loaded = {}
-    for key, name in files.items():
-        if os.path.exists(name):
-            loaded[key] = cargar_csv_super_flexible(name)
-        else:
-            loaded[key] = None
-    return loaded["leyes"], loaded["orotec"], loaded["gold"], loaded["bases"]
+# El caché de datasets, el selector de socio/periodo y el vigilante de archivos están en motor_auditoria.ui
+
+# --- PESTAÑAS PEREZOSAS ---
+# Solo corre la pestaña abierta; lo que calcula cada una se memoriza por versión de datos y parámetros
+conservar_estado()
+
+def vista(nombre, calcular, *parametros):
+    return vista_memorizada(registro.contexto['app'], resultado, nombre, calcular, *parametros)
 
 # --- PROCESAMIENTO ---
-df_leyes, df_orotec, df_gold, df_bases = load_data()
+resultado = elegir_dataset(registro)
+resultado = rango_global(registro.contexto['app'], resultado)
+df_leyes, df_orotec, df_gold, df_bases = (resultado['datos'][k] for k in ['leyes', 'orotec', 'gold', 'bases'])
 
 if df_leyes is not None and not df_leyes.empty:
     
-    # Normalización
-    for df in [df_leyes, df_orotec, df_gold, df_bases]:
-        if df is not None:
-            df.columns = df.columns.str.lower().str.strip()
-
-    # Limpieza
-    def limpiar_nums(df, cols):
-        if df is None: return df
-        for col in cols:
-            if col in df.columns:
-                if df[col].dtype == object:
-                    df[col] = df[col].astype(str).str.replace('$', '', regex=False).str.replace(',', '.').str.replace(' ', '')
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        return df
-
-    if 'no' in df_leyes.columns:
-        df_leyes['no'] = pd.to_numeric(df_leyes['no'], errors='coerce').fillna(0).astype(int)
-
-    df_leyes = limpiar_nums(df_leyes, ['peso taller', 'peso factura', 'diferencia en valor', 'ley taller', 'ley jerusalen', 'diferencia peso oro puro', 'peso oro puro real', 'peso oro puro factura'])
-    
-    if df_bases is not None:
-        cols_to_clean = [c for c in df_bases.columns if c != 'fecha']
-        df_bases = limpiar_nums(df_bases, cols_to_clean)
-
-    df_orotec = limpiar_nums(df_orotec, ['base orotec']) 
-    df_gold = limpiar_nums(df_gold, ['base oro gold', 'base medellin']) 
-
-    # Fechas
-    for df in [df_leyes, df_orotec, df_gold, df_bases]:
-        if df is not None and 'fecha' in df.columns:
-            df['fecha_dt'] = pd.to_datetime(df['fecha'], errors='coerce')
-            df['fecha_norm'] = df['fecha_dt'].dt.strftime('%Y-%m-%d')
-            df.sort_values('fecha_dt', inplace=True)
-
     # --- INTERFAZ GRÁFICA ---
     st.markdown("### 🚨 Monitor de Control (Pérdidas y Diferencias)")
     st.markdown("---")
     
     # PESTAÑAS (AUDITORÍA PURA)
-    tab1, tab_bases, tab3, tab4, tab5 = st.tabs([
+    tab1, tab_bases, tab3, tab4, tab5, tab6, *tab_diag = st.tabs([
         "💸 Fugas de Capital", 
         "📉 Análisis de Bases", 
         "⚖️ Auditoría de Gramajes",
         "🧪 Análisis de Leyes",
-        "📅 Detalle Operativo Diario"
-    ])
+        "📅 Detalle Operativo Diario",
+        "📆 Resumen por Periodo"
+    ] + (["🩺 Diagnóstico"] if DIAGNOSTICO else []), key='pestana', on_change='rerun')
 
     # --- PESTAÑA 1: FUGAS ---
-    with tab1:
-        st.subheader("Resumen de Fugas Detectadas")
+    if tab1.open:
+        with tab1, etapa('pestaña.fugas'):
+            st.subheader("Resumen de Fugas Detectadas")
         
-        IMPASSE_VALOR = 1531798.20
-        IMPASSE_PESO = 3.69
-        
-        col_val = 'diferencia en valor'
-        df_perdidas = df_leyes[df_leyes[col_val] < 0].copy()
-        
-        fuga_operativa = df_perdidas[col_val].sum()
-        gramos_faltantes_op = df_leyes[df_leyes['diferencia peso oro puro'] > 0]['diferencia peso oro puro'].sum()
-        
-        total_dinero_perdido = fuga_operativa + (-IMPASSE_VALOR)
-        total_gramos_perdidos = gramos_faltantes_op + IMPASSE_PESO
-        dias_con_fugas = len(df_perdidas) + 1 
-
-        c1, c2, c3 = st.columns(3)
-        with c1: st.metric("Dinero Faltante Total", f"${abs(total_dinero_perdido):,.0f}", delta="Diferencia Económica", delta_color="inverse")
-        with c2: st.metric("Oro Puro Faltante", f"{total_gramos_perdidos:.2f} g", delta="Merma + Impasse", delta_color="inverse")
-        with c3: st.metric("Días con Incidencias", f"{dias_con_fugas}", help="Días con diferencias + Impasse")
-
-        # BOTÓN DESCARGA
-        csv_fugas = df_perdidas.to_csv(index=False).encode('utf-8')
-        st.download_button(label="💾 Descargar Reporte de Fugas (CSV)", data=csv_fugas, file_name='reporte_fugas.csv', mime='text/csv')
-
-        # NOTA CLARA
-        st.markdown(f"""
-        <div class='method-box'>
-        <b>ℹ️ Origen de las Diferencias:</b><br>
-        1. <b>Fuga Operativa:</b> Es la diferencia matemática entre lo que dice la factura y el cálculo real (Peso × Ley).<br>
-        2. <b>Impasse (19/05/2025):</b> Pérdida específica reportada por espectrometría de <b>{IMPASSE_PESO} g</b> (${IMPASSE_VALOR:,.0f}).
-        </div>
-        """, unsafe_allow_html=True)
-
-        st.divider()
-        
-        st.markdown("#### 📢 Hallazgos Administrativos (Observaciones)")
-        hallazgos = []
+            fugas = resultado['fugas']
+            df_perdidas = fugas['df_perdidas']
+            total_dinero_perdido = fugas['total_dinero_perdido']
+            total_gramos_perdidos = fugas['total_gramos_perdidos']
+            dias_con_fugas = fugas['dias_con_fugas']
+
+            c1, c2, c3 = st.columns(3)
+            with c1: st.metric("Dinero Faltante Total", f"${abs(total_dinero_perdido):,.0f}", delta="Diferencia Económica", delta_color="inverse")
+            with c2: st.metric("Oro Puro Faltante", f"{total_gramos_perdidos:.2f} g", delta="Merma + Impasse", delta_color="inverse")
+            with c3: st.metric("Días con Incidencias", f"{dias_con_fugas}", help="Días con diferencias + Impasse")
+
+            # BOTÓN DESCARGA
+            boton_descarga(df_perdidas, 'reporte_fugas', 'fugas', etiqueta="💾 Descargar Reporte de Fugas (CSV/Excel)")
+
+            # NOTA CLARA
+            st.markdown(f"""
+            <div class='method-box'>
+            <b>ℹ️ Origen de las Diferencias:</b><br>
+            1. <b>Fuga Operativa:</b> Es la diferencia matemática entre lo que dice la factura y el cálculo real (Peso × Ley).<br>
+            2. <b>Impasse (19/05/2025):</b> Pérdida específica reportada por espectrometría de <b>{IMPASSE_PESO} g</b> (${IMPASSE_VALOR:,.0f}).{'' if resultado.get('impasse', True) else ' <i>Fuera del rango elegido: no se incluye.</i>'}
+            </div>
+            """, unsafe_allow_html=True)
+
+            st.divider()
         
-        if 'observaciones' in df_gold.columns:
-            for idx, row in df_gold.iterrows():
-                obs = str(row['observaciones']).lower()
-                fecha = row['fecha_norm']
-                obs_real = row['observaciones']
-                
-                if fecha == '2025-11-27': obs_real = "⚠️ Yarden pone en la factura más de lo que debería pagar. " + str(obs_real)
-                if fecha == '2025-05-19': continue 
-                if len(obs) > 4 and "nan" not in obs and "ok" not in obs:
-                    hallazgos.append({"Fecha": fecha, "Observación": obs_real})
-                    
-        if 'observaciones' in df_orotec.columns:
-             for idx, row in df_orotec.iterrows():
-                obs = str(row['observaciones']).lower()
-                fecha = row['fecha_norm']
-                obs_real = row['observaciones']
-                if fecha == '2025-11-27': obs_real = "⚠️ Yarden pone en la factura más de lo que debería pagar. " + str(obs_real)
-                if fecha == '2025-05-19': continue 
-                if len(obs) > 4 and "nan" not in obs and "ok" not in obs and "referencia" not in obs:
-                    hallazgos.append({"Fecha": fecha, "Observación": obs_real})
-
-        if hallazgos:
-            df_hallazgos = pd.DataFrame(hallazgos).drop_duplicates()
-            def resaltar(row): return ['background-color: #F9E79F; color: #7D6608; font-weight: bold'] * len(row) if row['Fecha'] == '2025-11-27' else [''] * len(row)
-            st.dataframe(df_hallazgos.style.apply(resaltar, axis=1), use_container_width=True, hide_index=True)
-        else:
-            st.info("Sin observaciones adicionales.")
-
-        st.divider()
-        st.markdown("#### 📉 Días con Mayor Impacto Económico")
-        df_neg = df_perdidas.sort_values(col_val).head(10).copy()
-        if not df_neg.empty:
-            df_neg['Pérdida ($)'] = df_neg[col_val].abs()
-            fig = px.bar(df_neg, x='fecha', y='Pérdida ($)', color_discrete_sequence=[COLOR_DANGER])
-            fig.update_layout(template="plotly_white", font=dict(size=18))
-            st.plotly_chart(fig, use_container_width=True)
+            st.markdown("#### 📢 Hallazgos Administrativos (Observaciones)")
+            df_hallazgos = resultado['hallazgos']
+
+            if not df_hallazgos.empty:
+                def resaltar(df): return css_filas(df, df['Fecha'] == FECHA_YARDEN, 'background-color: #F9E79F; color: #7D6608; font-weight: bold')
+                with etapa('fugas.tabla_hallazgos', len(df_hallazgos)): tabla_paginada(df_hallazgos, 'hallazgos', estilos=resaltar, use_container_width=True, hide_index=True)
+                boton_descarga(df_hallazgos, 'hallazgos_administrativos', 'hallazgos')
+            else:
+                st.info("Sin observaciones adicionales.")
+
+            st.divider()
+            st.markdown("#### 📉 Días con Mayor Impacto Económico")
+            df_neg = fugas['df_top_perdidas']
+            if not df_neg.empty:
+                def figura_fugas():
+                    fig = px.bar(df_neg, x='fecha', y='Pérdida ($)', color_discrete_sequence=[COLOR_DANGER])
+                    fig.update_layout(template="plotly_white", font=dict(size=18))
+                    return fig
+                with etapa('fugas.grafico', len(df_neg)): st.plotly_chart(vista('fugas.grafico', figura_fugas), use_container_width=True)
 
     # --- PESTAÑA 2: BASES ---
-    with tab_bases:
-        st.subheader("📉 Auditoría de Bases de Liquidación")
+    if tab_bases.open:
+        with tab_bases, etapa('pestaña.bases'):
+            st.subheader("📉 Auditoría de Bases de Liquidación")
         
-        if df_bases is not None and not df_bases.empty:
-            c_ala = next((c for c in df_bases.columns if 'ala' in c), None)
-            c_cap = next((c for c in df_bases.columns if '4%' in c or 'compra' in c), None)
-            c_acu = next((c for c in df_bases.columns if '93%' in c or 'acuerdo' in c), None)
-
-            if c_ala and c_cap and c_acu:
-                df_view = df_bases.copy()
-                for col in [c_ala, c_cap, c_acu]:
-                    if df_view[col].mean() < 10000: df_view[col] = df_view[col] * 1000
-                
-                df_view['Dif Capital'] = df_view[c_ala] - df_view[c_cap]
-                dias_alerta = (df_view['Dif Capital'] < 0).sum()
-                
-                st.markdown("#### 📋 Control de Precios ($/g)")
-                k1, k2, k3 = st.columns(3)
-                with k1: st.metric("Costo Compra (Referencia)", f"${df_view[c_cap].mean():,.0f} /g", help="Precio mínimo de referencia (Suelo)")
-                with k2: st.metric("Base Oficial (93% Acuerdo)", f"${df_view[c_acu].mean():,.0f} /g", help="Base objetiva para cálculo de utilidad")
-                with k3: st.metric("Referencia ALA (Real)", f"${df_view[c_ala].mean():,.0f} /g", delta=f"${df_view[c_ala].mean() - df_view[c_cap].mean():,.0f} vs Costo")
+            if df_bases is not None and not df_bases.empty:
+                bases = resultado['bases']
 
-                st.divider()
-
-                # NOTA CLARA SOBRE EL 93%
-                st.markdown(f"""
-                <div class='method-box'>
-                <b>ℹ️ Regla de Negocio (Bases):</b><br>
-                • <b>Costo de Compra:</b> Es solo una referencia del "suelo" o costo del taller.<br>
-                • <b>Base 93% (Oficial):</b> Es la <b>meta obligatoria</b>. La utilidad siempre debe calcularse o compararse contra este valor acordado. Si la referencia ALA está por debajo, se está perdiendo valor.
-                </div>
-                """, unsafe_allow_html=True)
-
-                if dias_alerta > 0:
-                    st.markdown(f"""<div class='capital-alert'>🚨 ALERTA CRÍTICA: En <b>{dias_alerta} días</b>, la referencia ALA fue INFERIOR incluso al costo de compra.</div>""", unsafe_allow_html=True)
-
-                st.markdown("#### 📈 Comparativa de Bases ($/gramo)")
-                fig = go.Figure()
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_cap], name="Costo Compra (Ref)", line=dict(color='black', width=3, dash='dot')))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_acu], name="Base Oficial (93%)", line=dict(color=COLOR_SUCCESS, width=3)))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_ala], name="Ref. ALA (Ejecución)", line=dict(color=COLOR_DANGER, width=4)))
+                if bases['columnas']:
+                    c_ala, c_cap, c_acu = bases['columnas']['ala'], bases['columnas']['capital'], bases['columnas']['acuerdo']
+                    df_view = bases['df_view']
+                    dias_alerta = bases['dias_alerta']
                 
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_cap], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
-                fig.add_trace(go.Scatter(x=df_view['fecha'], y=df_view[c_ala], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(192, 57, 43, 0.2)', showlegend=False, hoverinfo='skip'))
-                
-                fig.update_layout(template="plotly_white", height=500, font=dict(size=16), legend=dict(orientation="h", y=1.1))
-                st.plotly_chart(fig, use_container_width=True)
-
-                st.markdown("#### 🗓️ Detalle Diario")
-                df_table = df_view[['fecha', c_cap, c_acu, c_ala, 'Dif Capital']].copy()
-                df_table.columns = ['Fecha', 'Costo Compra ($/g)', 'Base Oficial 93% ($/g)', 'Ref. ALA ($/g)', 'Dif vs Costo ($/g)']
-                def color_red(val): return f'color: {"red" if val < 0 else "black"}; font-weight: bold;'
-                st.dataframe(df_table.style.format({"Costo Compra ($/g)": "${:,.0f}", "Base Oficial 93% ($/g)": "${:,.0f}", "Ref. ALA ($/g)": "${:,.0f}", "Dif vs Costo ($/g)": "${:,.0f}"}).applymap(color_red, subset=['Dif vs Costo ($/g)']), use_container_width=True)
-            else: st.error("Error en columnas de bases.")
+                    st.markdown("#### 📋 Control de Precios ($/g)")
+                    k1, k2, k3 = st.columns(3)
+                    with k1: st.metric("Costo Compra (Referencia)", f"${bases['promedio_capital']:,.0f} /g", help="Precio mínimo de referencia (Suelo)")
+                    with k2: st.metric("Base Oficial (93% Acuerdo)", f"${bases['promedio_acuerdo']:,.0f} /g", help="Base objetiva para cálculo de utilidad")
+                    with k3: st.metric("Referencia ALA (Real)", f"${bases['promedio_ala']:,.0f} /g", delta=f"${bases['promedio_ala'] - bases['promedio_capital']:,.0f} vs Costo")
+
+                    st.divider()
+
+                    # NOTA CLARA SOBRE EL 93%
+                    st.markdown(f"""
+                    <div class='method-box'>
+                    <b>ℹ️ Regla de Negocio (Bases):</b><br>
+                    • <b>Costo de Compra:</b> Es solo una referencia del "suelo" o costo del taller.<br>
+                    • <b>Base 93% (Oficial):</b> Es la <b>meta obligatoria</b>. La utilidad siempre debe calcularse o compararse contra este valor acordado. Si la referencia ALA está por debajo, se está perdiendo valor.
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                    if dias_alerta > 0:
+                        st.markdown(f"""<div class='capital-alert'>🚨 ALERTA CRÍTICA: En <b>{dias_alerta} días</b>, la referencia ALA fue INFERIOR incluso al costo de compra.</div>""", unsafe_allow_html=True)
+
+                    st.markdown("#### 📈 Comparativa de Bases ($/gramo)")
+                    rango = rango_visible(df_view, "Rango visible:", key='rango_bases') if len(df_view) > PUNTOS_MAXIMOS else None
+                    def grafico_bases():
+                        df_graf = filtrar_rango(df_view, rango)
+                        # LTTB por serie; los días en que ALA quedó bajo capital se dibujan siempre
+                        if len(df_view) > PUNTOS_MAXIMOS: df_graf = reducir_serie(df_graf, [c_cap, c_acu, c_ala, 'Dif Capital'], obligatorios=df_graf['Alerta'])
+                        fig = go.Figure()
+                        # La franja ALA-costo sale del propio trazo ALA (tonexty contra costo), sin trazas auxiliares
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_acu], name="Base Oficial (93%)", line=dict(color=COLOR_SUCCESS, width=3), legendrank=2))
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_cap], name="Costo Compra (Ref)", line=dict(color='black', width=3, dash='dot'), legendrank=1))
+                        fig.add_trace(go.Scatter(x=df_graf['fecha'], y=df_graf[c_ala], name="Ref. ALA (Ejecución)", line=dict(color=COLOR_DANGER, width=4), fill='tonexty', fillcolor='rgba(192, 57, 43, 0.2)', legendrank=3))
+
+                        fig.update_layout(template="plotly_white", height=500, font=dict(size=16), legend=dict(orientation="h", y=1.1))
+                        return len(df_graf), fig
+                    puntos, fig = vista('bases.grafico', grafico_bases, rango)
+                    if len(df_view) > PUNTOS_MAXIMOS: st.caption(f"Mostrando {puntos:,} de {len(df_view):,} días; los días con alerta se conservan todos.")
+                    with etapa('bases.grafico', puntos): st.plotly_chart(fig, use_container_width=True)
+
+                    st.markdown("#### 🗓️ Detalle Diario")
+                    def tabla_bases():
+                        df_table = df_view[['fecha', c_cap, c_acu, c_ala, 'Dif Capital']].copy()
+                        df_table.columns = ['Fecha', 'Costo Compra ($/g)', 'Base Oficial 93% ($/g)', 'Ref. ALA ($/g)', 'Dif vs Costo ($/g)']
+                        return df_table
+                    df_table = vista('bases.tabla', tabla_bases)
+                    def color_red(df): return css_negativos(df, ['Dif vs Costo ($/g)'], 'color: red; font-weight: bold;', 'color: black; font-weight: bold;')
+                    with etapa('bases.tabla', len(df_table)): tabla_paginada(df_table, 'bases', estilos=color_red, formato={"Costo Compra ($/g)": "${:,.0f}", "Base Oficial 93% ($/g)": "${:,.0f}", "Ref. ALA ($/g)": "${:,.0f}", "Dif vs Costo ($/g)": "${:,.0f}"}, use_container_width=True)
+                    boton_descarga(df_table, 'detalle_bases', 'bases')
+                else: st.error("Error en columnas de bases.")
 
     # --- PESTAÑA 3: PESOS ---
-    with tab3:
-        st.subheader(" Auditoría de Gramajes (Faltantes Físicos)")
+    if tab3.open:
+        with tab3, etapa('pestaña.pesos'):
+            st.subheader(" Auditoría de Gramajes (Faltantes Físicos)")
         
-        st.markdown("""
-        <div class='method-box'>
-        <b>⚖️ Control Físico:</b> Comparación estricta entre el <b>Peso Bruto</b> que salió del taller vs. el <b>Peso Bruto</b> recibido y facturado (antes de fundición/purificación).
-        </div>
-        """, unsafe_allow_html=True)
+            st.markdown("""
+            <div class='method-box'>
+            <b>⚖️ Control Físico:</b> Comparación estricta entre el <b>Peso Bruto</b> que salió del taller vs. el <b>Peso Bruto</b> recibido y facturado (antes de fundición/purificación).
+            </div>
+            """, unsafe_allow_html=True)
         
-        df_view = df_leyes.copy()
-        df_view['diff_peso'] = df_view['peso taller'] - df_view['peso factura']
-        c1, c2, c3 = st.columns(3)
-        with c1: st.metric("Peso Salida Taller", f"{df_view['peso taller'].sum():,.2f} g")
-        with c2: st.metric("Peso Llegada Factura", f"{df_view['peso factura'].sum():,.2f} g")
-        with c3: st.metric("Merma Física", f"{df_view['diff_peso'].sum():,.2f} g", delta_color="inverse")
+            pesos = resultado['pesos']
+            df_view = pesos['df_view']
+            c1, c2, c3 = st.columns(3)
+            with c1: st.metric("Peso Salida Taller", f"{pesos['peso_taller']:,.2f} g")
+            with c2: st.metric("Peso Llegada Factura", f"{pesos['peso_factura']:,.2f} g")
+            with c3: st.metric("Merma Física", f"{pesos['merma']:,.2f} g", delta_color="inverse")
         
-        st.divider()
+            st.divider()
         
-        # TABLA RECUPERADA (Detalle de Mermas)
-        st.markdown("#### 📉 Detalle de Mermas de Peso (> 1g)")
-        df_s = df_view[df_view['diff_peso'].abs() > 1.0].sort_values('fecha_dt', ascending=False)
+            # TABLA RECUPERADA (Detalle de Mermas)
+            st.markdown("#### 📉 Detalle de Mermas de Peso (> 1g)")
+            df_s = vista('pesos.filtro', lambda: df_view[df_view['diff_peso'].abs() > 1.0].sort_values('fecha_dt', ascending=False))
         
-        fig_p = go.Figure()
-        fig_p.add_trace(go.Bar(x=df_s['fecha'], y=df_s['peso taller'], name='Taller', marker_color=COLOR_SUCCESS))
-        fig_p.add_trace(go.Bar(x=df_s['fecha'], y=df_s['peso factura'], name='Factura', marker_color=COLOR_DANGER))
-        fig_p.update_layout(template="plotly_white", legend=dict(orientation="h", y=1.1), font=dict(size=16))
-        st.plotly_chart(fig_p, use_container_width=True)
+            rango = rango_visible(df_s, "Rango visible:", key='rango_pesos') if len(df_s) > PUNTOS_MAXIMOS else None
+            def grafico_pesos():
+                df_graf = df_s
+                if len(df_s) > PUNTOS_MAXIMOS:
+                    # df_s va de la fecha más reciente a la más antigua; se reduce en orden cronológico
+                    df_graf = filtrar_rango(df_s, rango).sort_values('fecha_dt', kind='stable')
+                    # Mín/máx de la diferencia por tramo: las mayores mermas y excesos siempre aparecen
+                    df_graf = reducir_serie(df_graf, ['diff_peso'], modo='minmax').sort_values('fecha_dt', ascending=False, kind='stable')
+                fig_p = go.Figure()
+                fig_p.add_trace(go.Bar(x=df_graf['fecha'], y=df_graf['peso taller'], name='Taller', marker_color=COLOR_SUCCESS))
+                fig_p.add_trace(go.Bar(x=df_graf['fecha'], y=df_graf['peso factura'], name='Factura', marker_color=COLOR_DANGER))
+                fig_p.update_layout(template="plotly_white", legend=dict(orientation="h", y=1.1), font=dict(size=16))
+                return len(df_graf), fig_p
+            puntos, fig_p = vista('pesos.grafico', grafico_pesos, rango)
+            if len(df_s) > PUNTOS_MAXIMOS: st.caption(f"Mostrando {puntos:,} de {len(df_s):,} días con diferencia; la tabla tiene el detalle completo.")
+            with etapa('pesos.grafico', puntos): st.plotly_chart(fig_p, use_container_width=True)
         
-        st.dataframe(df_s[['fecha', 'peso taller', 'peso factura', 'diff_peso']].style.format("{:.2f}", subset=['peso taller', 'peso factura', 'diff_peso']), use_container_width=True)
+            with etapa('pesos.tabla', len(df_s)): tabla_paginada(df_s[['fecha', 'peso taller', 'peso factura', 'diff_peso']], 'pesos', formato={c: "{:.2f}" for c in ['peso taller', 'peso factura', 'diff_peso']}, use_container_width=True)
+            boton_descarga(df_s[['fecha', 'peso taller', 'peso factura', 'diff_peso']], 'diferencias_peso', 'pesos')
 
     # --- PESTAÑA 4: CALIDAD (Análisis de Leyes) ---
-    with tab4:
-        st.subheader("🧪 Análisis de Leyes (Pureza)")
-        df_q = df_leyes.copy()
-        df_q['diff'] = df_q['ley taller'] - df_q['ley jerusalen']
+    if tab4.open:
+        with tab4, etapa('pestaña.leyes'):
+            st.subheader("🧪 Análisis de Leyes (Pureza)")
+            leyes = resultado['leyes']
         
-        # 1. MERMA DE LEY
-        st.markdown("#### 🔻 Merma de Ley (Taller > Jerusalén)")
-        st.caption("Casos donde la ley medida en el Taller fue SUPERIOR a la reconocida en Factura.")
-        df_mermas = df_q[df_q['diff'] > 0.001].sort_values('fecha_dt', ascending=False)
-        if not df_mermas.empty:
-            fig1 = px.bar(df_mermas, x='diff', y='fecha', orientation='h', text='diff', title="Discrepancia Negativa (Merma)")
-            fig1.update_traces(marker_color=COLOR_DANGER, texttemplate='%{text:.4f}')
-            fig1.update_layout(template="plotly_white", font=dict(size=14))
-            st.plotly_chart(fig1, use_container_width=True)
-            st.dataframe(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']].style.format("{:.4f}", subset=['ley taller', 'ley jerusalen', 'diff']), use_container_width=True)
-        else: st.success("Sin mermas significativas de ley.")
-
-        st.divider()
+            # 1. MERMA DE LEY
+            st.markdown("#### 🔻 Merma de Ley (Taller > Jerusalén)")
+            st.caption("Casos donde la ley medida en el Taller fue SUPERIOR a la reconocida en Factura.")
+            df_mermas = leyes['df_mermas']
+            if not df_mermas.empty:
+                def figura_merma():
+                    fig1 = px.bar(df_mermas, x='diff', y='fecha', orientation='h', text='diff', title="Discrepancia Negativa (Merma)")
+                    fig1.update_traces(marker_color=COLOR_DANGER, texttemplate='%{text:.4f}')
+                    fig1.update_layout(template="plotly_white", font=dict(size=14))
+                    return fig1
+                with etapa('leyes.grafico_merma', len(df_mermas)): st.plotly_chart(vista('leyes.grafico_merma', figura_merma), use_container_width=True)
+                with etapa('leyes.tabla_merma', len(df_mermas)): tabla_paginada(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']], 'mermas', formato={c: "{:.4f}" for c in ['ley taller', 'ley jerusalen', 'diff']}, use_container_width=True)
+                boton_descarga(df_mermas[['fecha', 'ley taller', 'ley jerusalen', 'diff']], 'merma_ley', 'merma_ley')
+            else: st.success("Sin mermas significativas de ley.")
+
+            st.divider()
         
-        # 2. ALZA DE LEY (RECUPERADO EL GRÁFICO)
-        st.markdown("#### 🟢 Alza de Ley (Jerusalén > Taller)")
-        st.caption("Casos donde la ley de Factura fue SUPERIOR a la del Taller.")
+            # 2. ALZA DE LEY (RECUPERADO EL GRÁFICO)
+            st.markdown("#### 🟢 Alza de Ley (Jerusalén > Taller)")
+            st.caption("Casos donde la ley de Factura fue SUPERIOR a la del Taller.")
         
-        df_ganancia = df_q[(df_q['diff'] < -0.001) & (df_q['ley taller'] > 0.01)].sort_values('fecha_dt', ascending=False)
-        df_ganancia['diff_abs'] = df_ganancia['diff'].abs()
+            df_ganancia = leyes['df_ganancia']
         
-        if not df_ganancia.empty:
-            # Gráfico de Alza de Ley
-            fig2 = px.bar(df_ganancia, x='diff_abs', y='fecha', orientation='h', text='diff_abs', title="Diferencia Positiva (Alza)")
-            fig2.update_traces(marker_color=COLOR_SUCCESS, texttemplate='%{text:.4f}')
-            fig2.update_layout(template="plotly_white", font=dict(size=14))
-            st.plotly_chart(fig2, use_container_width=True)
+            if not df_ganancia.empty:
+                # Gráfico de Alza de Ley
+                def figura_alza():
+                    fig2 = px.bar(df_ganancia, x='diff_abs', y='fecha', orientation='h', text='diff_abs', title="Diferencia Positiva (Alza)")
+                    fig2.update_traces(marker_color=COLOR_SUCCESS, texttemplate='%{text:.4f}')
+                    fig2.update_layout(template="plotly_white", font=dict(size=14))
+                    return fig2
+                with etapa('leyes.grafico_alza', len(df_ganancia)): st.plotly_chart(vista('leyes.grafico_alza', figura_alza), use_container_width=True)
             
-            st.dataframe(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']].style.format("{:.4f}", subset=['ley taller', 'ley jerusalen', 'diff_abs']), use_container_width=True)
-        else:
-            st.info("No hay registros de alza de ley.")
+                with etapa('leyes.tabla_alza', len(df_ganancia)): tabla_paginada(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']], 'ganancia', formato={c: "{:.4f}" for c in ['ley taller', 'ley jerusalen', 'diff_abs']}, use_container_width=True)
+                boton_descarga(df_ganancia[['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']], 'alza_ley', 'alza_ley')
+            else:
+                st.info("No hay registros de alza de ley.")
 
     # --- PESTAÑA 5: DETALLE OPERATIVO ---
-    with tab5:
-        st.header("📅 Consulta Detallada (Operativa y Bases)")
-        fechas = df_gold['fecha_norm'].dropna().unique()
-        f_sel = st.selectbox("Fecha:", fechas)
-
-        if f_sel:
-            row_g = df_gold[df_gold['fecha_norm'] == f_sel].iloc[0]
-            row_l = df_leyes[df_leyes['fecha_norm'] == f_sel]
-            
-            p_taller, p_factura, op_taller, op_factura = 0,0,0,0
-            if not row_l.empty:
-                p_taller = row_l['peso taller'].sum()
-                p_factura = row_l['peso factura'].sum()
-                if 'peso oro puro real' in row_l.columns:
-                    op_taller = row_l['peso oro puro real'].sum()
-                else: op_taller = (row_l['peso taller'] * row_l['ley taller']).sum()
-                if 'peso oro puro factura' in row_l.columns:
-                    op_factura = row_l['peso oro puro factura'].sum()
-                else: op_factura = (row_l['peso factura'] * row_l['ley jerusalen']).sum()
+    if tab5.open:
+        with tab5, etapa('pestaña.diaria'):
+            st.header("📅 Consulta Detallada (Operativa y Bases)")
+            fechas = vista('diaria.fechas', lambda: df_gold['fecha_norm'].dropna().unique())
+            # Otra versión de datos puede no tener la fecha que quedó elegida
+            if len(fechas) and st.session_state.get('consulta_fecha') not in set(fechas): st.session_state['consulta_fecha'] = fechas[0]
+            f_sel = st.selectbox("Fecha:", fechas, key='consulta_fecha')
+
+            if f_sel:
+                with etapa('diaria.consulta'): dia = vista('diaria.consulta', lambda: balance_diario(resultado['diario'], f_sel), f_sel)
+                row_g = dia['gold']
+                p_taller, p_factura, op_taller, op_factura = dia['p_taller'], dia['p_factura'], dia['op_taller'], dia['op_factura']
 
-            st.divider()
+                st.divider()
             
-            st.markdown("### ⚖️ Balance de Masa y Pureza")
-            c1, c2, c3, c4 = st.columns(4)
-            with c1: st.metric("Peso Bruto Taller", f"{p_taller:,.2f} g")
-            with c2: st.metric("Peso Bruto Factura", f"{p_factura:,.2f} g")
-            with c3: st.metric("Oro Puro Real", f"{op_taller:,.2f} g")
-            with c4: st.metric("Oro Puro Factura", f"{op_factura:,.2f} g")
+                st.markdown("### ⚖️ Balance de Masa y Pureza")
+                c1, c2, c3, c4 = st.columns(4)
+                with c1: st.metric("Peso Bruto Taller", f"{p_taller:,.2f} g")
+                with c2: st.metric("Peso Bruto Factura", f"{p_factura:,.2f} g")
+                with c3: st.metric("Oro Puro Real", f"{op_taller:,.2f} g")
+                with c4: st.metric("Oro Puro Factura", f"{op_factura:,.2f} g")
             
-            st.markdown("---")
-            st.markdown("### 💵 Auditoría de Bases Financieras")
-            c_f1, c_f2 = st.columns(2)
-            with c_f1:
-                st.metric("Gold Price (Internacional)", f"${row_g.get('base oro gold', 0):,.0f}")
-            with c_f2:
-                st.metric("Base Oficial (93%)", f"${row_g.get('base medellin', 0):,.0f}", delta_color="inverse")
+                st.markdown("---")
+                st.markdown("### 💵 Auditoría de Bases Financieras")
+                c_f1, c_f2 = st.columns(2)
+                with c_f1:
+                    st.metric("Gold Price (Internacional)", f"${row_g.get('base oro gold', 0):,.0f}")
+                with c_f2:
+                    st.metric("Base Oficial (93%)", f"${row_g.get('base medellin', 0):,.0f}", delta_color="inverse")
+
+    # --- PESTAÑA 6: RESUMEN SEMANAL / MENSUAL ---
+    if tab6.open:
+        with tab6, etapa('pestaña.resumen'):
+            st.header("📆 Resumen Semanal y Mensual")
+            st.markdown("""<div class='method-box'><b>ℹ️ Nota:</b> Agregados de la hoja de leyes precalculados por día, semana (de lunes a domingo) y mes. La fuga es la operativa, sin el impasse.</div>""", unsafe_allow_html=True)
+            cubo = resultado['cubo']
+            st.session_state.setdefault('filtro_grano', 'Mes')
+            grano = GRANOS_RESUMEN[st.segmented_control("Agrupar por:", list(GRANOS_RESUMEN), key='filtro_grano') or 'Mes']
+            df_res = vista('resumen.tabla', lambda: tabla_resumen(vista_cubo(cubo, grano), grano), grano)
+            def grafico_resumen():
+                # Mín/máx por tramo en el grano diario: los días de mayor fuga siempre aparecen
+                df_graf = reducir_serie(df_res, ['Fuga ($)'], modo='minmax')
+                fig_r = go.Figure(go.Bar(x=df_graf['Periodo'], y=df_graf['Fuga ($)'], name='Fuga ($)', marker_color=COLOR_DANGER))
+                fig_r.update_layout(template="plotly_white", font=dict(size=16), yaxis_title="Fuga operativa ($)")
+                return len(df_graf), fig_r
+            puntos, fig_r = vista('resumen.grafico', grafico_resumen, grano)
+            if puntos < len(df_res): st.caption(f"Mostrando {puntos:,} de {len(df_res):,} periodos; la tabla tiene el detalle completo.")
+            with etapa('resumen.grafico', puntos): st.plotly_chart(fig_r, use_container_width=True)
+            with etapa('resumen.tabla', len(df_res)): tabla_paginada(df_res, f'resumen_{grano}', formato=FORMATO_RESUMEN, use_container_width=True, hide_index=True)
+            boton_descarga(df_res, f'resumen_{grano}', 'resumen')
+
+            # Drill-down: los días del mes o de la semana elegida, sin volver a las filas de leyes
+            periodos = cubo[grano].index
+            if grano != 'dia' and len(periodos):
+                st.subheader("🔎 Detalle por Día")
+                clave = f"consulta_resumen_{grano}"
+                if st.session_state.get(clave) not in set(periodos): st.session_state[clave] = periodos[-1]
+                inicio = st.selectbox("Periodo:", periodos, format_func=lambda p: p.strftime(FORMATO_PERIODO[grano]), key=clave)
+                df_dias = vista('resumen.desglose', lambda: tabla_resumen(desglosar(cubo, grano, inicio), 'dia'), grano, inicio)
+                tabla_paginada(df_dias, 'resumen_desglose', formato=FORMATO_RESUMEN, use_container_width=True, hide_index=True)
+                boton_descarga(df_dias, f'resumen_{inicio:%Y-%m-%d}', 'resumen_desglose')
 
 else:
+    tab_diag = []
     st.warning("Esperando datos... Sube los 4 archivos CSV al repositorio.")
+
+# --- PESTAÑA OCULTA: DIAGNÓSTICO ---
+diagnostico(registro, resultado, tab_diag, memo_vistas(registro.contexto['app']))
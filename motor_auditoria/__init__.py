@@ -0,0 +1,19 @@
+"""Motor de cálculo de la auditoría, sin Streamlit: lo usan app.py, auditoria.py y los procesos batch."""
+from .carga import ARCHIVOS, cargar_csv_super_flexible, cargar_datos, detectar_formato_csv, rutas_archivos, version_datos
+from .limpieza import COLUMNAS_NUMERICAS, contar_coerciones, limpiar_nums, preparar_frame
+from .calculos import (
+    FECHA_IMPASSE, FECHA_YARDEN, IMPASSE_PESO, IMPASSE_VALOR, NOTA_YARDEN,
+    agregar_por_dia, balance_diario, calcular_auditoria, calcular_bases, calcular_escenarios,
+    calcular_fugas, calcular_leyes, calcular_pesos, extraer_hallazgos,
+)
+from .cubo import GRANOS, actualizar_cubo, agregar_cubo, desglosar, recortar_cubo, vista_cubo
+from .servicio import obtener_auditoria
+from .almacen import Almacen, abrir_almacen, motor_almacen
+from .datasets import CacheDatasets, descubrir_datasets, resumen_memoria
+from .periodos import auditoria_periodo, extremos, obtener_periodo, recortar
+from .simulador import Simulador
+from .muestreo import PUNTOS_MAXIMOS, reducir_serie
+from .exportar import MIME, exportar_bytes, formatos_disponibles
+from .vistas import MemoVistas
+from .tablas import FILAS_POR_PAGINA, css_filas, css_negativos, paginar
+from .instrumentacion import etapa, exportar_jsonl, iniciar_registro
@@ -0,0 +1,345 @@
+"""Almacén analítico embebido: los cuatro archivos preparados como tablas DuckDB (o SQLite) y los cálculos
+de la auditoría como consultas SQL que devuelven solo las filas y sumas que necesita la interfaz.
+
+Las tablas se llenan desde el caché Parquet (un row group por mes), sin pasar por frames de pandas.
+Opcional: AUDITORIA_ALMACEN=duckdb, sqlite o auto (DuckDB si está instalado, si no SQLite). Sin la
+variable, sin el motor pedido o sin el caché Parquet al día, todo se calcula con pandas como siempre.
+Los resultados son los mismos: las filas vuelven con el índice y los tipos del frame preparado.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .cache import CACHE_DIR, VERSION_CACHE, _clave, modelo_cache, parquet_vigente
+from .calculos import COL_VALOR, IMPASSE_PESO, calcular_fugas, calcular_leyes, extraer_hallazgos
+from .carga import rutas_archivos
+from .instrumentacion import etapa
+
+try:
+    import duckdb
+except ImportError:  # Sin DuckDB, 'auto' usa SQLite
+    duckdb = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow no hay caché Parquet del que llenar las tablas
+    pq = None
+
+MOTOR_ALMACEN = os.environ.get('AUDITORIA_ALMACEN', '').lower()
+TABLAS = ['leyes', 'orotec', 'gold', 'bases']
+FILAS_POR_BLOQUE = 50_000
+INTENTOS = 3
+SEGUNDOS_ESPERA = 60  # SQLite: cuánto espera a otro proceso que está actualizando la misma base
+
+log = logging.getLogger(__name__)
+
+def motor_almacen(motor=MOTOR_ALMACEN):
+    # 'duckdb', 'sqlite' o None si el almacén está apagado o el motor pedido no está instalado
+    if motor == 'auto': return 'duckdb' if duckdb is not None else 'sqlite'
+    if motor == 'duckdb' and duckdb is None: return None
+    return motor if motor in ('duckdb', 'sqlite') else None
+
+def _q(nombre):
+    # Las columnas del export tienen espacios y '%': siempre entre comillas
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+def _literal(texto):
+    return "'" + str(texto).replace("'", "''") + "'"
+
+def _tipo_sqlite(tipo):
+    if pa.types.is_floating(tipo): return 'REAL'
+    if pa.types.is_integer(tipo) or pa.types.is_boolean(tipo): return 'INTEGER'
+    return 'TEXT'
+
+def _valores(columna):
+    # Fechas como texto ISO (_como las vuelve a convertir); categorías como sus textos
+    if pa.types.is_timestamp(columna.type) or pa.types.is_date(columna.type): columna = columna.cast(pa.string())
+    return columna.to_pylist()
+
+def _fuentes(version):
+    # {tabla: (ruta del Parquet, manifiesto)} de los archivos presentes. Un archivo sin caché al día, o
+    # con un caché de otra versión, impide abrir el almacén: el cálculo sigue con pandas
+    if pq is None: raise RuntimeError("Sin pyarrow no hay caché Parquet para el almacén")
+    rutas = rutas_archivos(version[0])
+    fuentes = {}
+    for key, tamano, mtime in version[1]:
+        if tamano is None: continue
+        fuente = parquet_vigente(key, rutas[key])
+        if fuente is None or (fuente[1]['size'], fuente[1]['mtime_ns']) != (tamano, mtime):
+            raise RuntimeError(f"El caché Parquet de {key} no corresponde a la versión {version}")
+        fuentes[key] = fuente
+    if 'leyes' not in fuentes: raise RuntimeError(f"Sin el archivo de leyes no hay auditoría en {version[0]}")
+    return fuentes
+
+def ruta_almacen(directorio, motor):
+    return os.path.join(CACHE_DIR, 'almacen', f"{_clave(os.path.abspath(directorio))}.{motor}")
+
+def _borrar_antiguos():
+    # Versiones anteriores guardaban un archivo por versión de datos directamente en CACHE_DIR
+    try: nombres = os.listdir(CACHE_DIR)
+    except OSError: return
+    for nombre in nombres:
+        if nombre.startswith('almacen-'):
+            try: os.remove(os.path.join(CACHE_DIR, nombre))
+            except OSError: pass
+
+_locks_rutas = {}
+_lock_rutas = threading.Lock()
+
+def _lock_ruta(ruta):
+    with _lock_rutas: return _locks_rutas.setdefault(ruta, threading.Lock())
+
+class Almacen:
+    # Una base por directorio de datos, actualizada en sitio: al abrir una versión solo se rehacen las
+    # tablas cuyo archivo cambió (tabla _firmas). Cada una se arma por bloques con otro nombre y se
+    # cambia por la vieja en una transacción; las consultas corren en una transacción de lectura, así
+    # que otro proceso que la actualice al mismo tiempo no mezcla versiones en un mismo cálculo.
+    # DuckDB: la base al día se abre de solo lectura y varios procesos la comparten; para actualizarla
+    # hay que tenerla sola, y si otro la está usando abrir_almacen devuelve None (se calcula con pandas)
+    def __init__(self, version, motor):
+        self.motor = motor
+        self.ruta = ruta_almacen(version[0], motor)
+        self.fuentes = _fuentes(version)
+        # Frames vacíos con el índice y los tipos del frame preparado, para las filas que devuelve SQL
+        self.modelos = {key: modelo_cache(key, ruta, manifiesto) for key, (ruta, manifiesto) in self.fuentes.items()}
+        self.conteos = {key: pq.ParquetFile(ruta).metadata.num_rows for key, (ruta, _) in self.fuentes.items()}
+        # La versión del caché va en la firma: un cambio en la limpieza rehace las tablas
+        archivos = {key: (tamano, mtime) for key, tamano, mtime in version[1]}
+        self.firmas = {nombre: _clave(VERSION_CACHE, archivos.get(nombre)) for nombre in TABLAS if nombre in self.fuentes}
+        self._lock = threading.Lock()
+        self._con = self._escritura = None
+        _borrar_antiguos()
+        os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+        # Los hilos de un proceso la actualizan de a uno; entre procesos deciden los bloqueos del motor
+        with _lock_ruta(self.ruta):
+            try:
+                for _ in range(INTENTOS):
+                    if self._al_dia(): break
+                    self._abrir(escritura=True)
+                    self._actualizar()
+                else:
+                    raise RuntimeError(f"El almacén {self.ruta} cambió de versión {INTENTOS} veces mientras se abría")
+            except Exception:
+                if self._con is not None: self._con.close()
+                raise
+
+    def _abrir(self, escritura):
+        # SQLite: una sola conexión para leer y escribir. DuckDB: de solo lectura salvo para actualizar
+        if self._con is not None and (self.motor == 'sqlite' or self._escritura == escritura): return
+        if self._con is not None: self._con.close()
+        self._con, self._escritura = None, escritura
+        if self.motor == 'duckdb':
+            self._con = duckdb.connect(self.ruta, read_only=not escritura)
+        else:
+            # WAL: quien lee conserva su versión mientras otro proceso escribe
+            self._con = sqlite3.connect(self.ruta, timeout=SEGUNDOS_ESPERA, isolation_level=None, check_same_thread=False)
+            self._ejecutar('PRAGMA auto_vacuum = FULL')  # Solo cuenta en una base nueva: lo que se borra no se queda en disco
+            if self._ejecutar('PRAGMA journal_mode').fetchone()[0] != 'wal': self._ejecutar('PRAGMA journal_mode = WAL')
+        if escritura or self.motor == 'sqlite': self._ejecutar('CREATE TABLE IF NOT EXISTS _firmas (tabla VARCHAR PRIMARY KEY, firma VARCHAR)')
+
+    def _al_dia(self):
+        # Abre la transacción de lectura si la base ya tiene las tablas de esta versión
+        try:
+            self._abrir(escritura=False)
+        except Exception:
+            if self.motor == 'sqlite': raise
+            return False  # DuckDB: la base todavía no existe o otro proceso la está actualizando
+        self._ejecutar('BEGIN TRANSACTION')
+        if self._guardadas() == self.firmas: return True
+        self._ejecutar('ROLLBACK')
+        return False
+
+    def _ejecutar(self, sql, parametros=()):
+        return self._con.execute(sql, list(parametros))
+
+    def _guardadas(self):
+        return dict(self._ejecutar('SELECT tabla, firma FROM _firmas').fetchall())
+
+    def _actualizar(self):
+        guardadas = self._guardadas()
+        for nombre in TABLAS:
+            firma = self.firmas.get(nombre)
+            if guardadas.get(nombre) == firma: continue
+            temporal = None
+            if firma is not None:
+                temporal = f"_{nombre}_{os.getpid()}_{threading.get_ident()}"
+                self._ejecutar(f"DROP TABLE IF EXISTS {temporal}")
+                with etapa(f'almacen.{nombre}', filas=self.conteos[nombre]): self._cargar(temporal, self.fuentes[nombre][0])
+            self._reemplazar(nombre, temporal, firma)
+
+    def _cargar(self, nombre, ruta):
+        # Directo del Parquet. _fila es la etiqueta del índice (guardado como columna) y _orden la posición
+        # en el frame, para devolver las filas igual que un filtro de pandas
+        archivo = pq.ParquetFile(ruta)
+        indice = archivo.schema_arrow.pandas_metadata['index_columns'][0]
+        if self.motor == 'duckdb':
+            # DuckDB lee el Parquet por su cuenta, row group por row group
+            self._ejecutar(f"CREATE TABLE {nombre} AS SELECT * EXCLUDE ({_q(indice)}, file_row_number), {_q(indice)} AS _fila, "
+                           f"file_row_number AS _orden FROM read_parquet({_literal(ruta)}, file_row_number = true)")
+            return
+        # SQLite: por lotes de filas; lo que se le pasa al motor nunca es la tabla entera
+        columnas = ['_fila' if c == indice else c for c in archivo.schema_arrow.names]
+        tipos = [_tipo_sqlite(t) for t in archivo.schema_arrow.types]
+        self._ejecutar(f"CREATE TABLE {nombre} ({', '.join(f'{_q(c)} {t}' for c, t in zip(columnas, tipos))}, _orden INTEGER)")
+        insertar = f"INSERT INTO {nombre} VALUES ({', '.join('?' * (len(columnas) + 1))})"
+        inicio = 0
+        for lote in archivo.iter_batches(batch_size=FILAS_POR_BLOQUE):
+            valores = [_valores(c) for c in lote.columns] + [range(inicio, inicio + lote.num_rows)]
+            self._con.executemany(insertar, zip(*valores))
+            inicio += lote.num_rows
+
+    def _reemplazar(self, nombre, temporal, firma):
+        # La tabla nueva toma el lugar de la vieja y su firma en una sola transacción
+        self._ejecutar('BEGIN IMMEDIATE' if self.motor == 'sqlite' else 'BEGIN TRANSACTION')
+        try:
+            actual = self._ejecutar('SELECT firma FROM _firmas WHERE tabla = ?', [nombre]).fetchone()
+            if (actual[0] if actual else None) == firma:
+                # Otro proceso ya la dejó al día
+                if temporal: self._ejecutar(f"DROP TABLE {temporal}")
+            else:
+                self._ejecutar(f"DROP TABLE IF EXISTS {nombre}")
+                if temporal: self._ejecutar(f"ALTER TABLE {temporal} RENAME TO {nombre}")
+                self._ejecutar('DELETE FROM _firmas WHERE tabla = ?', [nombre])
+                if firma is not None: self._ejecutar('INSERT INTO _firmas VALUES (?, ?)', [nombre, firma])
+            self._ejecutar('COMMIT')
+        except Exception:
+            self._ejecutar('ROLLBACK')
+            raise
+
+    def tiene(self, tabla, columna=None):
+        modelo = self.modelos.get(tabla)
+        return modelo is not None and (columna is None or columna in modelo.columns)
+
+    def consulta(self, sql, parametros=()):
+        # DataFrame con el resultado; los parámetros van con '?' en ambos motores. Una conexión por
+        # almacén, dentro de su transacción de lectura
+        with self._lock:
+            if self.motor == 'duckdb': return self._ejecutar(sql, parametros).df()
+            return pd.read_sql_query(sql, self._con, params=list(parametros))
+
+    def escalar(self, sql, parametros=()):
+        valor = self.consulta(sql, parametros).iloc[0, 0]
+        return 0.0 if pd.isna(valor) else float(valor)
+
+    def filas(self, tabla, condicion='1 = 1', parametros=(), columnas=None):
+        # Las filas de `tabla` que cumplen la condición, como las dejaría df[mascara] (o df.loc[mascara, columnas])
+        modelo = self.modelos[tabla] if columnas is None else self.modelos[tabla][columnas]
+        lista = '*' if columnas is None else ', '.join(['_fila', '_orden'] + [_q(c) for c in columnas])
+        df = self.consulta(f"SELECT {lista} FROM {tabla} WHERE {condicion} ORDER BY _orden", parametros)
+        return _como(df, modelo)
+
+    def cerrar(self):
+        with self._lock:
+            try: self._ejecutar('ROLLBACK')
+            except Exception: pass
+            self._con.close()
+
+def _como(df, modelo):
+    # Mismo índice, columnas y tipos que el frame preparado; SQLite devuelve fechas como texto y
+    # booleanos como enteros, y ambos motores devuelven None donde pandas tenía NaN
+    df = df.set_index('_fila').rename_axis(modelo.index.name).drop(columns='_orden')
+    for col, tipo in modelo.dtypes.items():
+        if col not in df.columns: continue
+        if tipo == object: df[col] = df[col].astype(object).where(df[col].notna(), np.nan)
+        elif df[col].dtype != tipo: df[col] = df[col].astype(tipo)
+    df.index = df.index.astype(modelo.index.dtype)
+    return df[list(modelo.columns)]
+
+def abrir_almacen(version, motor=None):
+    # None si el almacén está apagado o no se pudo abrir: el cálculo sigue con pandas. Va después de
+    # cargar_datos, que deja al día el caché Parquet de esta versión
+    motor = motor or motor_almacen()
+    if motor is None: return None
+    try:
+        with etapa('almacen.abrir'): return Almacen(version, motor)
+    except Exception:
+        log.warning('No se pudo abrir el almacén %s de %s; se calcula con pandas', motor, version[0], exc_info=True)
+        return None
+
+# --- CÁLCULOS EN SQL ---
+# Los filtros y las sumas sobre todo el histórico corren en el motor; lo que sigue (ordenar las pocas
+# filas elegidas, el top 10 de pérdidas) se hace con las mismas funciones de calculos.py. Las vistas
+# que son el propio frame preparado (df_view de pesos y bases) vuelven en None: las enlaza servicio
+def fugas_sql(almacen, impasse=True):
+    # calcular_fugas sobre las filas con pérdida; la suma de gramos faltantes recorre todo leyes en SQL
+    fugas = calcular_fugas(almacen.filas('leyes', f"{_q(COL_VALOR)} < 0"), impasse)
+    gramos = almacen.escalar(f"SELECT SUM({_q('diferencia peso oro puro')}) FROM leyes WHERE {_q('diferencia peso oro puro')} > 0")
+    return dict(fugas, total_gramos_perdidos=gramos + (IMPASSE_PESO if impasse else 0))
+
+def hallazgos_sql(almacen):
+    # Las reglas de texto de extraer_hallazgos, sobre las filas con observación y solo esas dos columnas
+    def con_observaciones(tabla):
+        if not almacen.tiene(tabla, 'observaciones'): return None
+        return almacen.filas(tabla, 'observaciones IS NOT NULL', columnas=['fecha_norm', 'observaciones'])
+    return extraer_hallazgos(con_observaciones('gold'), con_observaciones('orotec'))
+
+def bases_sql(almacen):
+    if not almacen.tiene('bases') or not almacen.conteos['bases']: return None
+    modelo = almacen.modelos['bases']
+    esquema = modelo.attrs.get('esquema')
+    if not esquema or 'Dif Capital' not in modelo.columns: return {'columnas': None}
+    columnas = esquema['columnas']
+    fila = almacen.consulta(f"SELECT SUM(CAST(Alerta AS INTEGER)), AVG({_q(columnas['capital'])}), AVG({_q(columnas['acuerdo'])}), "
+                            f"AVG({_q(columnas['ala'])}) FROM bases").iloc[0]
+    return {
+        'columnas': columnas, 'escala': esquema['escala'], 'df_view': None,
+        'dias_alerta': int(fila.iloc[0] or 0), 'promedio_capital': fila.iloc[1], 'promedio_acuerdo': fila.iloc[2], 'promedio_ala': fila.iloc[3],
+    }
+
+def pesos_sql(almacen):
+    fila = almacen.consulta(f"SELECT SUM({_q('peso taller')}), SUM({_q('peso factura')}), SUM(diff_peso) FROM leyes").iloc[0]
+    return {'df_view': None, 'peso_taller': fila.iloc[0], 'peso_factura': fila.iloc[1], 'merma': fila.iloc[2]}
+
+def leyes_sql(almacen):
+    # calcular_leyes ordena y arma las columnas; aquí solo llegan las filas con merma o alza de ley
+    elegidas = almacen.filas('leyes', f'diff > 0.001 OR (diff < -0.001 AND {_q("ley taller")} > 0.01)')
+    return calcular_leyes(elegidas)
+
+def escenarios_sql(almacen):
+    def suma(tabla, col):
+        return almacen.escalar(f"SELECT SUM({_q(col)}) FROM {tabla}") if almacen.tiene(tabla, col) else 0
+    sin_referencia = pd.DataFrame(columns=['fecha'])
+    if almacen.tiene('orotec', 'observaciones'):
+        sin_referencia = almacen.filas('orotec', "LOWER(observaciones) LIKE '%no se tiene referencia%'")[['fecha']]
+    return {
+        'gold_taller': suma('gold', 'utilidad taller'), 'gold_ala': suma('gold', 'utilidad ala'),
+        'orotec_taller': suma('orotec', 'utilidad taller'), 'orotec_ala': suma('orotec', 'utilidad ala'),
+        'sin_referencia': sin_referencia,
+    }
+
+def por_dia_sql(almacen):
+    # Igual que agregar_por_dia: sumas de leyes por día y la primera fila Gold/Orotec de cada día
+    def col(nombre): return f"CAST({_q(nombre)} AS DOUBLE)"
+    op_taller = col('peso oro puro real') if almacen.tiene('leyes', 'peso oro puro real') else f"{col('peso taller')} * {col('ley taller')}"
+    op_factura = col('peso oro puro factura') if almacen.tiene('leyes', 'peso oro puro factura') else f"{col('peso factura')} * {col('ley jerusalen')}"
+    leyes = almacen.consulta(
+        f"SELECT fecha_norm, SUM({col('peso taller')}) AS p_taller, SUM({col('peso factura')}) AS p_factura, "
+        f"SUM({op_taller}) AS op_taller, SUM({op_factura}) AS op_factura "
+        "FROM leyes WHERE fecha_norm IS NOT NULL GROUP BY fecha_norm ORDER BY fecha_norm").set_index('fecha_norm')
+
+    def primera_por_dia(tabla):
+        if not almacen.tiene(tabla): return pd.DataFrame()
+        df = almacen.consulta(
+            f"SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY fecha_norm ORDER BY _orden) AS _n FROM {tabla} "
+            "WHERE fecha_norm IS NOT NULL) AS t WHERE _n = 1 ORDER BY _orden").drop(columns='_n')
+        return _como(df, almacen.modelos[tabla]).astype({'fecha_norm': object}).set_index('fecha_norm')
+
+    return {'leyes': leyes, 'gold': primera_por_dia('gold'), 'orotec': primera_por_dia('orotec')}
+
+def calcular_auditoria_sql(almacen, diario=None, impasse=True):
+    # Mismo resultado que calcular_auditoria, salvo las vistas df_view (None)
+    filas = almacen.conteos['leyes']
+    resultado = {}
+    with etapa('sql.fugas', filas): resultado['fugas'] = fugas_sql(almacen, impasse)
+    with etapa('sql.hallazgos'): resultado['hallazgos'] = hallazgos_sql(almacen)
+    with etapa('sql.bases'): resultado['bases'] = bases_sql(almacen)
+    with etapa('sql.pesos', filas): resultado['pesos'] = pesos_sql(almacen)
+    with etapa('sql.leyes', filas): resultado['leyes'] = leyes_sql(almacen)
+    with etapa('sql.escenarios'): resultado['escenarios'] = escenarios_sql(almacen)
+    with etapa('sql.diario', filas): resultado['diario'] = diario if diario is not None else por_dia_sql(almacen)
+    return resultado
@@ -0,0 +1,149 @@
+"""Medición por etapas del motor de auditoría sobre datos sintéticos.
+
+Uso:
+    python -m motor_auditoria.benchmark --filas 1k,100k,10M --salida benchmark.json [--comparar anterior.json]
+
+Genera (o reutiliza) los CSV sintéticos de cada tamaño en --datos y mide por separado carga, limpieza,
+fechas, esquema, derivadas, compactación, particiones, recorte de un trimestre, fugas, hallazgos, bases,
+pesos, leyes, diario, cubo por periodo, la consulta diaria y el simulador de escenarios (preparación, un
+escenario y una grilla), sin pasar por el caché en disco.
+El JSON resultante se puede comparar con el de otro commit usando --comparar.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from .calculos import agregar_por_dia, balance_diario, calcular_bases, calcular_fugas, calcular_leyes, calcular_pesos, extraer_hallazgos
+from .carga import ARCHIVOS, cargar_csv_super_flexible
+from .cubo import agregar_cubo
+from .limpieza import adivinar_formato_fecha, agregar_derivadas, agregar_fechas, compactar_frame, limpiar_frame, particionar, resolver_esquema
+from .periodos import extremos, recortar
+from .simulador import Simulador
+from .sinteticos import generar_datos, interpretar_filas
+
+DATOS_BENCHMARK = '.datos_benchmark'
+CONSULTAS_DIARIAS = 200
+
+def _medir(funcion, repeticiones, preparar=None):
+    # Mejor tiempo de `repeticiones` corridas; preparar() arma la entrada fuera del cronómetro
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        args = preparar() if preparar else ()
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, {'segundos': min(tiempos), 'media': sum(tiempos) / len(tiempos)}
+
+def medir_directorio(directorio, repeticiones=3):
+    # Las mismas etapas que recorre cargar_datos + calcular_auditoria, cada una con su propio tiempo
+    etapas = {}
+    rutas = {key: os.path.join(directorio, nombre) for key, nombre in ARCHIVOS.items()}
+
+    crudos, etapas['carga'] = _medir(lambda: {key: cargar_csv_super_flexible(ruta) for key, ruta in rutas.items()}, repeticiones)
+    formatos = {key: adivinar_formato_fecha(df['fecha']) if 'fecha' in df.columns else None for key, df in crudos.items()}
+    limpios, etapas['limpieza'] = _medir(lambda crudos: {key: limpiar_frame(key, df) for key, df in crudos.items()}, repeticiones,
+                                         lambda: ({key: df.copy() for key, df in crudos.items()},))
+    fechados, etapas['fechas'] = _medir(lambda: {key: agregar_fechas(df, formatos[key]) for key, df in limpios.items()}, repeticiones)
+    resueltos, etapas['esquema'] = _medir(lambda fechados: {key: resolver_esquema(key, df) for key, df in fechados.items()}, repeticiones,
+                                          lambda: ({key: df.copy() for key, df in fechados.items()},))
+    derivados, etapas['derivadas'] = _medir(lambda resueltos: {key: agregar_derivadas(key, df) for key, df in resueltos.items()}, repeticiones,
+                                            lambda: ({key: df.copy() for key, df in resueltos.items()},))
+    datos, etapas['compactar'] = _medir(lambda derivados: {key: compactar_frame(key, df) for key, df in derivados.items()}, repeticiones,
+                                        lambda: ({key: df.copy() for key, df in derivados.items()},))
+    datos, etapas['particiones'] = _medir(lambda: {key: particionar(df) for key, df in datos.items()}, repeticiones)
+    rango = extremos(datos['leyes'])
+    if rango:  # Los últimos tres meses, como al elegir un trimestre en el rango global
+        desde = max(rango[0], (pd.Timestamp(rango[1]) - pd.DateOffset(months=3)).date())
+        _, etapas['recorte'] = _medir(lambda: {key: recortar(df, desde, rango[1]) for key, df in datos.items()}, repeticiones)
+    df_leyes, df_gold, df_orotec, df_bases = datos['leyes'], datos['gold'], datos['orotec'], datos['bases']
+
+    _, etapas['fugas'] = _medir(lambda: calcular_fugas(df_leyes), repeticiones)
+    _, etapas['hallazgos'] = _medir(lambda: extraer_hallazgos(df_gold, df_orotec), repeticiones)
+    _, etapas['bases'] = _medir(lambda: calcular_bases(df_bases), repeticiones)
+    _, etapas['pesos'] = _medir(lambda: calcular_pesos(df_leyes), repeticiones)
+    _, etapas['leyes'] = _medir(lambda: calcular_leyes(df_leyes), repeticiones)
+    diario, etapas['diario'] = _medir(lambda: agregar_por_dia(df_leyes, df_gold, df_orotec), repeticiones)
+    _, etapas['cubo'] = _medir(lambda: agregar_cubo(df_leyes), repeticiones)
+
+    fechas = df_leyes['fecha_norm'].dropna().unique()[:CONSULTAS_DIARIAS]
+    _, etapas['consulta_diaria'] = _medir(lambda: [balance_diario(diario, f) for f in fechas], repeticiones)
+    etapas['consulta_diaria'] = {k: v / max(len(fechas), 1) for k, v in etapas['consulta_diaria'].items()}  # Por fecha consultada
+
+    simulador, etapas['simulador'] = _medir(lambda: Simulador(df_gold, df_orotec, diario), repeticiones)
+    simulador.evaluar()  # Coeficientes del escenario base ya armados: se mide lo que cuesta mover un deslizador
+    _, etapas['simulacion'] = _medir(lambda: simulador.evaluar(0.95, 0.5), repeticiones)
+    _, etapas['grilla'] = _medir(lambda: simulador.grilla([p / 200 for p in range(170, 201)], [r / 100 for r in range(30, 85, 5)]), repeticiones)
+
+    filas = {key: len(df) for key, df in datos.items()}
+    memoria = {key: df.attrs['memoria'] for key, df in datos.items()}
+    return {'filas': filas, 'memoria': memoria, 'etapas': etapas, 'total': sum(e['segundos'] for k, e in etapas.items() if k != 'consulta_diaria')}
+
+def _commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception: return None
+
+def entorno():
+    try: import pyarrow; version_arrow = pyarrow.__version__
+    except ImportError: version_arrow = None
+    return {'commit': _commit(), 'fecha': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'pandas': pd.__version__, 'pyarrow': version_arrow, 'cpus': os.cpu_count()}
+
+def datos_sinteticos(raiz, filas, semilla=0):
+    # Reutiliza los archivos ya generados para ese tamaño y semilla (10M filas tarda varios minutos)
+    directorio = os.path.join(raiz, f"{filas}-{semilla}")
+    if not all(os.path.exists(os.path.join(directorio, nombre)) for nombre in ARCHIVOS.values()):
+        generar_datos(directorio, filas, semilla)
+    return directorio
+
+def comparar(actual, anterior):
+    # Cociente actual/anterior por tamaño y etapa (> 1 es más lento)
+    filas = []
+    for tamano, medicion in actual['tamanos'].items():
+        previa = anterior.get('tamanos', {}).get(tamano)
+        if not previa: continue
+        for etapa, tiempo in medicion['etapas'].items():
+            antes = previa['etapas'].get(etapa, {}).get('segundos')
+            if antes: filas.append((tamano, etapa, antes, tiempo['segundos'], tiempo['segundos'] / antes))
+    return filas
+
+def main(argv=None):
+    pd.set_option('mode.copy_on_write', True)  # Como en el tablero: se mide lo mismo que corre ahí
+    parser = argparse.ArgumentParser(prog='python -m motor_auditoria.benchmark', description="Mide cada etapa de la auditoría con datos sintéticos.")
+    parser.add_argument('--filas', default='1k,100k', help="Tamaños separados por coma: 1k, 100k, 10M o números (por defecto: 1k,100k)")
+    parser.add_argument('--datos', default=DATOS_BENCHMARK, help=f"Carpeta para los CSV sintéticos (por defecto: {DATOS_BENCHMARK})")
+    parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON de resultados (por defecto: benchmark.json)")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Corridas por etapa; se reporta la más rápida")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los datos sintéticos")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para mostrar la variación por etapa")
+    args = parser.parse_args(argv)
+
+    resultado = {'entorno': entorno(), 'repeticiones': args.repeticiones, 'tamanos': {}}
+    for texto in [t.strip() for t in args.filas.split(',') if t.strip()]:
+        filas = interpretar_filas(texto)
+        directorio = datos_sinteticos(args.datos, filas, args.semilla)
+        medicion = medir_directorio(directorio, args.repeticiones)
+        resultado['tamanos'][str(filas)] = medicion
+        print(f"⏱️ {filas:,} filas: {medicion['total']:.3f} s")
+        for etapa, tiempo in medicion['etapas'].items():
+            print(f"   {etapa:<16}{tiempo['segundos']:>12.6f} s")
+
+    with open(args.salida, 'w', encoding='utf-8') as fh:
+        json.dump(resultado, fh, ensure_ascii=False, indent=2)
+    print(f"✅ Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as fh: anterior = json.load(fh)
+        for tamano, etapa, antes, ahora, cociente in comparar(resultado, anterior):
+            marca = '⚠️' if cociente > 1.2 else '  '
+            print(f"{marca} {int(tamano):>12,} {etapa:<16}{antes:>10.4f} s -> {ahora:>10.4f} s  x{cociente:.2f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Caché en disco: frames preparados en Parquet (un row group por mes) y resultados calculados por versión de datos."""
+import hashlib
+import json
+import logging
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from .limpieza import COLUMNAS_NUMERICAS, particionar, tipos_compactos
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow no hay caché de frames en disco
+    pq = None
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = '.cache_auditoria'
+VERSION_CACHE = 10
+
+def huella_archivo(filepath, limite=None):
+    # sha256 del archivo completo o de sus primeros `limite` bytes
+    h = hashlib.sha256()
+    restante = float('inf') if limite is None else limite
+    with open(filepath, 'rb') as fh:
+        while restante > 0:
+            bloque = fh.read(int(min(1 << 20, restante)))
+            if not bloque: break
+            h.update(bloque)
+            restante -= len(bloque)
+    return h.hexdigest()
+
+def _clave(*partes):
+    return hashlib.sha256(repr(partes).encode()).hexdigest()[:12]
+
+def _rutas_cache(key, filepath):
+    # La ruta del archivo y la especificación de limpieza forman parte de la clave
+    base = os.path.join(CACHE_DIR, f"{key}-{_clave(VERSION_CACHE, os.path.abspath(filepath), COLUMNAS_NUMERICAS[key])}")
+    return base + '.parquet', base + '.json'
+
+def _escribir_atomico(ruta, escribir):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    escribir(ruta + '.tmp')
+    os.replace(ruta + '.tmp', ruta)
+
+def leer_manifiesto(key, filepath):
+    try:
+        with open(_rutas_cache(key, filepath)[1], encoding='utf-8') as fh: return json.load(fh)
+    except Exception:
+        return None
+
+def leer_frame_cache(key, filepath, particiones=None):
+    # particiones: nombres a leer (p. ej. los meses de un trimestre); solo se leen esos row groups.
+    # None lee el frame completo
+    if pq is None: return None
+    manifiesto = leer_manifiesto(key, filepath) or {}
+    guardadas = list(manifiesto.get('particiones') or [])
+    try:
+        archivo = pq.ParquetFile(_rutas_cache(key, filepath)[0], memory_map=True)
+        if archivo.num_row_groups != len(guardadas): return None  # Manifiesto de otra escritura
+        if particiones is None: tabla = archivo.read()
+        else: tabla = archivo.read_row_groups([i for i, nombre in enumerate(guardadas) if nombre in particiones])
+        df = tabla.to_pandas()
+    except Exception:
+        return None
+    # Parquet devuelve None en textos nulos; se restituye NaN como en read_csv
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    df = particionar(tipos_compactos(key, df))
+    if particiones is None:  # Conteos del archivo completo; no valen para una parte
+        df.attrs['coerciones'] = manifiesto.get('coerciones', {})
+        df.attrs['memoria'] = manifiesto.get('memoria')
+    if manifiesto.get('esquema'): df.attrs['esquema'] = manifiesto['esquema']
+    return df
+
+def cache_vigente(key, filepath):
+    # Si el manifiesto corresponde al archivo actual, sin leer el Parquet
+    if pq is None: return False
+    manifiesto = leer_manifiesto(key, filepath)
+    try:
+        info = os.stat(filepath)
+        if manifiesto is None or manifiesto['size'] != info.st_size: return False
+        if manifiesto['mtime_ns'] != info.st_mtime_ns:
+            # Mismo tamaño pero otra fecha de modificación: decide el contenido
+            if manifiesto['sha256'] != huella_archivo(filepath): return False
+            manifiesto['mtime_ns'] = info.st_mtime_ns
+            with open(_rutas_cache(key, filepath)[1], 'w', encoding='utf-8') as fh: json.dump(manifiesto, fh)
+    except Exception:
+        return False
+    return True
+
+def leer_cache(key, filepath):
+    return leer_frame_cache(key, filepath) if cache_vigente(key, filepath) else None
+
+def parquet_vigente(key, filepath):
+    # (ruta del Parquet, manifiesto) si el caché corresponde al archivo actual; None si no
+    if not cache_vigente(key, filepath): return None
+    manifiesto = leer_manifiesto(key, filepath)
+    return (_rutas_cache(key, filepath)[0], manifiesto) if manifiesto else None
+
+def modelo_cache(key, ruta, manifiesto):
+    # Frame vacío con el índice, las columnas y los tipos que tendría leer_frame_cache. Solo se leen las
+    # columnas categóricas (sus categorías); los float quedan como se guardaron, porque en un frame
+    # vacío todo cabría en float32
+    vacio = pq.read_schema(ruta).empty_table().to_pandas()
+    tipos = {col: tipo for col, tipo in vacio.dtypes.items() if tipo.kind == 'f'}
+    categoricas = [col for col, tipo in vacio.dtypes.items() if isinstance(tipo, pd.CategoricalDtype)]
+    if categoricas: tipos.update(pq.read_table(ruta, columns=categoricas).to_pandas().dtypes.items())
+    modelo = tipos_compactos(key, vacio).astype(tipos)
+    if manifiesto.get('esquema'): modelo.attrs['esquema'] = manifiesto['esquema']
+    return modelo
+
+def _escribir_particiones(ruta, df, particiones):
+    # Un row group por partición, en el orden del manifiesto; el índice va como columna para que
+    # cualquier subconjunto de row groups se lea con sus etiquetas
+    tabla = pa.Table.from_pandas(df, preserve_index=True)
+    with pq.ParquetWriter(ruta, tabla.schema) as escritor:
+        for ini, fin in particiones.values():
+            escritor.write_table(tabla.slice(ini, fin - ini), row_group_size=max(fin - ini, 1))
+
+def guardar_cache(key, filepath, df, lectura=None):
+    # lectura: formato, columnas crudas y formato de fecha; permite parsear luego solo lo anexado
+    if pq is None: return
+    ruta_datos, ruta_manifiesto = _rutas_cache(key, filepath)
+    particiones = df.attrs.get('particiones') or {'todo': [0, len(df)]}
+    try:
+        info = os.stat(filepath)
+        _escribir_atomico(ruta_datos, lambda ruta: _escribir_particiones(ruta, df, particiones))
+        with open(filepath, 'rb') as fh:
+            fh.seek(max(info.st_size - 1, 0))
+            termina_en_salto = fh.read(1) in (b'\n', b'')
+        manifiesto = {'archivo': filepath, 'size': info.st_size, 'mtime_ns': info.st_mtime_ns, 'sha256': huella_archivo(filepath),
+                      'termina_en_salto': termina_en_salto, 'coerciones': df.attrs.get('coerciones', {}), 'memoria': df.attrs.get('memoria'),
+                      'esquema': df.attrs.get('esquema'), 'particiones': particiones, **(lectura or {})}
+        with open(ruta_manifiesto, 'w', encoding='utf-8') as fh: json.dump(manifiesto, fh)
+    except Exception:
+        # El caché es opcional y un fallo aquí no debe tumbar el tablero, pero un manifiesto que ya no
+        # describe el Parquet haría que la próxima carga anexe sobre una versión vieja: se invalida
+        log.warning('No se pudo guardar el caché de %s (%s)', key, filepath, exc_info=True)
+        try: os.remove(ruta_manifiesto)
+        except OSError: pass
+
+# Los resultados (KPIs, tablas derivadas) se guardan por versión de datos para que
+# app.py y auditoria.py, aunque corran en procesos distintos, los calculen una sola vez.
+def _ruta_resultado(version):
+    return os.path.join(CACHE_DIR, f"resultado-{_clave(VERSION_CACHE, version)}.pkl")
+
+def leer_resultado(version):
+    try:
+        with open(_ruta_resultado(version), 'rb') as fh: return pickle.load(fh)
+    except Exception:
+        return None
+
+def guardar_resultado(version, resultado):
+    try:
+        _escribir_atomico(_ruta_resultado(version), lambda ruta: _volcar_pickle(ruta, resultado))
+    except Exception:
+        pass
+
+def _volcar_pickle(ruta, objeto):
+    with open(ruta, 'wb') as fh: pickle.dump(objeto, fh, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,168 @@
+"""Cálculos de la auditoría (fugas, bases, pesos, leyes, escenarios, hallazgos y consulta diaria)."""
+import pandas as pd
+
+from .instrumentacion import etapa
+from .limpieza import COLUMNAS_DERIVADAS
+
+IMPASSE_VALOR = 1531798.20
+IMPASSE_PESO = 3.69
+FECHA_IMPASSE = '2025-05-19'
+FECHA_YARDEN = '2025-11-27'
+NOTA_YARDEN = "⚠️ Yarden pone en la factura más de lo que debería pagar. "
+
+COL_VALOR = 'diferencia en valor'
+
+# --- FUGAS DE CAPITAL ---
+def calcular_fugas(df_leyes, impasse=True):
+    # El reporte de fugas conserva las columnas del archivo, sin las derivadas.
+    # impasse=False para un periodo que no incluye FECHA_IMPASSE
+    df_perdidas = df_leyes[df_leyes[COL_VALOR] < 0].drop(columns=COLUMNAS_DERIVADAS['leyes'], errors='ignore')
+
+    fuga_operativa = df_perdidas[COL_VALOR].sum()
+    gramos_faltantes_op = df_leyes[df_leyes['diferencia peso oro puro'] > 0]['diferencia peso oro puro'].astype(float).sum()
+
+    df_neg = df_perdidas.sort_values(COL_VALOR).head(10)
+    df_neg = df_neg.assign(**{'Pérdida ($)': df_neg[COL_VALOR].abs()})
+    return {
+        'df_perdidas': df_perdidas,
+        'df_top_perdidas': df_neg,
+        'total_dinero_perdido': fuga_operativa + (-IMPASSE_VALOR if impasse else 0),
+        'total_gramos_perdidos': gramos_faltantes_op + (IMPASSE_PESO if impasse else 0),
+        'dias_con_fugas': len(df_perdidas) + (1 if impasse else 0),
+    }
+
+# --- HALLAZGOS ADMINISTRATIVOS ---
+def extraer_hallazgos(df_gold, df_orotec):
+    # Versión vectorizada del recorrido fila a fila: mismas reglas, expresadas como máscaras
+    partes = []
+    for df_source, name in [(df_gold, 'Gold Price'), (df_orotec, 'Orotec')]:
+        if df_source is None or 'observaciones' not in df_source.columns: continue
+        obs_real = df_source['observaciones']
+        obs = obs_real.astype(str).str.lower()
+        fecha = df_source['fecha_norm']
+
+        mask = (obs.str.len() > 4) & ~obs.str.contains('nan', regex=False) & ~obs.str.contains('ok', regex=False)
+        mask &= fecha != FECHA_IMPASSE
+        # Filtro extra para orotec
+        if name == 'Orotec': mask &= ~obs.str.contains('referencia', regex=False)
+
+        obs_real = obs_real.where(fecha != FECHA_YARDEN, NOTA_YARDEN + obs_real.astype(str))
+        partes.append(pd.DataFrame({"Fecha": fecha[mask].astype(object), "Observación": obs_real[mask]}))
+
+    if not partes: return pd.DataFrame(columns=["Fecha", "Observación"])
+    return pd.concat(partes, ignore_index=True).drop_duplicates()
+
+# --- BASES DE LIQUIDACIÓN ---
+def calcular_bases(df_bases):
+    if df_bases is None or df_bases.empty: return None
+
+    # Columnas y escala se resolvieron al cargar (attrs['esquema']); 'Dif Capital' y 'Alerta' vienen
+    # de agregar_derivadas: df_view es el propio frame
+    esquema = df_bases.attrs.get('esquema')
+    if not esquema or 'Dif Capital' not in df_bases.columns: return {'columnas': None}
+    columnas = esquema['columnas']
+    return {
+        'columnas': columnas,
+        'escala': esquema['escala'],
+        'df_view': df_bases,
+        'dias_alerta': int(df_bases['Alerta'].sum()),
+        'promedio_capital': df_bases[columnas['capital']].mean(),
+        'promedio_acuerdo': df_bases[columnas['acuerdo']].mean(),
+        'promedio_ala': df_bases[columnas['ala']].mean(),
+    }
+
+# --- PESOS ---
+def calcular_pesos(df_leyes):
+    # Sumas en float64 aunque el frame venga compactado (float32)
+    return {
+        'df_view': df_leyes,
+        'peso_taller': df_leyes['peso taller'].astype(float).sum(),
+        'peso_factura': df_leyes['peso factura'].astype(float).sum(),
+        'merma': df_leyes['diff_peso'].sum(),
+    }
+
+# --- CALIDAD (LEYES) ---
+def calcular_leyes(df_leyes):
+    # Merma de ley (Taller > Jerusalén) y alza de ley (Jerusalén > Taller); solo se copian las filas elegidas
+    diff = df_leyes['diff']
+    df_mermas = df_leyes[diff > 0.001].sort_values('fecha_dt', ascending=False)
+    df_ganancia = df_leyes[(diff < -0.001) & (df_leyes['ley taller'] > 0.01)].sort_values('fecha_dt', ascending=False)
+    df_ganancia = df_ganancia.assign(diff_abs=df_ganancia['diff'].abs())
+    return {'df_mermas': df_mermas, 'df_ganancia': df_ganancia}
+
+# --- ESCENARIOS (UTILIDAD) ---
+def _suma(df, col):
+    return df[col].sum() if df is not None and col in df.columns else 0
+
+def calcular_escenarios(df_gold, df_orotec):
+    sin_referencia = pd.DataFrame(columns=['fecha'])
+    if df_orotec is not None and 'observaciones' in df_orotec.columns:
+        mask = df_orotec['observaciones'].astype(str).str.contains("no se tiene referencia", case=False, na=False)
+        sin_referencia = df_orotec[mask][['fecha']]
+    return {
+        'gold_taller': _suma(df_gold, 'utilidad taller'), 'gold_ala': _suma(df_gold, 'utilidad ala'),
+        'orotec_taller': _suma(df_orotec, 'utilidad taller'), 'orotec_ala': _suma(df_orotec, 'utilidad ala'),
+        'sin_referencia': sin_referencia,
+    }
+
+# --- CONSULTA DIARIA ---
+def agregar_por_dia(df_leyes, df_gold, df_orotec):
+    # Tablas indexadas por fecha_norm: elegir un día pasa a ser una búsqueda en el índice
+    # Sumas en float64 y con fecha de texto, aunque el frame venga compactado (float32, categoría)
+    def col(nombre): return df_leyes[nombre].astype(float)
+    # Prioridad columna archivo
+    op_taller = col('peso oro puro real') if 'peso oro puro real' in df_leyes.columns else col('peso taller') * col('ley taller')
+    op_factura = col('peso oro puro factura') if 'peso oro puro factura' in df_leyes.columns else col('peso factura') * col('ley jerusalen')
+    leyes = pd.DataFrame({
+        'fecha_norm': df_leyes['fecha_norm'].astype(object),
+        'p_taller': col('peso taller'), 'p_factura': col('peso factura'),
+        'op_taller': op_taller, 'op_factura': op_factura,
+    }).groupby('fecha_norm').sum()
+
+    # Primera fila de cada día, como hacía el .iloc[0] sobre el filtro
+    def primera_por_dia(df):
+        if df is None: return pd.DataFrame()
+        return df.dropna(subset=['fecha_norm']).drop_duplicates('fecha_norm').astype({'fecha_norm': object}).set_index('fecha_norm')
+
+    return {'leyes': leyes, 'gold': primera_por_dia(df_gold), 'orotec': primera_por_dia(df_orotec)}
+
+def actualizar_por_dia(diario, nuevas_leyes, nuevas_gold, nuevas_orotec):
+    # Agrega filas anexadas sin recorrer el histórico: suma en los días de leyes y
+    # conserva la primera fila Gold/Orotec ya conocida de cada día
+    extra = agregar_por_dia(nuevas_leyes, nuevas_gold, nuevas_orotec)
+
+    def combinar(previo, nuevo):
+        if nuevo.empty: return previo
+        return pd.concat([previo, nuevo[~nuevo.index.isin(previo.index)]]).sort_index(kind='stable')
+
+    return {
+        'leyes': diario['leyes'].add(extra['leyes'], fill_value=0),
+        'gold': combinar(diario['gold'], extra['gold']),
+        'orotec': combinar(diario['orotec'], extra['orotec']),
+    }
+
+def balance_diario(diario, fecha):
+    # Balance de masa y pureza de un día, más las filas Gold/Orotec que lo acompañan
+    p_taller, p_factura, op_taller, op_factura = 0, 0, 0, 0
+    if fecha in diario['leyes'].index:
+        p_taller, p_factura, op_taller, op_factura = diario['leyes'].loc[fecha, ['p_taller', 'p_factura', 'op_taller', 'op_factura']]
+    return {
+        'p_taller': p_taller, 'p_factura': p_factura, 'op_taller': op_taller, 'op_factura': op_factura,
+        'gold': diario['gold'].loc[fecha] if fecha in diario['gold'].index else None,
+        'orotec': diario['orotec'].loc[fecha] if fecha in diario['orotec'].index else None,
+    }
+
+# --- RESULTADO COMPLETO ---
+def calcular_auditoria(datos, diario=None, impasse=True):
+    # diario: agregados por día ya actualizados de forma incremental (si los hay)
+    df_leyes, df_orotec, df_gold, df_bases = datos['leyes'], datos['orotec'], datos['gold'], datos['bases']
+    filas = len(df_leyes)
+    resultado = {}
+    with etapa('calculo.fugas', filas): resultado['fugas'] = calcular_fugas(df_leyes, impasse)
+    with etapa('calculo.hallazgos'): resultado['hallazgos'] = extraer_hallazgos(df_gold, df_orotec)
+    with etapa('calculo.bases', len(df_bases) if df_bases is not None else 0): resultado['bases'] = calcular_bases(df_bases)
+    with etapa('calculo.pesos', filas): resultado['pesos'] = calcular_pesos(df_leyes)
+    with etapa('calculo.leyes', filas): resultado['leyes'] = calcular_leyes(df_leyes)
+    with etapa('calculo.escenarios'): resultado['escenarios'] = calcular_escenarios(df_gold, df_orotec)
+    with etapa('calculo.diario', filas): resultado['diario'] = diario if diario is not None else agregar_por_dia(df_leyes, df_gold, df_orotec)
+    return resultado
@@ -0,0 +1,296 @@
+"""Lectura de los CSV exportados: detección de formato y carga de los cuatro archivos."""
+import csv
+import io
+import logging
+import os
+import pickle
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .cache import cache_vigente, guardar_cache, huella_archivo, leer_cache, leer_frame_cache, leer_manifiesto
+from .instrumentacion import RegistroEtapas, etapa, registro_activo
+from .limpieza import adivinar_formato_fecha, memoria_frame, particionar, preparar_frame, tipos_compactos
+
+log = logging.getLogger(__name__)
+
+ENCODINGS = ['utf-8', 'latin-1', 'cp1252', 'ISO-8859-1']
+SEPARADORES = [',', ';']
+BYTES_MUESTRA = 64 * 1024
+
+# Formato detectado por archivo: {ruta: ((tamaño, mtime_ns), (encoding, sep))}. Vale mientras el
+# archivo no cambie: si lo reemplazan por un export con otro encoding o separador, se vuelve a detectar
+_formatos_detectados = {}
+
+def _firma(ruta):
+    info = os.stat(ruta)
+    return info.st_size, info.st_mtime_ns
+
+def _formato_conocido(ruta):
+    firma, formato = _formatos_detectados.get(ruta, (None, None))
+    try: return formato if firma == _firma(ruta) else None
+    except OSError: return None
+
+def _recordar_formato(ruta, firma, formato):
+    if formato is not None: _formatos_detectados[ruta] = (firma, formato)
+    else: _formatos_detectados.pop(ruta, None)
+
+def detectar_formato_csv(filepath):
+    # Lee una sola muestra de bytes y deduce encoding y separador sin parsear el archivo completo
+    with open(filepath, 'rb') as fh:
+        muestra = fh.read(BYTES_MUESTRA)
+        completo = fh.read(1) == b''
+
+    encoding = 'latin-1'
+    if muestra.startswith(b'\xef\xbb\xbf'):
+        encoding = 'utf-8-sig'
+    else:
+        try:
+            muestra.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError as e:
+            # Un carácter multibyte cortado al final de la muestra no descarta utf-8
+            if not completo and e.start >= len(muestra) - 3:
+                encoding = 'utf-8'
+
+    lineas = muestra.decode(encoding, errors='replace').splitlines()
+    if not completo: lineas = lineas[:-1]
+    lineas = [l for l in lineas if l.strip()]
+    if not lineas: return None
+
+    # Mismo criterio que el reintento original: el primer separador que da más de una columna sin filas sobrantes
+    for sep in SEPARADORES:
+        filas = list(csv.reader(lineas, delimiter=sep))
+        n_cols = len(filas[0])
+        if n_cols > 1 and all(len(f) <= n_cols for f in filas[1:]):
+            return encoding, sep
+    return None
+
+def _leer_csv_reintentando(filepath):
+    for encoding in ENCODINGS:
+        for sep in SEPARADORES:
+            try:
+                df = pd.read_csv(filepath, sep=sep, encoding=encoding)
+                if df.shape[1] > 1: return df, (encoding, sep)
+            except Exception: continue
+    return pd.DataFrame(), None
+
+def cargar_csv_super_flexible(filepath):
+    firma = _firma(filepath)  # Antes de leer: si el archivo cambia durante la lectura, el formato no queda asociado a la versión nueva
+    formato = _formato_conocido(filepath) or detectar_formato_csv(filepath)
+    if formato is not None:
+        encoding, sep = formato
+        try:
+            df = pd.read_csv(filepath, sep=sep, encoding=encoding)
+            if df.shape[1] > 1:
+                _recordar_formato(filepath, firma, formato)
+                return df
+        except Exception: pass
+
+    # Respaldo: la muestra no fue concluyente, se prueban las combinaciones
+    df, formato = _leer_csv_reintentando(filepath)
+    _recordar_formato(filepath, firma, formato)
+    return df
+
+ARCHIVOS = {
+    "leyes": "Auditoría Negocio ALA.xlsx - Leyes pesos y diferencias.csv",
+    "orotec": "Auditoría Negocio ALA.xlsx - base orotec.csv",
+    "gold": "Auditoría Negocio ALA.xlsx -  base gold price.csv",
+    "bases": "Auditoría Negocio ALA.xlsx - comparacion de bases.csv"
+}
+
+# Otros socios exportan con otro prefijo ("Auditoría Negocio XYZ.xlsx - ..."): se reconoce el sufijo
+SUFIJOS = {
+    "leyes": "leyes pesos y diferencias.csv",
+    "orotec": "base orotec.csv",
+    "gold": "base gold price.csv",
+    "bases": "comparacion de bases.csv"
+}
+
+def rutas_archivos(directorio='.'):
+    rutas = {key: os.path.join(directorio, name) for key, name in ARCHIVOS.items()}
+    faltantes = [key for key, ruta in rutas.items() if not os.path.exists(ruta)]
+    if faltantes:
+        try: nombres = sorted(os.listdir(directorio))
+        except OSError: nombres = []
+        for key in faltantes:
+            rutas[key] = next((os.path.join(directorio, n) for n in nombres if n.lower().endswith(SUFIJOS[key])), rutas[key])
+    return rutas
+
+def version_datos(directorio='.'):
+    # Firma barata (tamaño + mtime) de los archivos: identifica la versión de los datos
+    version = []
+    for key, ruta in rutas_archivos(directorio).items():
+        try:
+            info = os.stat(ruta)
+            version.append((key, info.st_size, info.st_mtime_ns))
+        except OSError:
+            version.append((key, None, None))
+    return (os.path.abspath(directorio), tuple(version))
+
+def _cargar_completo(key, ruta):
+    with etapa(f'leer_csv.{key}') as m:
+        crudo = cargar_csv_super_flexible(ruta)
+        m['filas'] = len(crudo)
+    col_fecha = next((c for c in crudo.columns if str(c).lower().strip() == 'fecha'), None)
+    lectura = {
+        'formato': _formato_conocido(ruta),
+        'columnas': [str(c) for c in crudo.columns],
+        # Tipos que infirió read_csv; la cola de un anexado debe caber en ellos
+        'tipos': {str(c): str(t) for c, t in crudo.dtypes.items()},
+        'formato_fecha': adivinar_formato_fecha(crudo[col_fecha]) if col_fecha is not None else None,
+    }
+    # Con el esquema de la versión anterior, un export con columnas nuevas no cambia qué columna es cada base
+    previo = leer_manifiesto(key, ruta) or {}
+    df = preparar_frame(key, crudo, esquema=previo.get('esquema'))
+    guardar_cache(key, ruta, df, lectura)
+    return df
+
+def _unificar_tipos(tipos, nuevas):
+    # Tipo de cada columna cruda si read_csv hubiera visto el archivo completo. Un entero que llega
+    # con vacíos o decimales pasa a float igual que en la lectura completa; cualquier otro cambio
+    # (p. ej. números del histórico que en la cola llegan como texto, "36000253,5") dejaría la
+    # columna mezclada: None y se lee todo de nuevo
+    unificados = {}
+    for col, tipo in tipos.items():
+        nuevo = str(nuevas[col].dtype)
+        if tipo == 'object' or nuevo == tipo: unificados[col] = tipo
+        elif {tipo, nuevo} == {'int64', 'float64'}: unificados[col] = 'float64'
+        else: return None
+    return unificados
+
+def _cargar_anexado(key, ruta):
+    # El export solo creció al final: se parsea y limpia la cola y se agrega al frame en caché.
+    # Bases no: su escala ($/g o miles) sale del promedio de todo el archivo y la cola sola no alcanza
+    if key == 'bases': return None
+    manifiesto = leer_manifiesto(key, ruta)
+    if not manifiesto or not manifiesto.get('termina_en_salto') or not manifiesto.get('formato') or not manifiesto.get('columnas'): return None
+    tamano_previo = manifiesto['size']
+    if os.path.getsize(ruta) <= tamano_previo or huella_archivo(ruta, tamano_previo) != manifiesto['sha256']: return None
+    previo = leer_frame_cache(key, ruta)
+    if previo is None: return None
+
+    encoding, sep = manifiesto['formato']
+    tipos = manifiesto.get('tipos')
+    if not tipos or list(tipos) != manifiesto['columnas']: return None
+    try:
+        with open(ruta, 'rb') as fh:
+            fh.seek(tamano_previo)
+            cola = fh.read()
+        # Las columnas de texto del histórico se leen como texto también en la cola
+        dtype = {c: str for c, t in tipos.items() if t == 'object'}
+        nuevas = pd.read_csv(io.BytesIO(cola), sep=sep, encoding=encoding, header=None, names=manifiesto['columnas'], dtype=dtype)
+    except Exception:
+        return None
+    tipos = _unificar_tipos(tipos, nuevas)
+    if tipos is None: return None
+    # Mismo índice que tendrían estas filas en una lectura completa
+    nuevas.index = pd.RangeIndex(len(previo), len(previo) + len(nuevas))
+    nuevas = preparar_frame(key, nuevas, manifiesto.get('formato_fecha'))
+
+    df = pd.concat([previo, nuevas])
+    if 'fecha_dt' in df.columns: df = df.sort_values('fecha_dt', kind='stable')
+    conteos = [previo.attrs.get('coerciones', {}), nuevas.attrs.get('coerciones', {})]
+    df.attrs['coerciones'] = {col: sum(c.get(col, 0) for c in conteos) for col in set().union(*conteos)}
+    # concat deja fecha_norm como texto si las categorías difieren; se vuelve a compactar el total
+    df = tipos_compactos(key, df)
+    antes = [(f.attrs.get('memoria') or {}).get('antes') for f in (previo, nuevas)]
+    df.attrs['memoria'] = {'antes': sum(antes) if None not in antes else None, 'despues': memoria_frame(df)}
+    df = particionar(df)
+    lectura = {k: manifiesto.get(k) for k in ('formato', 'columnas', 'formato_fecha')}
+    lectura['tipos'] = tipos
+    guardar_cache(key, ruta, df, lectura)
+    return df, nuevas, tamano_previo
+
+def _cargar_archivo(key, ruta):
+    with etapa(f'carga.{key}') as m:
+        df, como = leer_cache(key, ruta), ('cache', None)
+        if df is None:
+            anexado = _cargar_anexado(key, ruta)
+            if anexado is not None:
+                df, como = anexado[0], ('anexado', anexado[1:])
+            else:
+                df, como = _cargar_completo(key, ruta), ('completo', None)
+        m['filas'], m['origen'] = len(df), como[0]
+    return df, como
+
+# --- CARGA EN PARALELO ---
+# Parsear y limpiar es trabajo de CPU y los archivos son independientes: los que no están en caché se
+# reparten entre procesos. Con un solo núcleo, un solo archivo o pocos bytes, se cargan en serie.
+PROCESOS_CARGA = int(os.environ.get('AUDITORIA_PROCESOS', '0'))  # 0 = uno por núcleo, 1 = siempre en serie
+# Cada proceso arranca un intérprete e importa pandas (~0,6 s): por debajo de esto no compensa
+BYTES_PARALELO = int(os.environ.get('AUDITORIA_BYTES_PARALELO', str(16 * 1024 * 1024)))
+
+# Procesos nuevos (`python -c` que entra por cargar_en_proceso) y no multiprocessing: el tablero carga
+# desde los hilos de Streamlit y del vigilante, donde un fork puede dejar al hijo con un lock tomado
+# para siempre, y con spawn o forkserver cada hijo volvería a ejecutar la app entera (el __main__ falso
+# que Streamlit instala). Así la carga en paralelo vale igual en el tablero, el reporte y en Windows.
+ORDEN_HIJO = 'import sys; from motor_auditoria.carga import cargar_en_proceso; cargar_en_proceso(*sys.argv[1:])'
+RAIZ_PAQUETE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def nucleos_disponibles():
+    if hasattr(os, 'sched_getaffinity'): return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def procesos_carga(pendientes):
+    # Procesos para parsear `pendientes` ({key: ruta}); 1 = en serie
+    procesos = min(PROCESOS_CARGA or nucleos_disponibles(), len(pendientes))
+    if procesos < 2 or sum(os.path.getsize(r) for r in pendientes.values()) < BYTES_PARALELO: return 1
+    return procesos
+
+def cargar_en_proceso(key, ruta, memoria, copy_on_write):
+    # Corre en el proceso hijo: el frame vuelve por stdout (pickle) junto con las etapas medidas acá y
+    # el formato detectado. El caché en disco lo escribe el hijo, como en la carga en serie. Copy-on-write
+    # como lo tenga el proceso que lo lanzó
+    pd.set_option('mode.copy_on_write', copy_on_write == '1')
+    registro = RegistroEtapas({}, memoria == '1').activar()
+    try: df, como = _cargar_archivo(key, ruta)
+    finally: registro.cerrar(log=False)
+    pickle.dump((df, como, registro.etapas, _formatos_detectados.get(ruta)), sys.stdout.buffer, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _lanzar(key, ruta, memoria):
+    entorno = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [RAIZ_PAQUETE, os.environ.get('PYTHONPATH')])))
+    banderas = ['1' if memoria else '0', '1' if pd.get_option('mode.copy_on_write') is True else '0']
+    hijo = subprocess.run([sys.executable, '-c', ORDEN_HIJO, key, ruta, *banderas], capture_output=True, env=entorno)
+    if hijo.returncode != 0:
+        error = hijo.stderr.decode(errors='replace').strip().splitlines() or [f"código de salida {hijo.returncode}"]
+        raise OSError(f"{key}: {error[-1]}")
+    return pickle.loads(hijo.stdout)
+
+def _cargar_en_paralelo(pendientes, procesos):
+    registro = registro_activo()
+    memoria = registro is not None and registro.memoria
+    with etapa('carga.paralela') as m:
+        m['procesos'] = procesos
+        try:
+            # Un hilo por proceso hijo, que solo espera su salida; los hijos no se quedan con la memoria del servidor
+            with ThreadPoolExecutor(procesos) as pool:
+                futuros = {key: pool.submit(_lanzar, key, ruta, memoria) for key, ruta in pendientes.items()}
+                cargados = {key: futuro.result() for key, futuro in futuros.items()}
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            # Un proceso falló o el entorno no deja crearlos: se carga todo en serie
+            log.warning('Carga en paralelo fallida, se carga en serie: %s', e)
+            return {}
+        for key, (df, como, etapas, detectado) in cargados.items():
+            if detectado is not None: _formatos_detectados[pendientes[key]] = detectado
+            if registro is not None: registro.anexar(etapas)
+        m['filas'] = sum(len(df) for df, *_ in cargados.values())
+    return {key: (df, como) for key, (df, como, *_) in cargados.items()}
+
+def cargar_datos(directorio='.', estado=None):
+    # estado (opcional) recibe por archivo: ('cache', None), ('anexado', (filas nuevas, tamaño previo)) o ('completo', None)
+    rutas = {key: ruta for key, ruta in rutas_archivos(directorio).items() if os.path.exists(ruta)}
+    pendientes = {key: ruta for key, ruta in rutas.items() if not cache_vigente(key, ruta)}
+    procesos = procesos_carga(pendientes)
+    cargados = _cargar_en_paralelo(pendientes, procesos) if procesos > 1 else {}
+    loaded = {}
+    for key in ARCHIVOS:
+        if key not in rutas:
+            loaded[key] = None
+            continue
+        df, como = cargados[key] if key in cargados else _cargar_archivo(key, rutas[key])
+        loaded[key] = df
+        if estado is not None: estado[key] = como
+    return loaded
@@ -0,0 +1,93 @@
+"""Cubo de agregados de leyes por día, semana y mes: fugas, gramos, pesos y diferencias de ley.
+
+Se arma una vez por versión de datos (va en el resultado cacheado) y todas sus medidas se pueden
+combinar (sumas, conteos, mínimos y máximos): las filas anexadas se suman a los periodos que tocan
+sin recorrer el histórico, y un rango de fechas se enrolla desde los días sin volver a las filas.
+"""
+import numpy as np
+import pandas as pd
+
+from .calculos import COL_VALOR
+
+GRANOS = ('dia', 'semana', 'mes')
+
+# Medida del cubo -> cómo se combinan dos partes del mismo periodo
+AGREGACION = {
+    'filas': 'sum', 'fuga_valor': 'sum', 'dias_con_fugas': 'sum', 'gramos_faltantes': 'sum',
+    'peso_taller': 'sum', 'peso_factura': 'sum', 'merma': 'sum',
+    'dias_merma_ley': 'sum', 'dias_alza_ley': 'sum',
+    'ley_registros': 'sum', 'ley_diff_suma': 'sum', 'ley_diff_cuadrados': 'sum', 'ley_diff_min': 'min', 'ley_diff_max': 'max',
+}
+
+def _por_dia(df_leyes):
+    # Las medidas de cada fila, agrupadas por día; mismos umbrales que calcular_fugas y calcular_leyes.
+    # Sumas en float64 aunque el frame venga compactado (float32)
+    df = df_leyes[df_leyes['fecha_dt'].notna()]
+    def col(nombre): return df[nombre].astype(float)
+    valor, oro, diff = col(COL_VALOR), col('diferencia peso oro puro'), col('diff')
+    medidas = pd.DataFrame({
+        'filas': 1,
+        'fuga_valor': valor.where(valor < 0, 0), 'dias_con_fugas': (valor < 0).astype(int),
+        'gramos_faltantes': oro.where(oro > 0, 0),
+        'peso_taller': col('peso taller'), 'peso_factura': col('peso factura'), 'merma': col('diff_peso'),
+        'dias_merma_ley': (diff > 0.001).astype(int), 'dias_alza_ley': ((diff < -0.001) & (col('ley taller') > 0.01)).astype(int),
+        'ley_registros': diff.notna().astype(int), 'ley_diff_suma': diff, 'ley_diff_cuadrados': diff ** 2,
+        'ley_diff_min': diff, 'ley_diff_max': diff,
+    }, index=df.index)
+    return medidas.groupby(df['fecha_dt'].dt.normalize().rename('periodo')).agg(AGREGACION)
+
+def _llaves(indice, grano):
+    # Inicio del periodo de cada día: lunes de la semana o primer día del mes
+    if grano == 'semana': return indice - pd.to_timedelta(indice.dayofweek, unit='D')
+    if grano == 'mes': return pd.DatetimeIndex(indice.to_numpy().astype('datetime64[M]').astype('datetime64[ns]'))
+    return indice
+
+def _enrollar(dia, grano):
+    if grano == 'dia': return dia
+    return dia.groupby(_llaves(dia.index, grano).rename('periodo')).agg(AGREGACION)
+
+def _desde_dias(dia):
+    return {grano: _enrollar(dia, grano) for grano in GRANOS}
+
+def agregar_cubo(df_leyes):
+    return _desde_dias(_por_dia(df_leyes))
+
+def _combinar(tabla, extra):
+    # Solo se reagrupan los periodos que aparecen en ambas partes
+    if extra.empty: return tabla
+    tocados = tabla.index.isin(extra.index)
+    juntos = pd.concat([tabla[tocados], extra]).groupby(level=0).agg(AGREGACION)
+    return pd.concat([tabla[~tocados], juntos]).sort_index()
+
+def actualizar_cubo(cubo, nuevas_leyes):
+    # Las filas anexadas a leyes se enrollan aparte y se combinan con el cubo previo
+    if nuevas_leyes is None or nuevas_leyes.empty: return cubo
+    extra = _por_dia(nuevas_leyes)
+    return {grano: _combinar(cubo[grano], _enrollar(extra, grano)) for grano in GRANOS}
+
+def _fecha(valor):
+    return None if valor is None else pd.Timestamp(valor)
+
+def recortar_cubo(cubo, desde, hasta):
+    # El cubo de [desde, hasta]: los días del rango y las semanas/meses enrollados de ellos (los de los
+    # extremos quedan parciales, como el resto de las pestañas con el rango global)
+    return _desde_dias(cubo['dia'].loc[_fecha(desde):_fecha(hasta)])
+
+def vista_cubo(cubo, grano, desde=None, hasta=None):
+    # Tabla de un grano con las medidas derivadas (media y desviación de la diferencia de ley)
+    tabla = cubo[grano].loc[_fecha(desde):_fecha(hasta)]
+    n = tabla['ley_registros'].where(tabla['ley_registros'] > 0)
+    media = tabla['ley_diff_suma'] / n
+    varianza = (tabla['ley_diff_cuadrados'] / n - media ** 2).clip(lower=0)
+    return tabla.assign(ley_diff_media=media, ley_diff_desv=np.sqrt(varianza))
+
+def fin_periodo(inicio, grano):
+    inicio = pd.Timestamp(inicio)
+    if grano == 'mes': return inicio + pd.offsets.MonthEnd(0)
+    if grano == 'semana': return inicio + pd.Timedelta(days=6)
+    return inicio
+
+def desglosar(cubo, grano, periodo, detalle='dia'):
+    # Drill-down: las filas de `detalle` dentro de un periodo de `grano` (los días de un mes o de una
+    # semana, las semanas que empiezan en un mes); una búsqueda en el índice ordenado
+    return vista_cubo(cubo, detalle, periodo, fin_periodo(periodo, grano))
@@ -0,0 +1,205 @@
+"""Varios socios y periodos en un mismo servidor: descubrimiento de carpetas, caché LRU acotado por memoria
+y un vigilante que recalcula en segundo plano los datasets cuyos archivos cambian."""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .carga import rutas_archivos, version_datos
+from .servicio import obtener_auditoria
+
+log = logging.getLogger(__name__)
+
+# Raíz con una carpeta por socio (y opcionalmente una subcarpeta por periodo)
+RAIZ_DATOS = os.environ.get('AUDITORIA_DATOS', '.')
+MEMORIA_MAXIMA_MB = float(os.environ.get('AUDITORIA_MEMORIA_MB', '1024'))
+PROFUNDIDAD_MAXIMA = 2
+
+# Vigilante: revisa tamaño y fecha de los archivos de cada dataset cargado cada SEGUNDOS_VIGILANCIA y
+# recalcula cuando una versión nueva lleva ESPERA_CAMBIOS sin moverse (un export a medio copiar no cuenta)
+VIGILAR = os.environ.get('AUDITORIA_VIGILAR', '1') == '1'
+SEGUNDOS_VIGILANCIA = float(os.environ.get('AUDITORIA_VIGILAR_SEGUNDOS', '2'))
+ESPERA_CAMBIOS = float(os.environ.get('AUDITORIA_ESPERA_SEGUNDOS', '3'))
+
+def _tiene_datos(directorio):
+    return os.path.exists(rutas_archivos(directorio)['leyes'])
+
+def descubrir_datasets(raiz=RAIZ_DATOS):
+    # {etiqueta: directorio}; la etiqueta es la ruta relativa a la raíz ("socio/periodo")
+    encontrados = {}
+    for actual, subdirs, _ in os.walk(raiz):
+        nivel = os.path.relpath(actual, raiz).count(os.sep) + (actual != raiz)
+        subdirs[:] = sorted(d for d in subdirs if not d.startswith('.')) if nivel < PROFUNDIDAD_MAXIMA else []
+        if _tiene_datos(actual):
+            etiqueta = os.path.relpath(actual, raiz)
+            encontrados[os.path.basename(os.path.abspath(raiz)) if etiqueta == '.' else etiqueta] = actual
+    return encontrados
+
+def memoria_resultado(objeto, vistos=None):
+    # Suma la memoria de lo que contiene el resultado (dicts y listas anidados); un frame o arreglo
+    # que aparece dos veces (p. ej. datos['leyes'] y pesos['df_view']) se cuenta una sola.
+    # También mide las vistas memorizadas: figuras de Plotly (su JSON) y objetos del paquete como
+    # el Simulador (sus atributos al momento de medir)
+    vistos = set() if vistos is None else vistos
+    if id(objeto) in vistos: return 0
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        vistos.add(id(objeto))
+        return int(np.sum(objeto.memory_usage(deep=True)))  # Series devuelve un entero, DataFrame una Series
+    if isinstance(objeto, np.ndarray):
+        vistos.add(id(objeto))
+        return int(objeto.nbytes)
+    if isinstance(objeto, (str, bytes)): return len(objeto)
+    if isinstance(objeto, dict):
+        vistos.add(id(objeto))
+        return sum(memoria_resultado(v, vistos) for v in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        vistos.add(id(objeto))
+        return sum(memoria_resultado(v, vistos) for v in objeto)
+    if hasattr(objeto, 'to_plotly_json'): return memoria_resultado(objeto.to_plotly_json(), vistos)
+    if type(objeto).__module__.startswith(__package__ + '.'):
+        vistos.add(id(objeto))
+        return memoria_resultado(vars(objeto), vistos)
+    return 0
+
+def resumen_memoria(datos):
+    # Una fila por archivo: MB que ocupaba antes y después de la compactación (df.attrs['memoria'])
+    filas = []
+    for key, df in datos.items():
+        if df is None: continue
+        memoria = df.attrs.get('memoria') or {}
+        antes, despues = memoria.get('antes'), memoria.get('despues', memoria_resultado(df))
+        filas.append({'archivo': key, 'filas': len(df), 'mb_antes': antes / 1024 / 1024 if antes else None, 'mb_despues': despues / 1024 / 1024,
+                      'ahorro_pct': (1 - despues / antes) * 100 if antes else None})
+    return pd.DataFrame(filas, columns=['archivo', 'filas', 'mb_antes', 'mb_despues', 'ahorro_pct'])
+
+class CacheDatasets:
+    # Carga perezosa: un dataset solo se lee la primera vez que alguien lo pide.
+    # Al pasar el límite se expulsan los menos usados; el más reciente siempre se conserva.
+    # Con vigilar=True, los cambios en un dataset ya cargado los recalcula un hilo aparte: mientras
+    # tanto se sigue sirviendo la versión anterior y nadie espera el parseo.
+    def __init__(self, memoria_maxima_mb=MEMORIA_MAXIMA_MB, vigilar=VIGILAR):
+        self.limite = int(memoria_maxima_mb * 1024 * 1024)
+        self._entradas = OrderedDict()  # version -> (resultado, bytes)
+        self._lock = threading.Lock()
+        self.vigilar = vigilar
+        self._vigilante = None
+        self._detener = threading.Event()
+        self._vistas = {}  # directorio -> (versión nueva, cuándo se vio por primera vez)
+        self._fallidas = {}  # directorio -> (versión, error) que no se pudo recalcular en segundo plano
+        self._suscritos = []  # Funciones a llamar con el directorio de cada dataset expulsado
+
+    def al_expulsar(self, funcion):
+        # p. ej. MemoVistas.descartar: lo derivado de un dataset expulsado tampoco debe quedar en memoria
+        self._suscritos.append(funcion)
+
+    def obtener(self, directorio):
+        version = version_datos(directorio)
+        with self._lock:
+            if version in self._entradas:
+                self._entradas.move_to_end(version)
+                return self._entradas[version][0]
+            previo = self._ultimo(version[0])
+            # El vigilante la recalculará; una versión que falló allá se recalcula aquí para mostrar el error
+            if previo is not None and self.vigilar and self._fallidas.get(version[0], (None,))[0] != version:
+                return previo
+
+        resultado = obtener_auditoria(version, previo)
+        self._guardar(version, resultado)
+        self._iniciar_vigilante()
+        return resultado
+
+    def _ultimo(self, directorio):
+        return next((r for v, (r, _) in reversed(self._entradas.items()) if v[0] == directorio), None)
+
+    def _guardar(self, version, resultado, reemplaza=None):
+        # El cambio de versión es atómico: quien lea después del lock ve la nueva completa.
+        # reemplaza: el resultado que se esperaba sustituir; si otro ya lo cambió, no se pisa
+        tamano = memoria_resultado(resultado)
+        with self._lock:
+            if reemplaza is not None and self._ultimo(version[0]) is not reemplaza: return
+            # Una versión vieja del mismo directorio ya no sirve
+            for vieja in [v for v in self._entradas if v[0] == version[0] and v != version]:
+                del self._entradas[vieja]
+            self._entradas[version] = (resultado, tamano)
+            expulsados = self._expulsar()
+        for directorio in expulsados:
+            for funcion in self._suscritos: funcion(directorio)
+
+    def version_lista(self, directorio):
+        # Versión más reciente ya calculada del directorio; una sesión con otra distinta debe volver a leer
+        with self._lock:
+            resultado = self._ultimo(os.path.abspath(directorio))
+        return resultado['version'] if resultado is not None else None
+
+    def actualizando(self, directorio):
+        # Si los archivos ya cambiaron pero la versión nueva todavía no está lista
+        version = self.version_lista(directorio)
+        return version is not None and version != version_datos(directorio)
+
+    # --- VIGILANTE ---
+    def _iniciar_vigilante(self):
+        with self._lock:
+            if not self.vigilar or self._vigilante is not None: return
+            self._vigilante = threading.Thread(target=self._vigilar, name='vigilante-datasets', daemon=True)
+        self._vigilante.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._vigilante is not None: self._vigilante.join()
+
+    def _vigilar(self):
+        # Nada de lo que pase en una vuelta detiene la vigilancia (un directorio que desapareció,
+        # un archivo a medio escribir): se registra y se sigue con el siguiente
+        while not self._detener.wait(SEGUNDOS_VIGILANCIA):
+            try:
+                for directorio in self.cargados():
+                    try:
+                        self._revisar(directorio)
+                    except Exception:
+                        log.warning('No se pudo revisar %s', directorio, exc_info=True)
+            except Exception:
+                log.exception('Falló una vuelta del vigilante de datasets')
+
+    def _revisar(self, directorio):
+        version = version_datos(directorio)
+        with self._lock:
+            if version in self._entradas or self._fallidas.get(directorio, (None,))[0] == version: return
+            previo = self._ultimo(directorio)
+        vista = self._vistas.get(directorio)
+        if vista is None or vista[0] != version:
+            self._vistas[directorio] = (version, time.monotonic())
+            return
+        if time.monotonic() - vista[1] < ESPERA_CAMBIOS: return
+
+        del self._vistas[directorio]
+        try:
+            resultado = obtener_auditoria(version, previo)
+        except Exception as e:
+            self._fallidas[directorio] = (version, e)
+            return
+        self._fallidas.pop(directorio, None)
+        # Si los archivos volvieron a cambiar mientras tanto, esta se sirve igual y la próxima vuelta calcula la siguiente
+        self._guardar(version, resultado, reemplaza=previo)
+
+    def _expulsar(self):
+        expulsados = []
+        while len(self._entradas) > 1 and self._memoria() > self.limite:
+            expulsados.append(self._entradas.popitem(last=False)[0][0])
+        return expulsados
+
+    def _memoria(self):
+        # Con el lock tomado
+        return sum(bytes_ for _, bytes_ in self._entradas.values())
+
+    def memoria_usada(self):
+        with self._lock:
+            return self._memoria()
+
+    def cargados(self):
+        # Copia tomada con el lock: el vigilante la recorre mientras otras sesiones guardan o expulsan
+        with self._lock:
+            return [version[0] for version in self._entradas]
@@ -0,0 +1,69 @@
+"""Exportación de cualquier vista a CSV, Parquet o XLSX, escrita por bloques de filas."""
+import io
+
+import pandas as pd
+
+from .limpieza import ampliar_float32
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import xlsxwriter
+    MOTOR_XLSX = 'xlsxwriter'
+except ImportError:
+    try:
+        import openpyxl
+        MOTOR_XLSX = 'openpyxl'
+    except ImportError:  # Sin motor de Excel solo se ofrece CSV y Parquet
+        MOTOR_XLSX = None
+
+FILAS_POR_BLOQUE = 50_000
+FILAS_POR_HOJA = 1_048_575  # Límite de Excel, sin contar el encabezado
+
+MIME = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+def formatos_disponibles():
+    disponibles = {'csv': True, 'parquet': pa is not None, 'xlsx': MOTOR_XLSX is not None}
+    return [f for f in MIME if disponibles[f]]
+
+def _bloques(df, filas=None):
+    # Los pesos y leyes compactados salen con su decimal, no con el ruido de float32
+    filas = filas or FILAS_POR_BLOQUE
+    for inicio in range(0, max(len(df), 1), filas):
+        yield inicio, ampliar_float32(df.iloc[inicio:inicio + filas])
+
+def exportar_csv(df, destino):
+    for inicio, bloque in _bloques(df):
+        destino.write(bloque.to_csv(index=False, header=inicio == 0).encode('utf-8'))
+
+def exportar_parquet(df, destino):
+    # Un row group por bloque; el esquema sale del frame completo para que todos los bloques coincidan
+    esquema = pa.Schema.from_pandas(ampliar_float32(df.iloc[:0]), preserve_index=False)
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for _, bloque in _bloques(df):
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+
+def exportar_xlsx(df, destino, hoja='Datos'):
+    with pd.ExcelWriter(destino, engine=MOTOR_XLSX) as escritor:
+        # Pasado el límite de filas de Excel se sigue en otra hoja, con su encabezado
+        for n_hoja, (_, parte) in enumerate(_bloques(df, FILAS_POR_HOJA)):
+            nombre = hoja if n_hoja == 0 else f"{hoja} {n_hoja + 1}"
+            for inicio, bloque in _bloques(parte):
+                bloque.to_excel(escritor, sheet_name=nombre, startrow=inicio + 1 if inicio else 0, header=inicio == 0, index=False)
+
+ESCRITORES = {'csv': exportar_csv, 'parquet': exportar_parquet, 'xlsx': exportar_xlsx}
+
+def exportar_bytes(df, formato):
+    # Bytes del archivo; pensado para download_button(data=callable): solo corre al hacer clic
+    if formato not in formatos_disponibles(): raise ValueError(f"Formato no disponible: {formato}")
+    destino = io.BytesIO()
+    ESCRITORES[formato](df, destino)
+    return destino.getvalue()
@@ -0,0 +1,130 @@
+"""Tiempo, memoria pico y filas por etapa de cada corrida, para encontrar los puntos lentos sin un profiler.
+
+Uso:
+    registro = iniciar_registro({'app': 'tablero'}, memoria=True)
+    with etapa('fugas', filas=len(df)) as m: ...
+    registro.cerrar()
+
+Fuera de un registro activo, etapa() no mide nada. La memoria se mide con tracemalloc, que es
+global al proceso: con varias sesiones simultáneas el pico de cada etapa es aproximado.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Si está definida, cada corrida cerrada se agrega a este archivo como JSON lines
+ARCHIVO_LOG = os.environ.get('AUDITORIA_LOG_ETAPAS')
+MEMORIA_ETAPAS = os.environ.get('AUDITORIA_MEMORIA_ETAPAS', '') == '1'
+
+_registro_activo = contextvars.ContextVar('registro_etapas', default=None)
+
+# tracemalloc encendido mientras haya al menos un registro que mida memoria
+_usuarios_memoria = 0
+_lock_memoria = threading.Lock()
+_lock_log = threading.Lock()
+
+def _pedir_memoria():
+    global _usuarios_memoria
+    with _lock_memoria:
+        if _usuarios_memoria == 0 and not tracemalloc.is_tracing(): tracemalloc.start()
+        _usuarios_memoria += 1
+
+def _soltar_memoria():
+    global _usuarios_memoria
+    with _lock_memoria:
+        _usuarios_memoria -= 1
+        if _usuarios_memoria == 0 and tracemalloc.is_tracing(): tracemalloc.stop()
+
+class RegistroEtapas:
+    def __init__(self, contexto=None, memoria=False):
+        self.corrida = uuid.uuid4().hex[:12]
+        self.contexto = dict(contexto or {})
+        self.memoria = memoria or MEMORIA_ETAPAS
+        self.inicio = datetime.now().isoformat(timespec='milliseconds')
+        self.etapas = []
+        self._pila = []  # Etapas abiertas, para anidar y propagar el pico de memoria
+        self._t0 = time.perf_counter()
+        self.segundos = None
+        if self.memoria: _pedir_memoria()
+
+    @contextmanager
+    def medir(self, nombre, filas=None):
+        medicion = {'etapa': nombre, 'nivel': len(self._pila), 'segundos': None, 'memoria_pico_mb': None, 'filas': filas}
+        self.etapas.append(medicion)
+        self._pila.append(medicion)
+        memoria = self.memoria and tracemalloc.is_tracing()
+        if memoria:
+            base = tracemalloc.get_traced_memory()[0]
+            medicion['_pico_hijos'] = 0
+            tracemalloc.reset_peak()
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        finally:
+            medicion['segundos'] = time.perf_counter() - inicio
+            self._pila.pop()
+            if memoria:
+                pico = max(tracemalloc.get_traced_memory()[1], medicion.pop('_pico_hijos'))
+                medicion['memoria_pico_mb'] = max(pico - base, 0) / 1024 / 1024
+                # Los hijos reinician el pico: el padre se queda con el mayor que hayan visto
+                if self._pila and '_pico_hijos' in self._pila[-1]: self._pila[-1]['_pico_hijos'] = max(self._pila[-1]['_pico_hijos'], pico)
+
+    def activar(self):
+        _registro_activo.set(self)
+        return self
+
+    def cerrar(self, log=True):
+        # log=False para registros auxiliares (p. ej. de un proceso de carga) que se anexan a otro
+        if self.segundos is None:
+            if _registro_activo.get() is self: _registro_activo.set(None)
+            self.segundos = time.perf_counter() - self._t0
+            if self.memoria: _soltar_memoria()
+            if log and ARCHIVO_LOG: escribir_log(ARCHIVO_LOG, [self])
+        return self
+
+    def anexar(self, etapas):
+        # Etapas medidas en otro registro (otro proceso), colgadas de la etapa abierta en este
+        nivel = len(self._pila)
+        self.etapas.extend(dict(m, nivel=m['nivel'] + nivel) for m in etapas)
+
+    def registros(self):
+        # Un dict plano por etapa, listo para JSON lines o un DataFrame
+        comunes = {'corrida': self.corrida, 'inicio': self.inicio, 'segundos_corrida': self.segundos, **self.contexto}
+        return [{**comunes, **medicion} for medicion in self.etapas]
+
+def iniciar_registro(contexto=None, memoria=False):
+    # Una corrida interrumpida (p. ej. un rerun de Streamlit) deja su registro abierto: se cierra aquí
+    previo = _registro_activo.get()
+    if previo is not None: previo.cerrar()
+    return RegistroEtapas(contexto, memoria).activar()
+
+def registro_activo():
+    return _registro_activo.get()
+
+@contextmanager
+def etapa(nombre, filas=None):
+    # Mide el bloque en el registro activo; sin registro no hace nada
+    registro = _registro_activo.get()
+    if registro is None:
+        yield {'etapa': nombre, 'filas': filas}
+        return
+    with registro.medir(nombre, filas) as medicion:
+        yield medicion
+
+def exportar_jsonl(registros):
+    lineas = []
+    for registro in registros:
+        lineas.extend(json.dumps(r, ensure_ascii=False, default=str) for r in registro.registros())
+    return '\n'.join(lineas) + '\n' if lineas else ''
+
+def escribir_log(ruta, registros):
+    try:
+        with _lock_log, open(ruta, 'a', encoding='utf-8') as fh: fh.write(exportar_jsonl(registros))
+    except OSError:
+        pass  # El log es opcional; un disco lleno no debe tumbar el tablero
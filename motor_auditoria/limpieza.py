@@ -0,0 +1,232 @@
+"""Normalización de columnas, limpieza numérica y fechas de los cuatro archivos."""
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from .instrumentacion import etapa
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Sin pyarrow se usa la cadena de .str.replace de siempre
+    pa = None
+
+COLUMNAS_NUMERICAS = {
+    "leyes": ['peso taller', 'peso factura', 'diferencia en valor', 'ley taller', 'ley jerusalen', 'diferencia peso oro puro', 'peso oro puro real', 'peso oro puro factura'],
+    "orotec": ['utilidad sociedad total', 'utilidad taller', 'utilidad ala', 'base orotec'],
+    "gold": ['utilidad sociedad total', 'utilidad taller', 'utilidad ala', 'total peso taller', 'total peso factura', 'total pagado en factura', 'compra medellin', 'base oro gold', 'base medellin', 'base venta',
+             'total venta', 'total peso oro puro fact', 'base orotec'],
+    "bases": None,  # Todas menos fecha
+}
+
+# Columnas de 'comparacion de bases': nombres conocidos primero y, si el export cambió, una pista.
+# Las columnas 'diferencia ...' mencionan 'ala' pero no son bases
+ESQUEMA_BASES = {
+    'ala': (['base ala', 'base segun ala'], r'\bala\b'),
+    'capital': (['4% de base medellin'], r'4%|\bcompra\b'),
+    'acuerdo': (['93%'], r'93%|\bacuerdo\b'),
+}
+# Una base con promedio menor viene en miles de pesos por gramo
+UMBRAL_MILES = 10000
+
+# Columnas que calcula agregar_derivadas sobre el frame preparado; las pestañas las leen sin copiar el frame
+COLUMNAS_DERIVADAS = {"leyes": ['diff_peso', 'diff'], "bases": ['Dif Capital', 'Alerta']}
+
+# Representación compacta: pesos y leyes a float32 si ningún valor se mueve más de media unidad de la
+# precisión con que la app los muestra (gramos con 2 decimales, leyes con 4); las sumas y los cálculos
+# se hacen en float64. fecha_norm como categoría y los textos repetidos como strings Arrow
+TOLERANCIA_GRAMOS = 5e-3
+TOLERANCIA_LEY = 5e-5
+COLUMNAS_FLOAT32 = {
+    "leyes": {
+        'peso taller': TOLERANCIA_GRAMOS, 'peso factura': TOLERANCIA_GRAMOS, 'ley taller': TOLERANCIA_LEY, 'ley jerusalen': TOLERANCIA_LEY,
+        'diferencia peso oro puro': TOLERANCIA_GRAMOS, 'peso oro puro real': TOLERANCIA_GRAMOS, 'peso oro puro factura': TOLERANCIA_GRAMOS,
+    },
+    "gold": {'total peso taller': TOLERANCIA_GRAMOS, 'total peso factura': TOLERANCIA_GRAMOS, 'total peso oro puro fact': TOLERANCIA_GRAMOS},
+}
+COLUMNAS_TEXTO_ARROW = ['fecha', 'observaciones']
+
+# Decimal simple ya sin '$', espacios ni comas; lo demás lo decide pd.to_numeric
+PATRON_NUMERO = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+# Montos con separador de miles: "$1.234,56" o "1.234.567" (punto de miles) y "1,234.56" o "1,234,567"
+# (coma de miles). Con un solo separador ("0,874", "1.234") es el decimal, como en los exports
+MILES_PUNTO = r'[+-]?\d{1,3}(\.\d{3})+,\d*|[+-]?\d{1,3}(\.\d{3}){2,}'
+MILES_COMA = r'[+-]?\d{1,3}(,\d{3})+\.\d*|[+-]?\d{1,3}(,\d{3}){2,}'
+
+def _limpiar_texto(textos):
+    # Sin '$' ni espacios, sin los separadores de miles y con coma decimal a punto
+    limpio = textos.str.replace('$', '', regex=False).str.replace(' ', '', regex=False)
+    limpio = limpio.mask(limpio.str.fullmatch(MILES_PUNTO, na=False), limpio.str.replace('.', '', regex=False))
+    limpio = limpio.mask(limpio.str.fullmatch(MILES_COMA, na=False), limpio.str.replace(',', '', regex=False))
+    return limpio.str.replace(',', '.', regex=False)
+
+def _texto_a_float_arrow(serie):
+    # Kernels de Arrow, sin objetos de Python por celda: tres reemplazos ('$' fuera, coma a punto, espacios
+    # fuera), el filtro del decimal simple y el cast; lo que no es simple pasa al camino de pandas de abajo
+    crudo = pa.array(serie, type=pa.string(), from_pandas=True)
+    arr = pc.replace_substring(pc.replace_substring(pc.replace_substring(crudo, '$', ''), ',', '.'), ' ', '')
+    simple = pc.fill_null(pc.match_substring_regex(arr, PATRON_NUMERO), False)
+    valores = pc.cast(pc.if_else(simple, arr, None), pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+
+    # Casos raros (miles como "$1.234,56", 'inf', 'nan', desbordes como '1e400', texto libre...): las
+    # mismas reglas que sin pyarrow, solo sobre esas filas. Un monto con miles nunca es simple: deja
+    # dos puntos al pasar la coma a punto
+    resto = np.flatnonzero((~simple.to_numpy(zero_copy_only=False) | np.isinf(valores)) & serie.notna().to_numpy())
+    if len(resto):
+        textos = pd.Series(crudo.take(resto).to_pylist(), dtype=object)
+        valores[resto] = pd.to_numeric(_limpiar_texto(textos), errors='coerce').to_numpy(dtype=float)
+    return valores
+
+def _texto_a_float(serie):
+    if pa is not None:
+        try: return _texto_a_float_arrow(serie)
+        except (pa.ArrowInvalid, pa.ArrowTypeError): pass  # Objetos que no son texto
+    return pd.to_numeric(_limpiar_texto(serie.astype(str)), errors='coerce').to_numpy(dtype=float, copy=True)  # Escribible con copy-on-write
+
+def limpiar_nums(df, cols):
+    # Convierte montos con formato ("$1.234,56", "0,874") a float64; los inválidos quedan en 0.
+    # Cuántos valores no vacíos se forzaron a 0 queda en df.attrs['coerciones'] por columna.
+    if df is None: return df
+    coerciones = dict(df.attrs.get('coerciones', {}))
+    for col in cols:
+        if col in df.columns:
+            serie = df[col]
+            if serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+                valores = _texto_a_float(serie)
+                invalidos = np.isnan(valores)
+                coerciones[col] = int(invalidos.sum() - serie.isna().sum())
+                valores[invalidos] = 0.0
+                df[col] = valores
+            else:
+                df[col] = pd.to_numeric(serie, errors='coerce').fillna(0)
+    df.attrs['coerciones'] = coerciones
+    return df
+
+def contar_coerciones(datos):
+    # {archivo: {columna: valores forzados a 0}}, solo las columnas con alguno; lo muestran la pestaña
+    # de diagnóstico y el resumen.json del reporte
+    return {key: {col: n for col, n in df.attrs.get('coerciones', {}).items() if n}
+            for key, df in datos.items() if df is not None and any(df.attrs.get('coerciones', {}).values())}
+
+def adivinar_formato_fecha(fechas):
+    # El mismo formato que pd.to_datetime infiere del primer valor; se guarda para parsear colas anexadas
+    primero = fechas.dropna()
+    if primero.empty or not isinstance(primero.iloc[0], str): return None
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return guess_datetime_format(primero.iloc[0])
+
+def limpiar_frame(key, df):
+    # 1. Normalización
+    df.columns = df.columns.str.lower().str.strip()
+
+    # 2. Limpieza
+    if key == 'leyes' and 'no' in df.columns:
+        df['no'] = pd.to_numeric(df['no'], errors='coerce').fillna(0).astype(int)
+    cols = COLUMNAS_NUMERICAS[key]
+    if cols is None: cols = [c for c in df.columns if c != 'fecha']
+    return limpiar_nums(df, cols)
+
+def agregar_fechas(df, formato_fecha=None):
+    # 3. Fechas
+    if 'fecha' in df.columns:
+        df['fecha_dt'] = pd.to_datetime(df['fecha'], errors='coerce', format=formato_fecha)
+        df['fecha_norm'] = df['fecha_dt'].dt.strftime('%Y-%m-%d')
+        # Orden estable: un archivo anexado y uno leído completo quedan en el mismo orden
+        df = df.sort_values('fecha_dt', kind='stable')
+    return df
+
+def columnas_bases(df, previas=None):
+    # {'ala', 'capital', 'acuerdo'} -> columna de 'comparacion de bases', o None si falta alguna.
+    # previas: lo resuelto en la versión anterior del archivo; se mantiene mientras esas columnas existan
+    crudas = [c for c in df.columns if c not in COLUMNAS_DERIVADAS['bases']]
+    if previas and all(c in crudas for c in previas.values()): return dict(previas)
+    columnas = {}
+    for rol, (conocidas, pista) in ESQUEMA_BASES.items():
+        libres = [c for c in crudas if c not in columnas.values()]
+        columnas[rol] = next((c for c in conocidas if c in libres), None) or \
+            next((c for c in libres if re.search(pista, c) and not c.startswith('diferencia')), None)
+    return columnas if all(columnas.values()) else None
+
+def resolver_esquema(key, df, previo=None):
+    # 4. Esquema: qué columna es cada base y en qué unidad viene, una vez por versión de los datos.
+    # Queda en df.attrs['esquema'] y en el manifiesto del caché; previo es el de la versión anterior
+    if key == 'bases':
+        columnas = columnas_bases(df, (previo or {}).get('columnas'))
+        # Depende del promedio de todo el archivo, por eso bases no se carga por anexado
+        df.attrs['esquema'] = columnas and {
+            'columnas': columnas,
+            'escala': {rol: 1000 if df[col].mean() < UMBRAL_MILES else 1 for rol, col in columnas.items()},
+        }
+    return df
+
+def agregar_derivadas(key, df):
+    # 5. Derivadas: se calculan una vez aquí y quedan en el caché, en vez de una copia del frame por pestaña
+    if key == 'leyes':
+        df['diff_peso'] = df['peso taller'] - df['peso factura']
+        df['diff'] = df['ley taller'] - df['ley jerusalen']
+    elif key == 'bases' and df.attrs.get('esquema'):
+        # Las pestañas leen las bases ya en $/g
+        columnas, escala = df.attrs['esquema']['columnas'], df.attrs['esquema']['escala']
+        for rol, col in columnas.items():
+            if escala[rol] != 1: df[col] = df[col] * escala[rol]
+        df['Dif Capital'] = df[columnas['ala']] - df[columnas['capital']]
+        df['Alerta'] = df['Dif Capital'] < 0
+    return df
+
+def tipos_compactos(key, df):
+    # Idempotente: también restituye los strings Arrow que Parquet devuelve como string[python]
+    for col, tolerancia in COLUMNAS_FLOAT32.get(key, {}).items():
+        if col in df.columns and df[col].dtype == np.float64:
+            valores = df[col].to_numpy()
+            reducidos = valores.astype(np.float32)
+            if np.allclose(reducidos, valores, rtol=0, atol=tolerancia, equal_nan=True): df[col] = reducidos
+    if 'fecha_norm' in df.columns and df['fecha_norm'].dtype == object:
+        df['fecha_norm'] = df['fecha_norm'].astype('category')
+    if pa is not None:
+        for col in COLUMNAS_TEXTO_ARROW:
+            if col in df.columns and (df[col].dtype == object or getattr(df[col].dtype, 'storage', None) == 'python'):
+                df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+def ampliar_float32(df):
+    # Para mostrar o exportar: cada float32 vuelve a float64 por su decimal más corto (0.893, no 0.8930000067)
+    columnas = [c for c in df.columns if df[c].dtype == np.float32]
+    if not columnas: return df
+    return df.assign(**{c: df[c].to_numpy().astype(str).astype(np.float64) for c in columnas})
+
+def memoria_frame(df):
+    return int(df.memory_usage(deep=True).sum())
+
+def compactar_frame(key, df):
+    # 6. Compactación; los bytes antes y después quedan en df.attrs['memoria'] para el diagnóstico
+    antes = memoria_frame(df)
+    df = tipos_compactos(key, df)
+    df.attrs['memoria'] = {'antes': antes, 'despues': memoria_frame(df)}
+    return df
+
+def particionar(df):
+    # 7. Particiones: filas [ini, fin) de cada mes ('AAAA-MM') del frame, que ya viene ordenado por fecha;
+    # las filas sin fecha quedan al final en 'sin-fecha'. Recortar un periodo solo mira sus meses
+    if 'fecha_dt' not in df.columns:
+        df.attrs['particiones'] = {'todo': [0, len(df)]}
+        return df
+    fechas = df['fecha_dt'].to_numpy()
+    validas = len(fechas) - int(np.isnat(fechas).sum())
+    meses = fechas[:validas].astype('datetime64[M]')
+    cortes = np.concatenate([[0], np.flatnonzero(meses[1:] != meses[:-1]) + 1, [validas]]) if validas else np.array([0])
+    particiones = {str(meses[ini]): [int(ini), int(fin)] for ini, fin in zip(cortes[:-1], cortes[1:])}
+    if validas < len(fechas): particiones['sin-fecha'] = [validas, len(fechas)]
+    df.attrs['particiones'] = particiones
+    return df
+
+def preparar_frame(key, df, formato_fecha=None, esquema=None):
+    with etapa(f'limpieza.{key}', filas=len(df)): df = limpiar_frame(key, df)
+    with etapa(f'fechas.{key}', filas=len(df)): df = agregar_fechas(df, formato_fecha)
+    with etapa(f'esquema.{key}', filas=len(df)): df = resolver_esquema(key, df, esquema)
+    with etapa(f'derivadas.{key}', filas=len(df)): df = agregar_derivadas(key, df)
+    with etapa(f'compactar.{key}', filas=len(df)): df = compactar_frame(key, df)
+    with etapa(f'particiones.{key}', filas=len(df)): return particionar(df)
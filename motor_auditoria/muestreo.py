@@ -0,0 +1,44 @@
+"""Reducción de series largas antes de graficarlas: LTTB para líneas y mín/máx para barras."""
+import numpy as np
+
+# Por encima de esto el navegador se pone lento con varias trazas
+PUNTOS_MAXIMOS = 1500
+
+def indices_lttb(x, y, n):
+    # Largest-Triangle-Three-Buckets: en cada tramo, el punto que forma el triángulo más grande
+    # con el elegido antes y el promedio del tramo siguiente. Conserva primero y último.
+    largo = len(y)
+    if n >= largo or n < 3: return np.arange(largo)
+    bordes = np.linspace(1, largo - 1, n - 1).astype(np.int64)
+    elegidos = np.empty(n, dtype=np.int64)
+    elegidos[0], elegidos[-1] = 0, largo - 1
+    a = 0
+    for i in range(n - 2):
+        ini, fin = bordes[i], bordes[i + 1]
+        if i + 2 < len(bordes): cx, cy = x[fin:bordes[i + 2]].mean(), y[fin:bordes[i + 2]].mean()
+        else: cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[ini:fin] - y[a]) - (x[a] - x[ini:fin]) * (cy - y[a]))
+        a = ini + int(np.argmax(area))
+        elegidos[i + 1] = a
+    return elegidos
+
+def indices_minmax(y, n):
+    # El mínimo y el máximo de cada tramo: ningún pico desaparece
+    largo = len(y)
+    if n >= largo or n < 2: return np.arange(largo)
+    elegidos = []
+    for tramo in np.array_split(np.arange(largo), n // 2):
+        elegidos += [tramo[np.argmin(y[tramo])], tramo[np.argmax(y[tramo])]]
+    return np.unique(elegidos)
+
+def reducir_serie(df, columnas, n=PUNTOS_MAXIMOS, modo='lttb', obligatorios=None):
+    # Filas a graficar: la unión de lo que elige el método en cada columna más las filas `obligatorios`
+    # (máscara booleana, p. ej. los días con alerta), que se conservan aunque pasen del límite.
+    if len(df) <= n: return df
+    x = np.arange(len(df), dtype=float)  # Filas ya ordenadas por fecha; la posición evita problemas con NaT
+    por_columna = max(n // len(columnas), 3)
+    indices = [np.flatnonzero(np.asarray(obligatorios))] if obligatorios is not None else []
+    for col in columnas:
+        y = np.nan_to_num(df[col].to_numpy(dtype=float))
+        indices.append(indices_lttb(x, y, por_columna) if modo == 'lttb' else indices_minmax(y, por_columna))
+    return df.iloc[np.unique(np.concatenate(indices))]
@@ -0,0 +1,73 @@
+"""Periodos: la auditoría limitada a un rango de fechas, recortando por las particiones mensuales de cada frame."""
+import os
+
+import numpy as np
+
+from .cache import cache_vigente, leer_frame_cache
+from .calculos import FECHA_IMPASSE, calcular_auditoria
+from .carga import cargar_datos, rutas_archivos
+from .cubo import agregar_cubo, recortar_cubo
+from .limpieza import particionar
+
+def meses_del_rango(desde, hasta):
+    # ['AAAA-MM', ...] de desde a hasta, ambos incluidos
+    return [str(m) for m in np.arange(np.datetime64(desde, 'M'), np.datetime64(hasta, 'M') + 1)]
+
+def extremos(df):
+    # Primera y última fecha del frame sin recorrerlo: vienen de las particiones
+    meses = [m for m in df.attrs.get('particiones', {}) if m not in ('sin-fecha', 'todo')]
+    if not meses: return None
+    fechas = df['fecha_dt']
+    return fechas.iloc[df.attrs['particiones'][meses[0]][0]].date(), fechas.iloc[df.attrs['particiones'][meses[-1]][1] - 1].date()
+
+def recortar(df, desde, hasta):
+    # Filas con fecha en [desde, hasta]: solo se miran las particiones de esos meses, y dentro del primero
+    # y el último una búsqueda binaria (el frame está ordenado por fecha). Las filas sin fecha quedan fuera
+    if df is None or 'fecha_dt' not in df.columns: return df
+    if 'particiones' not in df.attrs: particionar(df)
+    particiones = df.attrs['particiones']
+    meses = [m for m in meses_del_rango(desde, hasta) if m in particiones]
+    if not meses: return particionar(df.iloc[:0])
+    ini, fin = particiones[meses[0]][0], particiones[meses[-1]][1]
+    fechas = df['fecha_dt'].to_numpy()[ini:fin]
+    a = ini + int(np.searchsorted(fechas, np.datetime64(desde, 'D'), 'left'))
+    b = ini + int(np.searchsorted(fechas, np.datetime64(hasta, 'D') + 1, 'left'))
+    return particionar(df.iloc[a:b])
+
+def _calcular(datos, desde, hasta, diario=None, cubo=None):
+    # El impasse (pérdida registrada a mano) solo cuenta si su fecha cae en el periodo
+    periodo = (str(desde), str(hasta))
+    impasse = periodo[0] <= FECHA_IMPASSE <= periodo[1]
+    calculado = {}
+    if datos['leyes'] is not None and not datos['leyes'].empty:
+        calculado = calcular_auditoria(datos, diario, impasse)
+        calculado['cubo'] = cubo if cubo is not None else agregar_cubo(datos['leyes'])
+    return dict(calculado, datos=datos, periodo=periodo, impasse=impasse)
+
+def auditoria_periodo(resultado, desde, hasta):
+    # El resultado completo recalculado sobre [desde, hasta]; el diario y el cubo ya están indexados por
+    # fecha y se recortan
+    datos = {key: recortar(df, desde, hasta) for key, df in resultado['datos'].items()}
+    diario = {key: tabla.loc[str(desde):str(hasta)] if not tabla.empty else tabla for key, tabla in resultado['diario'].items()}
+    cubo = recortar_cubo(resultado['cubo'], desde, hasta) if 'cubo' in resultado else None
+    return dict(_calcular(datos, desde, hasta, diario, cubo), version=resultado['version'])
+
+def leer_periodo(directorio, desde, hasta):
+    # Los frames preparados de [desde, hasta] leyendo del caché en disco solo los row groups de esos meses;
+    # None si algún archivo no tiene caché vigente
+    meses = set(meses_del_rango(desde, hasta))
+    datos = {}
+    for key, ruta in rutas_archivos(directorio).items():
+        if not os.path.exists(ruta):
+            datos[key] = None
+            continue
+        df = leer_frame_cache(key, ruta, meses) if cache_vigente(key, ruta) else None
+        if df is None: return None
+        datos[key] = recortar(df, desde, hasta)
+    return datos
+
+def obtener_periodo(directorio, desde, hasta):
+    # Para procesos batch: sin caché vigente se carga completo una vez (y queda en caché) y se recorta
+    datos = leer_periodo(directorio, desde, hasta)
+    if datos is None: datos = {key: recortar(df, desde, hasta) for key, df in cargar_datos(directorio).items()}
+    return _calcular(datos, desde, hasta)
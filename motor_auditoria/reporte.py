@@ -0,0 +1,125 @@
+"""Reporte batch de la auditoría sin navegador.
+
+Uso:
+    python -m motor_auditoria.reporte DIRECTORIO [DIRECTORIO ...] --salida reportes --formatos csv,parquet,json
+    python -m motor_auditoria.reporte DIRECTORIO --desde 2025-05-01 --hasta 2025-07-31
+
+Cada DIRECTORIO contiene los cuatro CSV exportados de un socio; los resultados quedan en
+SALIDA/<nombre del directorio>/. Con --desde/--hasta solo se leen del caché los meses del periodo.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+import pandas as pd
+
+from .carga import version_datos
+from .cubo import vista_cubo
+from .limpieza import ampliar_float32, contar_coerciones
+from .periodos import obtener_periodo
+from .servicio import obtener_auditoria
+
+FORMATOS = ('csv', 'parquet', 'json')
+
+def resumen_auditoria(resultado, umbral_peso=1.0):
+    # Los mismos KPIs que muestran las pestañas Fugas, Bases, Pesos y Leyes, y los valores no numéricos
+    # que la limpieza forzó a 0 (por archivo y columna), que la pestaña de diagnóstico también muestra
+    fugas, pesos, leyes, bases = resultado['fugas'], resultado['pesos'], resultado['leyes'], resultado['bases']
+    resumen = {
+        'fugas': {
+            'dinero_faltante_total': abs(float(fugas['total_dinero_perdido'])),
+            'oro_puro_faltante_g': float(fugas['total_gramos_perdidos']),
+            'dias_con_fugas': int(fugas['dias_con_fugas']),
+        },
+        'pesos': {
+            'peso_taller_g': float(pesos['peso_taller']),
+            'peso_factura_g': float(pesos['peso_factura']),
+            'merma_total_g': float(pesos['merma']),
+            'dias_sobre_umbral': int((pesos['df_view']['diff_peso'].abs() > umbral_peso).sum()),
+            'umbral_g': umbral_peso,
+        },
+        'leyes': {'dias_merma_ley': len(leyes['df_mermas']), 'dias_alza_ley': len(leyes['df_ganancia'])},
+        'bases': None,
+        'coerciones': contar_coerciones(resultado['datos']),
+    }
+    if bases and bases['columnas']:
+        resumen['bases'] = {
+            'dias_alerta_capital': bases['dias_alerta'],
+            'promedio_capital': float(bases['promedio_capital']),
+            'promedio_acuerdo': float(bases['promedio_acuerdo']),
+            'promedio_ala': float(bases['promedio_ala']),
+        }
+    return resumen
+
+def tablas_auditoria(resultado, umbral_peso=1.0):
+    tablas = {
+        'reporte_fugas_capital': resultado['fugas']['df_perdidas'],
+        'hallazgos': resultado['hallazgos'],
+        'merma_ley': resultado['leyes']['df_mermas'][['fecha', 'ley taller', 'ley jerusalen', 'diff']],
+        'alza_ley': resultado['leyes']['df_ganancia'][['fecha', 'ley taller', 'ley jerusalen', 'diff_abs']],
+    }
+    df_pesos = resultado['pesos']['df_view']
+    tablas['diferencias_peso'] = df_pesos[df_pesos['diff_peso'].abs() > umbral_peso][['fecha', 'peso taller', 'peso factura', 'diff_peso']]
+    bases = resultado['bases']
+    if bases and bases['columnas']:
+        c = bases['columnas']
+        df_view = bases['df_view']
+        tablas['bases_alertas'] = df_view[df_view['Alerta']][['fecha', c['capital'], c['acuerdo'], c['ala'], 'Dif Capital']]
+    if 'cubo' in resultado:  # Los agregados por mes y semana que ve la pestaña de resumen
+        tablas['resumen_mensual'] = vista_cubo(resultado['cubo'], 'mes').reset_index()
+        tablas['resumen_semanal'] = vista_cubo(resultado['cubo'], 'semana').reset_index()
+    return tablas
+
+def escribir_tabla(df, ruta_base, formatos):
+    df = ampliar_float32(df)
+    for formato in formatos:
+        if formato == 'csv': df.to_csv(ruta_base + '.csv', index=False)
+        elif formato == 'parquet': df.to_parquet(ruta_base + '.parquet', index=False)
+        elif formato == 'json': df.to_json(ruta_base + '.json', orient='records', date_format='iso', force_ascii=False, indent=2)
+
+def generar_reporte(directorio, salida, formatos=FORMATOS, umbral_peso=1.0, desde=None, hasta=None):
+    if desde or hasta: resultado = obtener_periodo(directorio, desde or datetime.date.min, hasta or datetime.date.max)
+    else: resultado = obtener_auditoria(version_datos(directorio))
+    if 'fugas' not in resultado: return None
+
+    destino = os.path.join(salida, os.path.basename(os.path.abspath(directorio)))
+    os.makedirs(destino, exist_ok=True)
+    resumen = resumen_auditoria(resultado, umbral_peso)
+    with open(os.path.join(destino, 'resumen.json'), 'w', encoding='utf-8') as fh:
+        json.dump(resumen, fh, ensure_ascii=False, indent=2)
+    for nombre, df in tablas_auditoria(resultado, umbral_peso).items():
+        escribir_tabla(df, os.path.join(destino, nombre), formatos)
+    return resumen
+
+def main(argv=None):
+    pd.set_option('mode.copy_on_write', True)  # Como en el tablero: los frames preparados no se modifican en sitio
+    parser = argparse.ArgumentParser(prog='python -m motor_auditoria.reporte', description="Genera los reportes de fugas, bases, pesos y leyes sin abrir el tablero.")
+    parser.add_argument('directorios', nargs='+', help="Carpetas con los cuatro CSV de cada socio")
+    parser.add_argument('--salida', default='reportes', help="Carpeta de salida (por defecto: reportes)")
+    parser.add_argument('--formatos', default='csv,json', help="Formatos de las tablas, separados por coma: csv, parquet, json")
+    parser.add_argument('--umbral-peso', type=float, default=1.0, help="Diferencia mínima de peso (g) para listar un día")
+    parser.add_argument('--desde', type=datetime.date.fromisoformat, help="Primer día del periodo (AAAA-MM-DD)")
+    parser.add_argument('--hasta', type=datetime.date.fromisoformat, help="Último día del periodo (AAAA-MM-DD)")
+    args = parser.parse_args(argv)
+
+    formatos = [f.strip() for f in args.formatos.split(',') if f.strip()]
+    invalidos = [f for f in formatos if f not in FORMATOS]
+    if invalidos: parser.error(f"Formatos no soportados: {', '.join(invalidos)}")
+
+    fallidos = 0
+    for directorio in args.directorios:
+        resumen = generar_reporte(directorio, args.salida, formatos, args.umbral_peso, args.desde, args.hasta)
+        if resumen is None:
+            print(f"⚠️ {directorio}: no se encontraron datos de leyes", file=sys.stderr)
+            fallidos += 1
+            continue
+        f = resumen['fugas']
+        print(f"✅ {directorio}: faltante ${f['dinero_faltante_total']:,.0f} | oro puro {f['oro_puro_faltante_g']:.2f} g | {f['dias_con_fugas']} días")
+        forzados = sum(n for columnas in resumen['coerciones'].values() for n in columnas.values())
+        if forzados: print(f"⚠️ {directorio}: {forzados:,} valores no numéricos quedaron en 0 (ver 'coerciones' en resumen.json)", file=sys.stderr)
+    return 1 if fallidos else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Punto de entrada único: un resultado de auditoría por versión de datos."""
+from .almacen import abrir_almacen, calcular_auditoria_sql
+from .cache import guardar_resultado, leer_resultado
+from .calculos import actualizar_por_dia, calcular_auditoria
+from .carga import cargar_datos
+from .cubo import actualizar_cubo, agregar_cubo
+from .instrumentacion import etapa
+
+ARCHIVOS_DIARIO = ('leyes', 'gold', 'orotec')
+
+# Vistas del resultado que son los propios frames preparados: no van al pickle (ya están en el
+# caché Parquet) y al leerlo se enlazan a los frames cargados en vez de traer una copia aparte
+VISTAS_DATOS = {'pesos': 'leyes', 'bases': 'bases'}
+
+def _sin_vistas(resultado):
+    return {k: dict(v, df_view=None) if k in VISTAS_DATOS and v and 'df_view' in v else v for k, v in resultado.items()}
+
+def _enlazar_vistas(resultado, datos):
+    for k, key in VISTAS_DATOS.items():
+        if resultado.get(k) and 'df_view' in resultado[k]: resultado[k]['df_view'] = datos[key]
+    return resultado
+
+def _filas_nuevas(previo, version, datos, estado):
+    # Las filas anexadas a cada archivo del diario desde `previo`; None si alguno cambió de otra forma
+    if not previo: return None
+    antes = {v[0]: v[1:] for v in previo['version'][1]}
+    ahora = {v[0]: v[1:] for v in version[1]}
+    nuevas = {}
+    for key in ARCHIVOS_DIARIO:
+        como, info = estado.get(key, (None, None))
+        if antes.get(key) == ahora.get(key):
+            nuevas[key] = datos[key].iloc[:0] if datos[key] is not None else None
+        elif como == 'anexado' and info[1] == antes.get(key, (None,))[0]:
+            nuevas[key] = info[0]
+        else:
+            return None
+    return nuevas
+
+def obtener_auditoria(version, previo=None):
+    # version = version_datos(directorio); el primer proceso que la ve calcula y guarda, los demás leen.
+    # previo: resultado anterior del mismo directorio, para actualizar el diario sin recalcularlo
+    directorio = version[0]
+    estado = {}
+    datos = cargar_datos(directorio, estado)
+    if datos['leyes'] is None or datos['leyes'].empty: return {'datos': datos, 'version': version}
+    with etapa('cache.resultado'): resultado = leer_resultado(version)
+    if resultado is None:
+        # Diario y cubo se actualizan con las filas anexadas en vez de recorrer el histórico
+        nuevas = _filas_nuevas(previo, version, datos, estado)
+        diario = actualizar_por_dia(previo['diario'], nuevas['leyes'], nuevas['gold'], nuevas['orotec']) if nuevas and 'diario' in previo else None
+        # Con AUDITORIA_ALMACEN, filtros y sumas corren como SQL sobre el almacén embebido
+        almacen = abrir_almacen(version)
+        if almacen is None:
+            resultado = calcular_auditoria(datos, diario)
+        else:
+            try: resultado = _enlazar_vistas(calcular_auditoria_sql(almacen, diario), datos)
+            finally: almacen.cerrar()
+        with etapa('calculo.cubo', len(datos['leyes'])):
+            resultado['cubo'] = actualizar_cubo(previo['cubo'], nuevas['leyes']) if nuevas and 'cubo' in previo else agregar_cubo(datos['leyes'])
+        guardar_resultado(version, _sin_vistas(resultado))
+    else:
+        resultado = _enlazar_vistas(resultado, datos)
+    return dict(resultado, datos=datos, version=version)
@@ -0,0 +1,119 @@
+"""Simulador de escenarios: la utilidad de cada operación de Gold recalculada con otro porcentaje de
+acuerdo, otra base de compra y otro reparto, sobre todo el histórico con aritmética de NumPy.
+
+utilidad = total venta - oro puro x base de compra; el taller recibe `reparto` y ALA el resto. La base
+es el acuerdo (porcentaje del Gold Price) o la referencia Orotec; los días sin referencia Orotec usan
+el acuerdo o quedan fuera, según `respaldo`. La base `archivo` toma la compra Medellín registrada en la
+hoja y reproduce su utilidad: el acuerdo al 93% no la iguala porque la hoja registra compras que no
+son gramos x 93% x Gold Price (otra base u otros gramos en algunas filas).
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+PORCENTAJE_ACUERDO = 0.93
+REPARTO_TALLER = 0.60
+BASES = ('acuerdo', 'orotec', 'archivo')
+RESPALDOS = ('acuerdo', 'omitir')
+ORO = ('real', 'factura')
+
+def _arreglo(df, col):
+    # float64 sin NaN: una fila sin dato aporta 0, como en limpiar_nums
+    if col not in df.columns: return np.zeros(len(df))
+    return np.nan_to_num(df[col].to_numpy(dtype=float, na_value=np.nan))
+
+def _por_fila(fecha_norm, por_dia):
+    # El valor de `por_dia` (indexado por fecha_norm) en cada fila; con fecha_norm como categoría se
+    # busca una vez por día y se reparte con los códigos
+    if isinstance(fecha_norm.dtype, pd.CategoricalDtype):
+        valores = por_dia.reindex(fecha_norm.cat.categories.astype(object)).to_numpy(dtype=float, na_value=np.nan)
+        return np.append(valores, np.nan)[fecha_norm.cat.codes.to_numpy()]  # Código -1 (sin fecha) -> NaN
+    return fecha_norm.astype(object).map(por_dia).to_numpy(dtype=float, na_value=np.nan)
+
+class Simulador:
+    # Los arreglos de Gold se arman una vez por versión de datos; cada escenario es una pasada de
+    # NumPy sobre ellos y una grilla completa sale en una sola llamada
+    def __init__(self, df_gold, df_orotec, diario):
+        fechas = df_gold['fecha_dt'].to_numpy()
+        self.filas = len(df_gold)
+        self.venta = _arreglo(df_gold, 'total venta')
+        self.gold = _arreglo(df_gold, 'base oro gold')
+        self.orotec = _arreglo(df_gold, 'base orotec')
+        self.compra = _arreglo(df_gold, 'compra medellin')
+        self.registrada = float((self.venta - self.compra).sum())  # Utilidad de la hoja, para comparar
+
+        # Oro puro real: el de factura por la relación real/factura de ese día en leyes (1 si no hay leyes)
+        oro_factura = _arreglo(df_gold, 'total peso oro puro fact')
+        dias = diario['leyes']
+        relacion = (dias['op_taller'] / dias['op_factura']).replace([np.inf, -np.inf], np.nan)
+        factor = _por_fila(df_gold['fecha_norm'], relacion)
+        self.oro = {'factura': oro_factura, 'real': oro_factura * np.nan_to_num(factor, nan=1.0)}
+
+        # Con referencia Orotec: base positiva y el día no figura en Orotec como "no se tiene referencia"
+        sin_referencia = np.zeros(self.filas, dtype=bool)
+        if df_orotec is not None and 'observaciones' in df_orotec.columns:
+            mask = df_orotec['observaciones'].astype(str).str.contains("no se tiene referencia", case=False, na=False)
+            sin_referencia = df_gold['fecha_norm'].isin(df_orotec.loc[mask, 'fecha_norm'].dropna().unique()).to_numpy()
+        self.con_referencia = (self.orotec > 0) & ~sin_referencia
+
+        # Mes de cada fila como entero desde el primero, para las series con bincount; las filas sin
+        # fecha llevan el código siguiente al último mes y no salen en la serie
+        meses = fechas.astype('datetime64[M]')
+        con_fecha = ~np.isnat(meses)
+        numeros = meses.astype(np.int64)
+        primero, ultimo = (numeros[con_fecha].min(), numeros[con_fecha].max()) if con_fecha.any() else (0, -1)
+        self.meses = np.arange(primero, ultimo + 1).astype('datetime64[M]')
+        self.mes = np.where(con_fecha, numeros - primero, len(self.meses))
+        self._coeficientes = functools.lru_cache(maxsize=4)(self._calcular_coeficientes)
+
+    def _calcular_coeficientes(self, base, respaldo, oro):
+        # utilidad = venta - fijo - porcentaje x variable, fila por fila. Lo que no depende de los
+        # deslizadores se arma una vez por combinación de base, respaldo y oro
+        if base == 'archivo': return self.venta - self.compra, np.zeros(self.filas), 0
+        gramos = self.oro[oro]
+        if base == 'acuerdo': usa_orotec, incluida = np.zeros(self.filas, dtype=bool), None
+        elif respaldo == 'acuerdo': usa_orotec, incluida = self.con_referencia, None
+        else: usa_orotec, incluida = self.con_referencia, self.con_referencia
+        fijo = np.where(usa_orotec, gramos * self.orotec, 0.0)
+        variable = np.where(usa_orotec, 0.0, gramos * self.gold)
+        venta = self.venta if incluida is None else np.where(incluida, self.venta, 0.0)
+        if incluida is not None: variable[~incluida] = 0.0
+        omitidas = 0 if incluida is None else int(self.filas - incluida.sum())
+        return venta - fijo, variable, omitidas
+
+    def evaluar(self, porcentaje=PORCENTAJE_ACUERDO, reparto=REPARTO_TALLER, base='acuerdo', respaldo='acuerdo', oro='real'):
+        # Un escenario: totales y la serie mensual de taller y ALA. La utilidad por fila no sale: pesa
+        # lo que el histórico y el tablero memoriza cada escenario
+        margen, variable, omitidas = self._coeficientes(base, respaldo, oro)
+        utilidad = margen - porcentaje * variable
+        total = float(utilidad.sum())
+        por_mes = np.bincount(self.mes, weights=utilidad, minlength=len(self.meses) + 1)[:len(self.meses)]
+        return {
+            'utilidad_total': total, 'taller': total * reparto, 'ala': total * (1 - reparto),
+            'dias_perdida': int(np.count_nonzero(utilidad < 0)), 'omitidas': omitidas,
+            'por_mes': pd.DataFrame({'taller': por_mes * reparto, 'ala': por_mes * (1 - reparto)}, index=pd.DatetimeIndex(self.meses, name='mes')),
+        }
+
+    def grilla(self, porcentajes, repartos, base='acuerdo', respaldo='acuerdo', oro='real'):
+        # Todas las combinaciones porcentaje x reparto en una llamada, sin una pasada por combinación:
+        # la utilidad total es lineal en el porcentaje y las filas con pérdida son las de umbral
+        # (margen / variable) menor que el porcentaje, contadas con una búsqueda binaria
+        margen, variable, _ = self._coeficientes(base, respaldo, oro)
+        porcentajes, repartos = np.asarray(porcentajes, dtype=float), np.asarray(repartos, dtype=float)
+        totales = margen.sum() - porcentajes * variable.sum()
+
+        # Con variable negativa (gramos negativos en el archivo) la desigualdad se invierte
+        positiva, negativa = variable > 0, variable < 0
+        sube = np.sort(margen[positiva] / variable[positiva])
+        baja = np.sort(margen[negativa] / variable[negativa])
+        fijas = int(np.count_nonzero(~positiva & ~negativa & (margen < 0)))
+        perdidas = fijas + np.searchsorted(sube, porcentajes, side='left') + len(baja) - np.searchsorted(baja, porcentajes, side='right')
+
+        p, r = np.meshgrid(porcentajes, repartos, indexing='ij')
+        utilidad = np.broadcast_to(totales[:, None], p.shape)
+        return pd.DataFrame({
+            'porcentaje': p.ravel(), 'reparto': r.ravel(),
+            'utilidad_total': utilidad.ravel(), 'taller': (utilidad * r).ravel(), 'ala': (utilidad * (1 - r)).ravel(),
+            'dias_perdida': np.broadcast_to(perdidas[:, None], p.shape).ravel(),
+        })
@@ -0,0 +1,158 @@
+"""Generador de datos sintéticos con el formato de los cuatro CSV exportados.
+
+Uso:
+    python -m motor_auditoria.sinteticos DIRECTORIO --filas 100k [--semilla 0]
+
+Escribe los cuatro archivos (mismos nombres, columnas, separador ';', coma decimal, fechas M/D/AAAA y
+montos "$438.000 " en comparación de bases) con FILAS filas cada uno, por bloques para no cargar
+10M de filas en memoria.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from .carga import ARCHIVOS
+
+TAMANOS = {'1k': 1_000, '100k': 100_000, '10M': 10_000_000}
+FILAS_POR_BLOQUE = 500_000
+FECHA_INICIAL = '2025-05-15'
+DIAS_MAXIMOS = 30 * 365  # Con más filas se repiten días; pandas no representa fechas después de 2262
+
+OBSERVACIONES_GOLD = ['', '', '', 'ok', 'Ellos pagaron 6.600 menos', 'No coinciden valores entre factura y el valor real de la venta']
+OBSERVACIONES_OROTEC = ['', 'ok', 'No coinciden valores entre factura y el valor real de la venta', 'No se tiene referencia de base orotec']
+
+def interpretar_filas(texto):
+    # "100k", "10M" o un entero
+    return TAMANOS.get(texto) or int(float(texto))
+
+def _fechas(dias):
+    fechas = pd.date_range(FECHA_INICIAL, periods=dias, freq='D')
+    mdy = fechas.month.astype(str) + '/' + fechas.day.astype(str) + '/' + fechas.year.astype(str)
+    return np.asarray(mdy, dtype=object), np.asarray(fechas.strftime('%d/%m/%Y'), dtype=object)
+
+def _miles(valores):
+    # 438000 -> "$438.000 " como en la hoja de comparación de bases
+    return '$' + pd.Series(valores).map('{:,}'.format).str.replace(',', '.', regex=False) + ' '
+
+def _invalidos(rng, serie, fraccion=0.001):
+    # Algunas celdas vacías o con texto, como en los exports reales (la columna queda como texto con coma decimal)
+    mask = rng.random(len(serie)) < fraccion
+    texto = pd.Series(serie).astype(str).str.replace('.', ',', regex=False)
+    return texto.where(~mask, rng.choice(['', '#N/A', '-'], size=len(serie)))
+
+def _bloque_leyes(rng, no, fecha):
+    n = len(no)
+    ley_t = rng.uniform(0.84, 0.90, n).round(3)
+    ley_j = (ley_t + rng.normal(0, 0.008, n)).round(3)
+    peso_t = rng.uniform(30, 260, n).round(2)
+    peso_f = (peso_t - rng.choice([0, 0, 0, 0.02, -0.03, 5], size=n)).round(2)
+    op_fact = (peso_f * ley_j).round(2)
+    op_real = (peso_t * ley_t).round(5)
+    dif = (op_real - op_fact).round(5)
+    return pd.DataFrame({
+        'no': no, 'fecha': fecha, 'ley taller': ley_t, 'peso taller': peso_t, 'ley jerusalen': ley_j, 'peso factura': peso_f,
+        'peso oro puro factura': op_fact, 'peso oro puro real': op_real, 'diferencia peso oro puro': dif,
+        'diferencia en valor': _invalidos(rng, (-dif * 425000).round(1)),
+    })
+
+def _montos(rng, n):
+    peso_t = rng.uniform(40, 280, n).round(2)
+    peso_f = (peso_t - rng.choice([0, 0, 0.03, 5], size=n)).round(2)
+    op_fact = (peso_f * rng.uniform(0.84, 0.90, n)).round(2)
+    gold = rng.integers(430, 530, n) * 1000
+    base_venta = gold - rng.integers(5, 20, n) * 1000
+    total_venta = (op_fact * base_venta).round(0)
+    return peso_t, peso_f, op_fact, gold, base_venta, total_venta
+
+def _bloque_gold(rng, no, fecha):
+    n = len(no)
+    peso_t, peso_f, op_fact, gold, base_venta, total_venta = _montos(rng, n)
+    base_orotec = gold - rng.integers(20, 35, n) * 1000
+    base_medellin = (gold * 0.93).round(0)
+    compra = (op_fact * base_medellin).round(2)
+    utilidad = (total_venta - compra).round(2)
+    return pd.DataFrame({
+        'no': no, 'fecha': fecha, 'total peso taller': peso_t, 'total peso factura': peso_f, 'total peso oro puro fact': op_fact,
+        'base oro gold': gold, 'base orotec': base_orotec, 'base medellin': base_medellin, 'base venta': base_venta,
+        'diferencia entre bases': base_venta - base_medellin, 'total venta': total_venta,
+        'total pagado en factura': (total_venta - rng.choice([0, 6600, 54400], size=n)).round(0), 'compra medellin': compra,
+        'utilidad sociedad total': _invalidos(rng, utilidad), 'utilidad taller': (utilidad * 0.6).round(3), 'utilidad ala': (utilidad * 0.4).round(3),
+        'observaciones': rng.choice(OBSERVACIONES_GOLD, size=n),
+    })
+
+def _bloque_orotec(rng, no, fecha):
+    n = len(no)
+    peso_t, peso_f, op_fact, gold, base_venta, total_venta = _montos(rng, n)
+    base_orotec = gold - rng.integers(20, 35, n) * 1000
+    compra = (op_fact * base_orotec).round(0)
+    utilidad = total_venta - compra
+    return pd.DataFrame({
+        'no': no, 'fecha': fecha, 'total peso taller': peso_t, 'total peso factura': peso_f, 'total peso oro puro fact': op_fact,
+        'base orotec': base_orotec, 'base venta': base_venta, 'diferencia entre bases': base_venta - base_orotec,
+        'total venta': total_venta, 'compra base orotec': compra, 'utilidad sociedad total': utilidad,
+        'utilidad taller': (utilidad * 0.6).round(2), 'utilidad ala': (utilidad * 0.4).round(2),
+        'observaciones': rng.choice(OBSERVACIONES_OROTEC, size=n), 'total pagado en factura': total_venta,
+    })
+
+def _bloque_bases(rng, no, fecha):
+    n = len(no)
+    gold = rng.integers(430, 530, n) * 1000
+    acuerdo = (gold * 0.93).round(0).astype(np.int64)
+    capital = (acuerdo * 0.96).round(0).astype(np.int64)
+    ala = capital + rng.integers(-3, 9, n) * 1000  # Algunos días la base ALA queda bajo la de capital
+    return pd.DataFrame({
+        'fecha': fecha, 'base gold price': _miles(gold), '93%': _miles(acuerdo), '4% de base medellin': _miles(capital),
+        'base ala': _miles(ala), 'Diferencia entre base segun ala y base giovani real': _miles(capital - ala),
+        'diferencia entre base para utilidad y base segun ala por gramo': _miles(acuerdo - ala),
+    })
+
+def _escribir_bloque(fh, df, encabezado):
+    # Coma decimal formateada en Arrow: DataFrame.to_csv(decimal=',') formatea celda por celda en Python
+    columnas = {}
+    for col in df.columns:
+        arr = pa.array(df[col], from_pandas=True)
+        if pa.types.is_floating(arr.type): arr = pc.replace_substring(pc.cast(arr, pa.string()), '.', ',')
+        columnas[col] = arr
+    if encabezado: fh.write((';'.join(df.columns) + '\n').encode('utf-8'))
+    pa_csv.write_csv(pa.table(columnas), fh, pa_csv.WriteOptions(include_header=False, delimiter=';', quoting_style='needed'))
+
+BLOQUES = {'leyes': _bloque_leyes, 'orotec': _bloque_orotec, 'gold': _bloque_gold, 'bases': _bloque_bases}
+
+def generar_datos(directorio, filas, semilla=0, filas_por_bloque=FILAS_POR_BLOQUE):
+    # Cada archivo tiene `filas` filas ordenadas por fecha; devuelve {key: ruta}
+    os.makedirs(directorio, exist_ok=True)
+    dias = max(1, min(filas, DIAS_MAXIMOS))
+    mdy, dmy = _fechas(dias)
+    rutas = {}
+    for i, (key, bloque) in enumerate(BLOQUES.items()):
+        rng = np.random.default_rng([semilla, i])
+        ruta = os.path.join(directorio, ARCHIVOS[key])
+        with open(ruta, 'wb') as fh:
+            for inicio in range(0, filas, filas_por_bloque):
+                no = np.arange(inicio, min(inicio + filas_por_bloque, filas))
+                dia = no * dias // filas
+                df = bloque(rng, no + 1, (dmy if key == 'bases' else mdy)[dia])
+                _escribir_bloque(fh, df, inicio == 0)
+        rutas[key] = ruta
+    return rutas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m motor_auditoria.sinteticos', description="Escribe los cuatro CSV de auditoría con datos sintéticos.")
+    parser.add_argument('directorio', help="Carpeta de salida")
+    parser.add_argument('--filas', default='100k', help="Filas por archivo: 1k, 100k, 10M o un número (por defecto: 100k)")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador aleatorio")
+    args = parser.parse_args(argv)
+
+    filas = interpretar_filas(args.filas)
+    for key, ruta in generar_datos(args.directorio, filas, args.semilla).items():
+        print(f"✅ {key}: {filas:,} filas -> {ruta}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""Tablas largas: paginación en el servidor y formato condicional con máscaras, sin recorrer celda por celda."""
+import numpy as np
+import pandas as pd
+
+FILAS_POR_PAGINA = 200
+
+def paginar(df, pagina, filas_por_pagina=FILAS_POR_PAGINA):
+    # (filas de la página, total de páginas); pagina empieza en 1 y se acota al rango válido
+    paginas = max(-(-len(df) // filas_por_pagina), 1)
+    pagina = min(max(int(pagina), 1), paginas)
+    return df.iloc[(pagina - 1) * filas_por_pagina:pagina * filas_por_pagina], paginas
+
+def css_negativos(df, columnas, css_negativo, css_resto=''):
+    # Para Styler.apply(axis=None): una máscara por columna en vez de una llamada por celda
+    estilos = pd.DataFrame('', index=df.index, columns=df.columns)
+    for col in columnas:
+        estilos[col] = np.where(df[col] < 0, css_negativo, css_resto)
+    return estilos
+
+def css_filas(df, mascara, css):
+    # Resalta filas completas donde la máscara es verdadera
+    estilos = np.where(np.asarray(mascara)[:, None], css, '')
+    return pd.DataFrame(np.broadcast_to(estilos, df.shape), index=df.index, columns=df.columns)
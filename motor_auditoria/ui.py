@@ -0,0 +1,180 @@
+"""Piezas de Streamlit compartidas por app.py y auditoria.py. Es el único módulo del paquete que importa
+Streamlit; el resto del motor no lo usa ni lo importa.
+"""
+import pandas as pd
+import streamlit as st
+
+from .datasets import RAIZ_DATOS, SEGUNDOS_VIGILANCIA, CacheDatasets, descubrir_datasets, resumen_memoria
+from .exportar import MIME, exportar_bytes, formatos_disponibles
+from .instrumentacion import etapa, exportar_jsonl
+from .limpieza import ampliar_float32, contar_coerciones
+from .periodos import auditoria_periodo, extremos
+from .tablas import FILAS_POR_PAGINA, paginar
+from .vistas import MemoVistas
+
+# --- CARGA DE DATOS ---
+# Un caché LRU por proceso, compartido por todas las sesiones de las dos apps; los resultados son de solo lectura
+@st.cache_resource
+def cache_datasets():
+    return CacheDatasets()
+
+@st.cache_data(ttl=60)
+def listar_datasets():
+    return descubrir_datasets()
+
+def load_data(directorio):
+    return cache_datasets().obtener(directorio)
+
+# El vigilante recalcula en segundo plano cuando cambian los archivos; al quedar lista la versión
+# nueva, la sesión abierta se vuelve a dibujar sola
+@st.fragment(run_every=SEGUNDOS_VIGILANCIA)
+def vigilar_datos(directorio, version):
+    if cache_datasets().version_lista(directorio) not in (None, version): st.rerun(scope='app')
+    if cache_datasets().actualizando(directorio): st.caption("🔄 Llegaron archivos nuevos; se están procesando en segundo plano.")
+
+def elegir_dataset(registro):
+    # Selector de socio/periodo (si hay más de uno) y el resultado cacheado de ese directorio; con el
+    # vigilante activo, la barra lateral avisa mientras se procesa una versión nueva
+    datasets = listar_datasets()
+    etiqueta = st.sidebar.selectbox("Socio / Periodo:", list(datasets)) if len(datasets) > 1 else next(iter(datasets), None)
+    registro.contexto['dataset'] = etiqueta
+    directorio = datasets.get(etiqueta, RAIZ_DATOS)
+    with etapa('datos'): resultado = load_data(directorio)
+    if cache_datasets().vigilar:
+        with st.sidebar: vigilar_datos(directorio, resultado['version'])
+    return resultado
+
+# --- PESTAÑAS PEREZOSAS ---
+# Solo corre la pestaña abierta (st.tabs con on_change='rerun'). Lo que calcula cada una se memoriza
+# por versión de datos y parámetros, así que volver a una pestaña no recalcula nada.
+PREFIJOS_PERSISTENTES = ('filtro_', 'rango_', 'pagina_', 'formato_', 'consulta_')
+
+def conservar_estado():
+    # Streamlit borra el estado de los widgets que no se dibujan en una corrida; los de las pestañas
+    # cerradas se reasignan aquí para conservar filtros, página y fecha al volver a ellas
+    for k in [k for k in st.session_state if k.startswith(PREFIJOS_PERSISTENTES)]: st.session_state[k] = st.session_state[k]
+
+# Uno por app: las dos comparten nombres de vista pero no columnas ni textos
+@st.cache_resource
+def memo_vistas(app):
+    memo = MemoVistas()
+    cache_datasets().al_expulsar(memo.descartar)
+    return memo
+
+def vista_memorizada(app, resultado, nombre, calcular, *parametros):
+    # La vista `nombre` del resultado (completo o de un periodo) con esos parámetros
+    return memo_vistas(app).obtener(nombre, resultado['version'], (resultado.get('periodo'),) + parametros, calcular)
+
+def rango_global(app, resultado):
+    # Rango global: todas las pestañas se calculan sobre [desde, hasta], recortado por las particiones
+    # mensuales. Devuelve el resultado del periodo elegido, o el completo si se ve todo
+    rango = extremos(resultado['datos']['leyes']) if resultado['datos']['leyes'] is not None else None
+    if not rango: return resultado
+    inicio, fin = rango
+    clave_rango = f"rango_global_{inicio}_{fin}"
+    st.session_state.setdefault(clave_rango, (inicio, fin))
+    elegido = st.sidebar.date_input("Rango de fechas:", min_value=inicio, max_value=fin, format="DD/MM/YYYY", key=clave_rango)
+    desde, hasta = list(elegido) + [inicio, fin][len(elegido):]  # Mientras se elige, el rango llega incompleto
+    if (desde, hasta) == (inicio, fin): return resultado
+    periodo = vista_memorizada(app, resultado, 'periodo', lambda: auditoria_periodo(resultado, desde, hasta), desde, hasta)
+    if not periodo.get('fugas'):
+        st.info(f"No hay movimientos entre {desde:%d/%m/%Y} y {hasta:%d/%m/%Y}.")
+        st.stop()
+    return periodo
+
+# --- GRÁFICOS Y TABLAS LARGAS ---
+# Zoom del lado del servidor: solo el tramo elegido se reduce y se envía al navegador
+def rango_visible(df, etiqueta, key):
+    # (desde, hasta) elegido, o None si se ve todo; la clave lleva los extremos para que otro dataset no herede el rango
+    fechas = df['fecha_dt'].dropna()
+    if fechas.empty or fechas.min() == fechas.max(): return None
+    inicio, fin = fechas.min().date(), fechas.max().date()
+    key = f"{key}_{inicio}_{fin}"
+    st.session_state.setdefault(key, (inicio, fin))
+    desde, hasta = st.slider(etiqueta, inicio, fin, key=key)
+    return None if (desde, hasta) == (inicio, fin) else (desde, hasta)
+
+def filtrar_rango(df, rango):
+    if rango is None: return df
+    return df[df['fecha_dt'].between(pd.Timestamp(rango[0]), pd.Timestamp(rango[1]))]
+
+def tabla_paginada(df, key, estilos=None, formato=None, **kwargs):
+    # Solo la página visible se formatea y se envía; estilos(df) devuelve el CSS de la página con máscaras
+    pagina = 1
+    if len(df) > FILAS_POR_PAGINA:
+        paginas = -(-len(df) // FILAS_POR_PAGINA)
+        st.session_state.setdefault(f"pagina_{key}_{paginas}", 1)
+        pagina = st.number_input(f"Página (de {paginas:,}):", min_value=1, max_value=paginas, step=1, key=f"pagina_{key}_{paginas}")
+        st.caption(f"Filas {(pagina - 1) * FILAS_POR_PAGINA + 1:,}–{min(pagina * FILAS_POR_PAGINA, len(df)):,} de {len(df):,}")
+    df_pagina, _ = paginar(df, pagina)
+    df_pagina = ampliar_float32(df_pagina)
+    if estilos is None and formato is None: return st.dataframe(df_pagina, **kwargs)
+    styler = df_pagina.style
+    if estilos is not None: styler = styler.apply(estilos, axis=None)
+    if formato: styler = styler.format(formato)
+    return st.dataframe(styler, **kwargs)
+
+def boton_descarga(df, nombre, key, etiqueta="💾 Descargar Vista"):
+    # El archivo se arma solo al hacer clic (data=callable), por bloques y en el formato elegido
+    c_fmt, c_btn = st.columns([1, 3])
+    st.session_state.setdefault(f"formato_{key}", 'CSV')
+    with c_fmt: formato = st.segmented_control("Formato:", [f.upper() for f in formatos_disponibles()], key=f"formato_{key}", label_visibility='collapsed')
+    formato = (formato or 'CSV').lower()
+    with c_btn: st.download_button(label=etiqueta, data=lambda: exportar_bytes(df, formato), file_name=f"{nombre}.{formato}", mime=MIME[formato], key=f"descarga_{key}")
+
+# Resumen por periodo: el cubo de agregados de leyes por día, semana y mes
+GRANOS_RESUMEN = {'Mes': 'mes', 'Semana': 'semana', 'Día': 'dia'}
+FORMATO_PERIODO = {'mes': '%m/%Y', 'semana': 'Sem. %d/%m/%Y', 'dia': '%d/%m/%Y'}
+FORMATO_RESUMEN = {
+    'Fuga ($)': '${:,.0f}', 'Oro puro faltante (g)': '{:,.2f}', 'Peso Taller (g)': '{:,.2f}', 'Peso Factura (g)': '{:,.2f}',
+    'Merma (g)': '{:,.2f}', 'Dif. ley media': '{:.4f}', 'Dif. ley desv.': '{:.4f}', 'Dif. ley mín.': '{:.4f}', 'Dif. ley máx.': '{:.4f}',
+}
+
+def tabla_resumen(tabla, grano):
+    return pd.DataFrame({
+        'Periodo': tabla.index.strftime(FORMATO_PERIODO[grano]),
+        'Registros': tabla['filas'],
+        'Fuga ($)': tabla['fuga_valor'].abs(), 'Días con fuga': tabla['dias_con_fugas'], 'Oro puro faltante (g)': tabla['gramos_faltantes'],
+        'Peso Taller (g)': tabla['peso_taller'], 'Peso Factura (g)': tabla['peso_factura'], 'Merma (g)': tabla['merma'],
+        'Merma de ley': tabla['dias_merma_ley'], 'Alza de ley': tabla['dias_alza_ley'],
+        'Dif. ley media': tabla['ley_diff_media'], 'Dif. ley desv.': tabla['ley_diff_desv'],
+        'Dif. ley mín.': tabla['ley_diff_min'], 'Dif. ley máx.': tabla['ley_diff_max'],
+    }).reset_index(drop=True)
+
+# --- PESTAÑA OCULTA: DIAGNÓSTICO ---
+HISTORIAL_DIAGNOSTICO = 50
+
+def diagnostico(registro, resultado, pestanas, memo):
+    # Cierra la corrida y la guarda en el historial de la sesión; si la pestaña oculta (?diagnostico=1)
+    # está abierta, muestra tiempo, memoria y filas por etapa. memo: el MemoVistas de la app
+    registro.cerrar()
+    historial = st.session_state.setdefault('diagnostico', [])
+    historial.append(registro)
+    del historial[:-HISTORIAL_DIAGNOSTICO]
+    if not pestanas or not pestanas[0].open: return
+
+    with pestanas[0]:
+        st.subheader("🩺 Tiempo, Memoria y Filas por Etapa")
+        st.caption(f"Corrida {registro.corrida}: {registro.segundos:.3f} s. La memoria pico es la asignada por Python dentro de cada etapa.")
+        st.caption(f"Vistas memorizadas: {len(memo)}, {memo.memoria_usada() / 1024 / 1024:,.1f} MB de {memo.limite / 1024 / 1024:,.0f} MB "
+                   f"({memo.aciertos:,} aciertos, {memo.fallos:,} cálculos desde que arrancó el servidor).")
+        df_etapas = pd.DataFrame(registro.registros(), columns=['etapa', 'nivel', 'segundos', 'memoria_pico_mb', 'filas'])
+        df_etapas['etapa'] = df_etapas['nivel'].map(lambda n: '  ' * n) + df_etapas['etapa']
+        st.dataframe(df_etapas.drop(columns='nivel').style.format({'segundos': '{:.4f}', 'memoria_pico_mb': '{:.2f}'}, na_rep='-'), use_container_width=True, hide_index=True)
+
+        st.markdown("#### Memoria de los archivos cargados")
+        st.dataframe(resumen_memoria(resultado['datos']).style.format({'filas': '{:,}', 'mb_antes': '{:.2f}', 'mb_despues': '{:.2f}', 'ahorro_pct': '{:.1f}%'}, na_rep='-'),
+                     use_container_width=True, hide_index=True)
+
+        st.markdown("#### Valores no numéricos forzados a 0")
+        coerciones = contar_coerciones(resultado['datos'])
+        if coerciones:
+            st.dataframe(pd.DataFrame([(key, col, n) for key, columnas in coerciones.items() for col, n in columnas.items()], columns=['archivo', 'columna', 'valores']),
+                         use_container_width=True, hide_index=True)
+        else: st.caption("Ninguno: todas las celdas numéricas no vacías se pudieron leer.")
+
+        st.markdown(f"#### Últimas {len(historial)} corridas de esta sesión")
+        df_historial = pd.DataFrame([r for reg in historial for r in reg.registros()], columns=['etapa', 'segundos'])
+        resumen = df_historial.groupby('etapa')['segundos'].agg(corridas='count', promedio='mean', maximo='max').sort_values('maximo', ascending=False)
+        st.dataframe(resumen.style.format({'promedio': '{:.4f}', 'maximo': '{:.4f}'}), use_container_width=True)
+        st.download_button("💾 Descargar registro (JSON lines)", exportar_jsonl(historial), file_name='etapas_auditoria.jsonl', mime='application/x-ndjson')
@@ -0,0 +1,56 @@
+"""Memo de las vistas de cada pestaña: frames y figuras derivados, por versión de datos y parámetros."""
+import os
+import threading
+from collections import OrderedDict
+
+from .datasets import memoria_resultado
+from .instrumentacion import etapa
+
+MEMORIA_VISTAS_MB = float(os.environ.get('AUDITORIA_VISTAS_MB', '256'))
+
+class MemoVistas:
+    # (vista, versión, parámetros) -> lo que devuelva calcular(). Volver a una pestaña con los mismos
+    # filtros no recalcula nada. Lo guardado se comparte entre sesiones: es de solo lectura.
+    # Acotado por memoria como CacheDatasets: al pasar el límite salen las menos usadas
+    def __init__(self, memoria_maxima_mb=MEMORIA_VISTAS_MB):
+        self.limite = int(memoria_maxima_mb * 1024 * 1024)
+        self._entradas = OrderedDict()  # clave -> (valor, bytes)
+        self._lock = threading.Lock()
+        self.aciertos = self.fallos = 0
+
+    def obtener(self, nombre, version, parametros, calcular):
+        clave = (nombre, version, tuple(parametros))
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave][0]
+            self.fallos += 1
+
+        with etapa(f"vista.{nombre}"): valor = calcular()
+        tamano = memoria_resultado(valor)
+        with self._lock:
+            # Las vistas de una versión vieja del mismo directorio ya no sirven
+            for vieja in [c for c in self._entradas if c[1][0] == version[0] and c[1] != version]:
+                del self._entradas[vieja]
+            self._entradas[clave] = (valor, tamano)
+            while len(self._entradas) > 1 and self._memoria() > self.limite: self._entradas.popitem(last=False)
+        return valor
+
+    def descartar(self, directorio):
+        # Todas las vistas de un directorio, p. ej. cuando CacheDatasets expulsa su dataset
+        with self._lock:
+            for clave in [c for c in self._entradas if c[1][0] == directorio]:
+                del self._entradas[clave]
+
+    def _memoria(self):
+        # Con el lock tomado
+        return sum(bytes_ for _, bytes_ in self._entradas.values())
+
+    def memoria_usada(self):
+        # El diagnóstico la lee mientras otras sesiones guardan vistas
+        with self._lock:
+            return self._memoria()
+
+    def __len__(self):
+        return len(self._entradas)
@@ -0,0 +1,24 @@
+"""Lo común a las pruebas: copy-on-write como en el tablero y los procesos batch, y los exports reales
+copiados a un directorio temporal."""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+pd.set_option('mode.copy_on_write', True)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    # Los CSV del repositorio en tmp_path/datos; se trabaja desde tmp_path/trabajo, así que cada prueba
+    # empieza con su propio caché vacío
+    datos = tmp_path / 'datos'
+    datos.mkdir()
+    for nombre in os.listdir(RAIZ):
+        if nombre.endswith('.csv'): shutil.copy(os.path.join(RAIZ, nombre), datos)
+    trabajo = tmp_path / 'trabajo'
+    trabajo.mkdir()
+    monkeypatch.chdir(trabajo)
+    return str(datos)
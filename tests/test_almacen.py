@@ -0,0 +1,73 @@
+"""Almacén SQLite y DuckDB: mismos resultados que pandas y una sola base por directorio, actualizada en sitio."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_auditoria import almacen as modulo
+from motor_auditoria.almacen import abrir_almacen, calcular_auditoria_sql, fugas_sql, ruta_almacen
+from motor_auditoria.cache import CACHE_DIR
+from motor_auditoria.calculos import calcular_auditoria, calcular_fugas
+from motor_auditoria.carga import cargar_datos, rutas_archivos, version_datos
+from motor_auditoria.servicio import _enlazar_vistas
+
+def _comparar(a, b):
+    if isinstance(a, dict):
+        assert set(a) == set(b)
+        for k in a: _comparar(a[k], b[k])
+    elif isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-12)
+    elif isinstance(a, float):
+        assert np.isclose(a, b, rtol=1e-12)
+    else:
+        assert a == b
+
+def _calcular(directorio, motor='sqlite'):
+    datos, version = cargar_datos(directorio), version_datos(directorio)
+    almacen = abrir_almacen(version, motor)
+    try: resultado = _enlazar_vistas(calcular_auditoria_sql(almacen), datos)
+    finally: almacen.cerrar()
+    _comparar(resultado, calcular_auditoria(datos))
+    return almacen
+
+def test_por_bloques_igual_a_pandas(directorio, monkeypatch):
+    monkeypatch.setattr(modulo, 'FILAS_POR_BLOQUE', 7)
+    _calcular(directorio)
+
+def test_duckdb_igual_a_pandas(directorio):
+    pytest.importorskip('duckdb')
+    _calcular(directorio, 'duckdb')
+
+def test_sin_impasse(directorio):
+    datos = cargar_datos(directorio)
+    almacen = abrir_almacen(version_datos(directorio), 'sqlite')
+    try: _comparar(fugas_sql(almacen, impasse=False), calcular_fugas(datos['leyes'], impasse=False))
+    finally: almacen.cerrar()
+
+def test_actualiza_en_sitio(directorio):
+    # Un archivo de una versión anterior, con un almacén por versión
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    antiguo = os.path.join(CACHE_DIR, 'almacen-0123456789ab.sqlite')
+    open(antiguo, 'wb').close()
+
+    primero = _calcular(directorio)
+    assert not os.path.exists(antiguo)
+    firmas = dict(primero.firmas)
+
+    with open(rutas_archivos(directorio)['leyes'], 'ab') as fh:
+        fh.write(b'999;12/1/2025;"0,9";"10,5";"0,91";"10,4";"9,46";"9,45";"-0,01";"-4500"\n')
+    segundo = _calcular(directorio)
+    assert segundo.ruta == primero.ruta == ruta_almacen(directorio, 'sqlite')
+    assert {t for t in firmas if firmas[t] != segundo.firmas[t]} == {'leyes'}
+    assert os.listdir(os.path.dirname(segundo.ruta)) == [os.path.basename(segundo.ruta)]
+
+def test_sin_poder_abrir_vuelve_a_pandas(directorio, monkeypatch):
+    def falla(self, escritura): raise OSError('solo lectura')
+    monkeypatch.setattr(modulo.Almacen, '_abrir', falla)
+    cargar_datos(directorio)
+    assert abrir_almacen(version_datos(directorio), 'sqlite') is None
+
+def test_sin_cache_parquet_vuelve_a_pandas(directorio):
+    # Sin cargar_datos no hay caché Parquet de esta versión
+    assert abrir_almacen(version_datos(directorio), 'sqlite') is None
@@ -0,0 +1,105 @@
+"""Carga incremental: un export que creció al final debe dar el mismo frame que leerlo completo.
+También: cuándo se reparte la carga entre procesos."""
+import logging
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from motor_auditoria import cache, carga, iniciar_registro
+from motor_auditoria.carga import cargar_datos, rutas_archivos
+
+pytest.importorskip('pyarrow')
+
+def _partir(directorio, key, filas):
+    # Deja en el archivo solo el encabezado y las primeras `filas`; devuelve el resto para anexarlo después
+    ruta = rutas_archivos(directorio)[key]
+    with open(ruta, 'rb') as fh: lineas = fh.readlines()
+    with open(ruta, 'wb') as fh: fh.writelines(lineas[:filas + 1])
+    return ruta, b''.join(lineas[filas + 1:])
+
+def _completo(directorio, tmp_path, monkeypatch):
+    # Carga de referencia con un caché vacío
+    limpio = tmp_path / 'referencia'
+    limpio.mkdir()
+    monkeypatch.chdir(limpio)
+    return cargar_datos(directorio)
+
+def _comparar(anexado, completo):
+    pd.testing.assert_frame_equal(anexado, completo)
+    # attrs['memoria'] no: los textos Arrow concatenados ocupan unos bytes más que leídos de una vez
+    for attr in ('coerciones', 'esquema', 'particiones'):
+        assert anexado.attrs.get(attr) == completo.attrs.get(attr), attr
+
+@pytest.mark.parametrize('key, filas, origen', [
+    ('leyes', 120, 'anexado'),
+    # Columnas enteras en el histórico que en la cola traen decimales con coma ("36000253,5"):
+    # mezclarlas dejaría enteros y textos en la misma columna, se lee todo de nuevo
+    ('gold', 30, 'completo'),
+    ('orotec', 58, 'completo'),
+])
+def test_anexado_igual_a_completo(directorio, tmp_path, monkeypatch, key, filas, origen):
+    ruta, cola = _partir(directorio, key, filas)
+    cargar_datos(directorio)
+    with open(ruta, 'ab') as fh: fh.write(cola)
+
+    estado = {}
+    df = cargar_datos(directorio, estado)[key]
+    assert estado[key][0] == origen
+    # El caché quedó al día: la siguiente carga no vuelve a parsear
+    otra = {}
+    cargar_datos(directorio, otra)
+    assert otra[key][0] == 'cache'
+
+    _comparar(df, _completo(directorio, tmp_path, monkeypatch)[key])
+
+def test_entero_con_vacios_en_la_cola(directorio, tmp_path, monkeypatch):
+    # Una columna entera del histórico que llega vacía en la cola pasa a float, como en la lectura completa
+    ruta, cola = _partir(directorio, 'leyes', 120)
+    cargar_datos(directorio)
+    with open(ruta, 'ab') as fh: fh.write(cola + b';12/1/2025;"0,9";"10,5";"0,91";"10,4";"9,46";"9,45";"-0,01";"-4500"\n')
+
+    estado = {}
+    df = cargar_datos(directorio, estado)['leyes']
+    assert estado['leyes'][0] == 'anexado'
+    _comparar(df, _completo(directorio, tmp_path, monkeypatch)['leyes'])
+
+def test_fallo_al_guardar_invalida_manifiesto(directorio, monkeypatch, caplog):
+    cargar_datos(directorio)
+    ruta = rutas_archivos(directorio)['leyes']
+    manifiesto = cache._rutas_cache('leyes', ruta)[1]
+    assert os.path.exists(manifiesto)
+
+    def falla(*args): raise OSError('disco lleno')
+    monkeypatch.setattr(cache, '_escribir_particiones', falla)
+    with open(ruta, 'ab') as fh: fh.write(b'999;12/1/2025;"0,9";"10,5";"0,91";"10,4";"9,46";"9,45";"-0,01";"-4500"\n')
+    with caplog.at_level(logging.WARNING, logger='motor_auditoria.cache'):
+        cargar_datos(directorio)
+    assert not os.path.exists(manifiesto)
+    assert 'leyes' in caplog.text
+
+def test_en_paralelo_desde_un_hilo(directorio, tmp_path, monkeypatch):
+    # Como carga el tablero: desde un hilo que no es el principal, en procesos aparte y con un anexado
+    monkeypatch.setattr(carga, 'PROCESOS_CARGA', 2)
+    monkeypatch.setattr(carga, 'BYTES_PARALELO', 0)
+    colas = [_partir(directorio, 'leyes', 120), _partir(directorio, 'orotec', 58)]
+    cargar_datos(directorio)
+    for ruta, cola in colas:
+        with open(ruta, 'ab') as fh: fh.write(cola)
+
+    estado, salida = {}, {}
+    def cargar():
+        registro = iniciar_registro()
+        salida['datos'] = cargar_datos(directorio, estado)
+        registro.cerrar(log=False)
+        salida['etapas'] = [m['etapa'] for m in registro.etapas]
+    hilo = threading.Thread(target=cargar)
+    hilo.start()
+    hilo.join()
+
+    assert 'carga.paralela' in salida['etapas'] and 'carga.leyes' in salida['etapas']
+    assert estado['leyes'][0] == 'anexado' and len(estado['leyes'][1][0]) == 75
+    assert estado['orotec'][0] == 'completo' and estado['gold'][0] == 'cache'
+    completo = _completo(directorio, tmp_path, monkeypatch)
+    for key, df in salida['datos'].items(): _comparar(df, completo[key])
@@ -0,0 +1,32 @@
+"""Vigilante de CacheDatasets: un error en una vuelta no lo detiene."""
+import time
+
+from motor_auditoria import datasets
+from motor_auditoria.datasets import CacheDatasets
+
+def _esperar(condicion, segundos=2):
+    limite = time.monotonic() + segundos
+    while not condicion() and time.monotonic() < limite: time.sleep(0.01)
+    return condicion()
+
+def test_vigilante_sobrevive_a_errores(monkeypatch, caplog):
+    monkeypatch.setattr(datasets, 'SEGUNDOS_VIGILANCIA', 0.01)
+    cache = CacheDatasets(vigilar=True)
+    cache._guardar(('/a', ()), {})
+    vueltas = []
+
+    def cargados():
+        vueltas.append(1)
+        if len(vueltas) == 1: raise RuntimeError('diccionario cambió durante la iteración')
+        return ['/a']
+    def revisar(directorio): raise OSError('sin permiso')
+    monkeypatch.setattr(cache, 'cargados', cargados)
+    monkeypatch.setattr(cache, '_revisar', revisar)
+
+    cache._iniciar_vigilante()
+    try:
+        assert _esperar(lambda: len(vueltas) >= 3)
+        assert cache._vigilante.is_alive()
+    finally:
+        cache.detener()
+    assert 'vigilante' in caplog.text and 'sin permiso' in caplog.text
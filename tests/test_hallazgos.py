@@ -0,0 +1,72 @@
+"""extraer_hallazgos frente al recorrido fila a fila al que reemplazó."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor_auditoria.calculos import FECHA_IMPASSE, FECHA_YARDEN, extraer_hallazgos
+from motor_auditoria.carga import cargar_datos
+
+def _referencia(df_gold, df_orotec):
+    # El recorrido original de app.py, tal cual
+    hallazgos = []
+    for df_source, name in [(df_gold, 'Gold Price'), (df_orotec, 'Orotec')]:
+        if 'observaciones' in df_source.columns:
+            for idx, row in df_source.iterrows():
+                obs = str(row['observaciones']).lower()
+                fecha = row['fecha_norm']
+                obs_real = row['observaciones']
+
+                if fecha == '2025-11-27': obs_real = "⚠️ Yarden pone en la factura más de lo que debería pagar. " + str(obs_real)
+                if fecha == '2025-05-19': continue
+
+                if len(obs) > 4 and "nan" not in obs and "ok" not in obs:
+                    # Filtro extra para orotec
+                    if name == 'Orotec' and "referencia" in obs: continue
+                    hallazgos.append({"Fecha": fecha, "Observación": obs_real})
+    return pd.DataFrame(hallazgos, columns=["Fecha", "Observación"]).drop_duplicates()
+
+def _comparar(df_gold, df_orotec):
+    obtenido = extraer_hallazgos(df_gold, df_orotec)
+    esperado = _referencia(df_gold, df_orotec)
+    pd.testing.assert_frame_equal(obtenido.astype(object), esperado.astype(object))
+    return obtenido
+
+OBSERVACIONES = [
+    "Factura con valor distinto al pagado", np.nan, "ok", "Todo OK con la factura", "nada",
+    "Pago pendiente de la Nanita", "Se pagó con referencia Orotec", "Factura con valor distinto al pagado",
+    "Sin referencia del día", "  ", "Diferencia en gramos reportada",
+]
+FECHAS = ['2025-05-15', '2025-05-16', '2025-05-17', FECHA_IMPASSE, '2025-05-20',
+          FECHA_YARDEN, FECHA_YARDEN, '2025-05-15', '2025-06-01', '2025-06-02', FECHA_IMPASSE]
+
+def _frame(tipo, observaciones=OBSERVACIONES, fechas=FECHAS):
+    return pd.DataFrame({
+        'fecha_norm': pd.Series(fechas, dtype='category'),
+        'observaciones': pd.Series(observaciones, dtype=tipo),
+    })
+
+@pytest.mark.parametrize('tipo', [object, 'string[pyarrow]'])
+def test_igual_al_recorrido(tipo):
+    gold, orotec = _frame(tipo), _frame(tipo, OBSERVACIONES[::-1])
+    obtenido = _comparar(gold, orotec)
+    assert not obtenido.empty
+    # La nota de Yarden va solo en su fecha, y el día del impasse no aparece
+    yarden = obtenido[obtenido['Fecha'] == FECHA_YARDEN]['Observación'].astype(str)
+    assert yarden.str.startswith("⚠️ Yarden").all() and len(yarden)
+    assert (obtenido['Fecha'] != FECHA_IMPASSE).all()
+
+@pytest.mark.parametrize('tipo', [object, 'string[pyarrow]'])
+def test_referencia_solo_se_descarta_en_orotec(tipo):
+    fila = _frame(tipo, ["Se pagó con referencia Orotec"], ['2025-07-01'])
+    assert len(_comparar(fila, fila.iloc[:0])) == 1
+    assert _comparar(fila.iloc[:0], fila).empty
+
+def test_sin_observaciones():
+    vacio = pd.DataFrame({'fecha_norm': pd.Series([], dtype='category')})
+    _comparar(vacio, vacio)
+    assert extraer_hallazgos(None, None).empty
+
+def test_exports_reales(directorio):
+    datos = cargar_datos(directorio)
+    assert datos['gold']['observaciones'].dtype == 'string[pyarrow]'
+    assert not _comparar(datos['gold'], datos['orotec']).empty
@@ -0,0 +1,33 @@
+"""limpiar_nums: montos con y sin separador de miles, con y sin pyarrow, y el conteo de coerciones."""
+import pandas as pd
+import pytest
+
+from motor_auditoria import limpieza
+from motor_auditoria.limpieza import contar_coerciones, limpiar_nums
+
+MONTOS = ['$1.234,56', '1.234.567', '$ 1,234.56', '1,234,567', '-$2.500,5', '0,874', '1.234', '12', 'sin dato', None]
+ESPERADOS = [1234.56, 1234567.0, 1234.56, 1234567.0, -2500.5, 0.874, 1.234, 12.0, 0.0, 0.0]
+
+@pytest.fixture(params=['arrow', 'pandas'])
+def motor(request, monkeypatch):
+    if request.param == 'pandas': monkeypatch.setattr(limpieza, 'pa', None)
+    elif limpieza.pa is None: pytest.skip("pyarrow no está instalado")
+    return request.param
+
+def test_montos(motor):
+    df = limpiar_nums(pd.DataFrame({'valor': pd.Series(MONTOS, dtype=object)}), ['valor'])
+    assert df['valor'].tolist() == pytest.approx(ESPERADOS)
+    # Solo 'sin dato' se forzó: la celda vacía no cuenta
+    assert df.attrs['coerciones'] == {'valor': 1}
+
+def test_contar_coerciones():
+    limpio = limpiar_nums(pd.DataFrame({'a': ['1', 'x', 'y'], 'b': ['2', '3', '4']}), ['a', 'b'])
+    sin_coerciones = limpiar_nums(pd.DataFrame({'a': ['1']}), ['a'])
+    assert contar_coerciones({'leyes': limpio, 'gold': sin_coerciones, 'bases': None}) == {'leyes': {'a': 2}}
+
+def test_float32_dentro_de_la_precision_mostrada():
+    df = pd.DataFrame({'peso taller': [176.03, 12.5], 'ley taller': [0.893, 0.874], 'peso factura': [16_777_217.0, 1.0]})
+    df = limpieza.tipos_compactos('leyes', df)
+    # 16.777.217 g no cabe en float32 con centésimas: esa columna se queda en float64
+    assert df.dtypes.astype(str).tolist() == ['float32', 'float32', 'float64']
+    assert limpieza.ampliar_float32(df).iloc[0].tolist() == [176.03, 0.893, 16_777_217.0]
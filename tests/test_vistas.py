@@ -0,0 +1,47 @@
+"""MemoVistas: límite por memoria y descarte de lo derivado de un dataset expulsado."""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from motor_auditoria.datasets import CacheDatasets
+from motor_auditoria.vistas import MemoVistas
+
+MB = 1024 * 1024
+
+def _frame(mb):
+    return pd.DataFrame({'x': np.zeros(int(mb * MB) // 8)})
+
+def _version(directorio):
+    return (directorio, (('leyes', 1, 1),))
+
+def test_acotado_por_memoria():
+    memo = MemoVistas(memoria_maxima_mb=3.5)
+    for i in range(4): memo.obtener('tabla', _version('/a'), (i,), lambda: _frame(1))
+    assert len(memo) == 3 and memo.memoria_usada() <= 3.5 * MB
+    # Sale la menos usada, no la última pedida
+    calculos = []
+    memo.obtener('tabla', _version('/a'), (3,), lambda: calculos.append(3))
+    memo.obtener('tabla', _version('/a'), (0,), lambda: calculos.append(0) or _frame(1))
+    assert calculos == [0]
+
+def test_una_vista_mayor_que_el_limite_se_conserva():
+    memo = MemoVistas(memoria_maxima_mb=1)
+    memo.obtener('grande', _version('/a'), (), lambda: _frame(2))
+    assert len(memo) == 1
+
+def test_expulsion_del_dataset_descarta_sus_vistas():
+    datasets = CacheDatasets(memoria_maxima_mb=1.5, vigilar=False)
+    memo = MemoVistas()
+    datasets.al_expulsar(memo.descartar)
+    datasets._guardar(_version('/a'), {'datos': _frame(1)})
+    memo.obtener('tabla', _version('/a'), (), lambda: _frame(0.1))
+    memo.obtener('tabla', _version('/b'), (), lambda: _frame(0.1))
+    datasets._guardar(_version('/b'), {'datos': _frame(1)})
+    assert datasets.cargados() == ['/b']
+    assert len(memo) == 1 and memo.obtener('tabla', _version('/b'), (), lambda: None) is not None
+
+def test_mide_series_y_figuras():
+    memo = MemoVistas()
+    memo.obtener('serie', _version('/a'), (), lambda: pd.Series(np.zeros(1000)))
+    memo.obtener('figura', _version('/a'), (), lambda: go.Figure([go.Bar(y=np.zeros(1000))]))
+    assert memo.memoria_usada() > 2 * 8000